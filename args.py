@@ -8,6 +8,7 @@ vmaf_args = parser.add_argument_group("VMAF Arguments")
 overview_mode_args = parser.add_argument_group("Overview Mode Arguments")
 general_args = parser.add_argument_group("General Arguments")
 optional_metrics_args = parser.add_argument_group("Optional Metrics")
+performance_args = parser.add_argument_group("Performance Arguments")
 
 # Set AV1 speed/quality ratio
 encoding_args.add_argument(
@@ -43,6 +44,38 @@ encoding_args.add_argument(
     help="Specify the CRF value(s) to use",
 )
 
+# CRF search mode.
+encoding_args.add_argument(
+    "--target-vmaf",
+    type=float,
+    default=None,
+    metavar="VMAF",
+    help="Instead of comparing a list of CRF values, search for the highest CRF value whose mean VMAF "
+    "(or --target-percentile percentile) is at least this value. Each CRF value that is tried is encoded "
+    "and scored one at a time. -crf can be used to specify the first CRF value to try",
+)
+
+# The percentile used by --target-vmaf.
+encoding_args.add_argument(
+    "--target-percentile",
+    type=float,
+    default=None,
+    metavar="PERCENTILE",
+    help="Use this percentile (0-100) of the VMAF of the frames with --target-vmaf instead of the mean VMAF. "
+    "For example, 5 means that 95%% of the frames must have a VMAF of at least --target-vmaf",
+)
+
+# The range of CRF values to search.
+encoding_args.add_argument(
+    "--crf-range",
+    type=int,
+    nargs=2,
+    default=None,
+    metavar=("MIN", "MAX"),
+    help="The range of CRF values that --target-vmaf searches. By default, the whole range "
+    "supported by the encoder",
+)
+
 # Number of decimal places to use for the data.
 general_args.add_argument(
     "-dp",
@@ -52,6 +85,18 @@ general_args.add_argument(
     help="The number of decimal places to use for the data in the table",
 )
 
+# Encode the video in chunks that are encoded at the same time.
+encoding_args.add_argument(
+    "--encode-chunks",
+    type=int,
+    default=1,
+    metavar="CHUNKS",
+    help="Split the video into roughly this many chunks at keyframes, encode the chunks at the same time "
+    "(with --cpu-budget split between them) and join the encoded chunks. Useful for slow encoders "
+    "such as libaom-av1 or x265 with a slow preset. The encoding time in the table is the time "
+    "taken by the whole process",
+)
+
 # Video Encoder
 encoding_args.add_argument(
     "-e",
@@ -62,6 +107,50 @@ encoding_args.add_argument(
     help="Specify whether to use the x264 (H.264), x265 (H.265) or libaom-av1 (AV1) encoder",
 )
 
+# The number of clips to create at the same time in Overview Mode.
+overview_mode_args.add_argument(
+    "--clip-jobs",
+    type=int,
+    default=os.cpu_count(),
+    metavar="JOBS",
+    help="When using Overview Mode, the number of clips to create at the same time. "
+    "--cpu-budget is split between the FFmpeg processes that create the clips",
+)
+
+# How the overview video is created.
+overview_mode_args.add_argument(
+    "--overview-engine",
+    type=str,
+    default="clips",
+    choices=["clips", "filter"],
+    help='When using Overview Mode, "clips" creates a lossless file for each clip and then concatenates them. '
+    '"filter" creates the overview video with a single FFmpeg process that reads each clip from the '
+    "original video and joins them with the concat filter, so no intermediate files are created",
+)
+
+# How the clips of the overview video are chosen.
+overview_mode_args.add_argument(
+    "--overview-sampling",
+    type=str,
+    default="interval",
+    choices=["interval", "content"],
+    help='When using Overview Mode, "interval" takes a clip every --interval seconds. '
+    '"content" runs a quick analysis of the spatial and temporal complexity of the video and chooses '
+    "the same number of clips so that they cover the range of complexity of the video",
+)
+
+# A run without Overview Mode, used to report how well the overview video predicts the VMAF.
+overview_mode_args.add_argument(
+    "--overview-reference",
+    type=str,
+    default=None,
+    metavar="FOLDER",
+    help="When using Overview Mode, the CRF Comparison or Preset Comparison folder of a run without "
+    "Overview Mode that compared the same CRF values or presets. The mean VMAF of each transcode of the "
+    "overview video is compared with the one in this folder and the prediction error is saved in "
+    '"Overview Prediction Error.txt"',
+)
+
 # The time interval for Overview Mode.
 overview_mode_args.add_argument(
     "-i",
@@ -145,6 +234,93 @@ encoding_args.add_argument(
     help="Specify the preset(s) to use",
 )
 
+# Score all of the transcodes in one pass.
+vmaf_args.add_argument(
+    "--shared-reference",
+    action="store_true",
+    help="Encode all of the CRF values/presets first and then calculate the metrics of all of the transcodes "
+    "in a single FFmpeg process, so that the original video is only decoded once",
+)
+
+# Pipe the transcode into libvmaf while it is being encoded.
+vmaf_args.add_argument(
+    "--stream-to-vmaf",
+    action="store_true",
+    help="Calculate the metrics while the video is being encoded, by streaming the transcode to libvmaf "
+    "through a named pipe instead of reading it from the disk after the encode has finished. "
+    "Not supported on Windows",
+)
+
+# Split the comparison into segments that are compared at the same time.
+vmaf_args.add_argument(
+    "--vmaf-segments",
+    type=int,
+    default=1,
+    metavar="SEGMENTS",
+    help="Split the videos into this many segments and calculate the metrics of each segment in its own "
+    "FFmpeg process, with --n-threads split between the processes. The per-frame results are merged, "
+    "so the output is the same as a single process. Useful when one libvmaf process cannot use all of "
+    "the CPU threads",
+)
+
+# Stop calculating the metrics once the mean VMAF is known accurately enough.
+vmaf_args.add_argument(
+    "--adaptive-sampling",
+    type=float,
+    default=None,
+    metavar="TOLERANCE",
+    help="Calculate the metrics of one second chunks of the video, spread evenly across the video, "
+    "and stop as soon as the approximate confidence interval of the mean VMAF is within +/- TOLERANCE VMAF "
+    "points. The number of frames that were scored and the confidence interval are shown in the table",
+)
+
+# The confidence level of --adaptive-sampling.
+vmaf_args.add_argument(
+    "--adaptive-confidence",
+    type=float,
+    default=0.95,
+    metavar="LEVEL",
+    help="The confidence level (between 0 and 1) of the approximate confidence interval used by "
+    "--adaptive-sampling",
+)
+
+# Two-stage scoring.
+vmaf_args.add_argument(
+    "--proxy-threshold",
+    type=float,
+    default=None,
+    metavar="VMAF",
+    help="Score the transcodes in two stages. First, every transcode is scored cheaply (downscaled to "
+    "--proxy-height and only every --proxy-subsample th frame). Then, only the transcodes whose proxy VMAF is "
+    "within --proxy-margin of this VMAF are scored in full. The other transcodes are shown with their proxy "
+    'scores, and the proxy and full scores are compared in "Proxy Agreement.txt"',
+)
+
+vmaf_args.add_argument(
+    "--proxy-margin",
+    type=float,
+    default=2.0,
+    metavar="VMAF",
+    help="With --proxy-threshold, the transcodes whose proxy VMAF is within this many VMAF points of the "
+    "threshold are scored in full",
+)
+
+vmaf_args.add_argument(
+    "--proxy-height",
+    type=int,
+    default=1080,
+    metavar="HEIGHT",
+    help="With --proxy-threshold, the height that the videos are downscaled to for the proxy scores",
+)
+
+vmaf_args.add_argument(
+    "--proxy-subsample",
+    type=int,
+    default=5,
+    metavar="N",
+    help="With --proxy-threshold, only every Nth frame is used for the proxy scores",
+)
+
 # Phone Model
 vmaf_args.add_argument("--phone-model", action="store_true", help="Enable VMAF phone model")
 
@@ -164,6 +340,14 @@ general_args.add_argument(
     help="Show the FFmpeg commands that are being run.",
 )
 
+# Headless mode, e.g. for cron jobs and containers.
+general_args.add_argument(
+    "--no-graphs",
+    action="store_true",
+    help="Do not create any graphs or progress bars, and do not look up the width of the terminal. "
+    "Matplotlib is not imported at all, which makes each run start more quickly",
+)
+
 # SSIM
 optional_metrics_args.add_argument(
     "-ssim",
@@ -193,7 +377,10 @@ general_args.add_argument(
 general_args.add_argument(
     "-tvp",
     "--transcoded-video-path",
-    help="The path of the transcoded video (only applicable when using the -ntm mode)",
+    nargs="+",
+    help="The path of the transcoded video (only applicable when using the -ntm mode). "
+    "If more than one path is specified, the original video is only decoded once and "
+    "each transcoded video gets its own output folder",
 )
 
 # FFmpeg Video Filter(s)
@@ -204,3 +391,103 @@ general_args.add_argument(
     help="Add FFmpeg video filter(s). Each filter must be separated by a comma. "
     "Example: -vf bwdif=mode=0,crop=1920:800:0:140",
 )
+
+# The number of CPU threads that may be used by all of the concurrently running jobs.
+performance_args.add_argument(
+    "--cpu-budget",
+    type=int,
+    default=os.cpu_count(),
+    metavar="THREADS",
+    help="The total number of CPU threads that the encoding and VMAF jobs may use. "
+    "When more than one job runs at a time, the budget is split evenly between the jobs",
+)
+
+# The number of comparison points to process at the same time.
+performance_args.add_argument(
+    "-j",
+    "--parallel-jobs",
+    type=int,
+    default=1,
+    metavar="JOBS",
+    help="The number of CRF values/presets to encode and score at the same time. "
+    "Each job is given --cpu-budget/JOBS threads for the encoder and libvmaf",
+)
+
+# Overlap the encode of the next comparison point with the scoring of the previous one.
+performance_args.add_argument(
+    "--pipeline",
+    action="store_true",
+    help="Encode the next CRF value/preset while the VMAF of the previous transcode is being calculated. "
+    "The encoder and libvmaf each get half of --cpu-budget",
+)
+
+performance_args.add_argument(
+    "--pipeline-depth",
+    type=int,
+    default=1,
+    metavar="TRANSCODES",
+    help="Only applicable with --pipeline. The maximum number of finished transcodes that may wait "
+    "for their VMAF to be calculated before the next encode is started",
+)
+
+# Do not keep the output of ffprobe on the disk.
+performance_args.add_argument(
+    "--no-probe-cache",
+    action="store_true",
+    help="Do not save the information about each video (obtained with ffprobe) in the cache directory. "
+    "Each file is still only probed once per run",
+)
+
+# Reuse transcodes and metrics from previous runs.
+performance_args.add_argument(
+    "--cache-dir",
+    type=str,
+    metavar="DIRECTORY",
+    help="Save transcodes, per-frame metrics, cut videos and overview videos in this directory "
+    "and reuse them in later runs. Only the transcodes and metrics that are missing from the cache "
+    "are computed, e.g. adding a CRF value or -psnr to a previous comparison only encodes the new "
+    "CRF value or only calculates the PSNR",
+)
+
+# Run the FFmpeg processes with the asyncio supervisor.
+performance_args.add_argument(
+    "--max-processes",
+    type=int,
+    default=None,
+    metavar="PROCESSES",
+    help="Run all of the FFmpeg and ffprobe processes (encodes, libvmaf, cuts, overview clips and probes) "
+    "through a supervisor that runs at most this many of them at the same time, reads their output "
+    "without a thread per process and kills all of them on Ctrl-C",
+)
+
+# Apply the video filters once.
+performance_args.add_argument(
+    "--prefilter",
+    type=str,
+    choices=["ffv1", "y4m"],
+    default=None,
+    help="Apply the -vf filters to the original video once, into a lossless video (FFV1 in MKV) or an "
+    "uncompressed video (Y4M, which decodes most quickly but is very large, so is best for short clips), "
+    "which is then used by every encode and as the reference of every VMAF calculation",
+)
+
+# Resume an interrupted run.
+performance_args.add_argument(
+    "--resume",
+    action="store_true",
+    help='Carry on from where an interrupted run stopped. Each run records the stages that it has completed '
+    '(the overview/cut video and the encode, metrics and table row of each CRF value/preset) in "Run Manifest.json" '
+    "in the output folder. With this argument, the stages that were completed with the same arguments "
+    "and whose outputs have not changed are skipped",
+)
+
+# Run the encodes and libvmaf on other machines.
+performance_args.add_argument(
+    "--queue",
+    type=str,
+    metavar="QUEUE_FILE",
+    help="Instead of encoding and scoring the CRF values/presets on this machine, add them as jobs to this "
+    "SQLite file and wait for them to be run by workers (python worker.py --queue QUEUE_FILE). "
+    "The queue file, the original video and the output folder must be on storage that all of the "
+    "workers can access with the same paths",
+)
@@ -1,6 +1,6 @@
 import os
 
-from utils import is_list
+from utils import is_list, is_streaming_supported
 
 
 class ArgumentsValidator:
@@ -13,6 +13,84 @@ class ArgumentsValidator:
         validation_results.append(
             self.__validate_crf_and_preset_count(args.no_transcoding_mode, args.crf, args.preset)
         )
+        validation_results.append(
+            self.__validate_parallel_jobs(args.parallel_jobs, args.cpu_budget)
+        )
+        validation_results.append(
+            self.__validate_pipeline(
+                args.pipeline, args.pipeline_depth, args.parallel_jobs, args.shared_reference
+            )
+        )
+
+        validation_results.append(self.__validate_vmaf_segments(args.vmaf_segments))
+        validation_results.append(self.__validate_clip_jobs(args.clip_jobs))
+        validation_results.append(
+            self.__validate_overview_options(
+                args.interval,
+                args.overview_sampling,
+                args.overview_reference,
+                args.no_transcoding_mode,
+            )
+        )
+        validation_results.append(
+            self.__validate_encode_chunks(args.encode_chunks, args.stream_to_vmaf)
+        )
+        validation_results.append(
+            self.__validate_stream_to_vmaf(
+                args.stream_to_vmaf, args.pipeline, args.shared_reference
+            )
+        )
+
+        validation_results.append(
+            self.__validate_queue(
+                args.queue, args.pipeline, args.shared_reference, args.stream_to_vmaf
+            )
+        )
+
+        validation_results.append(
+            self.__validate_adaptive_sampling(
+                args.adaptive_sampling,
+                args.adaptive_confidence,
+                args.subsample,
+                args.vmaf_segments,
+                args.shared_reference,
+                args.stream_to_vmaf,
+                args.transcoded_video_path,
+            )
+        )
+
+        validation_results.append(
+            self.__validate_target_vmaf(
+                args.target_vmaf,
+                args.target_percentile,
+                args.crf_range,
+                args.crf,
+                args.preset,
+                args.no_transcoding_mode,
+            )
+        )
+
+        validation_results.append(
+            self.__validate_proxy_scoring(
+                args.proxy_threshold,
+                args.proxy_margin,
+                args.proxy_height,
+                args.proxy_subsample,
+                args.no_transcoding_mode,
+                args.target_vmaf,
+                args.queue or args.pipeline or args.shared_reference or args.stream_to_vmaf,
+            )
+        )
+
+        validation_results.append(
+            self.__validate_resume(args.resume, args.no_transcoding_mode)
+        )
+        validation_results.append(
+            self.__validate_max_processes(args.max_processes, args.stream_to_vmaf)
+        )
+        validation_results.append(
+            self.__validate_prefilter(args.prefilter, args.video_filters, args.no_transcoding_mode)
+        )
 
         for validation_tuple in validation_results:
             if not validation_tuple[0]:
@@ -38,3 +116,213 @@ class ArgumentsValidator:
             )
 
         return (True, "")
+
+    def __validate_parallel_jobs(self, parallel_jobs, cpu_budget):
+        if parallel_jobs < 1 or cpu_budget < 1:
+            return (False, "The values of -j/--parallel-jobs and --cpu-budget must be at least 1.")
+
+        return (True, "")
+
+    def __validate_pipeline(self, pipeline, pipeline_depth, parallel_jobs, shared_reference):
+        if not pipeline:
+            return (True, "")
+
+        if parallel_jobs > 1:
+            return (False, "--pipeline cannot be used in conjunction with -j/--parallel-jobs.")
+
+        elif shared_reference:
+            return (False, "--pipeline cannot be used in conjunction with --shared-reference.")
+
+        elif pipeline_depth < 1:
+            return (False, "The value of --pipeline-depth must be at least 1.")
+
+        return (True, "")
+
+    def __validate_stream_to_vmaf(self, stream_to_vmaf, pipeline, shared_reference):
+        if not stream_to_vmaf:
+            return (True, "")
+
+        if not is_streaming_supported():
+            return (False, "--stream-to-vmaf is not supported on this platform.")
+
+        elif pipeline or shared_reference:
+            return (
+                False,
+                "--stream-to-vmaf cannot be used in conjunction with --pipeline or --shared-reference.",
+            )
+
+        return (True, "")
+
+    def __validate_vmaf_segments(self, vmaf_segments):
+        if vmaf_segments < 1:
+            return (False, "The value of --vmaf-segments must be at least 1.")
+
+        return (True, "")
+
+    def __validate_encode_chunks(self, encode_chunks, stream_to_vmaf):
+        if encode_chunks < 1:
+            return (False, "The value of --encode-chunks must be at least 1.")
+
+        elif encode_chunks > 1 and stream_to_vmaf:
+            return (False, "--encode-chunks cannot be used in conjunction with --stream-to-vmaf.")
+
+        return (True, "")
+
+    def __validate_queue(self, queue, pipeline, shared_reference, stream_to_vmaf):
+        if queue and (pipeline or shared_reference or stream_to_vmaf):
+            return (
+                False,
+                "--queue cannot be used in conjunction with --pipeline, --shared-reference "
+                "or --stream-to-vmaf.",
+            )
+
+        return (True, "")
+
+    def __validate_clip_jobs(self, clip_jobs):
+        if clip_jobs < 1:
+            return (False, "The value of --clip-jobs must be at least 1.")
+
+        return (True, "")
+
+    def __validate_overview_options(
+        self, interval, overview_sampling, overview_reference, no_transcoding_mode
+    ):
+        if interval is None and (overview_sampling != "interval" or overview_reference):
+            return (
+                False,
+                "--overview-sampling and --overview-reference can only be used with Overview Mode "
+                "(-i/--interval).",
+            )
+
+        elif overview_reference and no_transcoding_mode:
+            return (False, "--overview-reference cannot be used in conjunction with -ntm.")
+
+        elif overview_reference and not os.path.isdir(overview_reference):
+            return (False, f"Unable to find the --overview-reference folder: {overview_reference}")
+
+        return (True, "")
+
+    def __validate_adaptive_sampling(
+        self,
+        adaptive_sampling,
+        adaptive_confidence,
+        subsample,
+        vmaf_segments,
+        shared_reference,
+        stream_to_vmaf,
+        transcoded_video_paths,
+    ):
+        if adaptive_sampling is None:
+            return (True, "")
+
+        if adaptive_sampling <= 0:
+            return (False, "The value of --adaptive-sampling must be greater than 0.")
+
+        elif not 0 < adaptive_confidence < 1:
+            return (False, "The value of --adaptive-confidence must be between 0 and 1.")
+
+        elif subsample not in [None, "1"] or vmaf_segments > 1:
+            return (
+                False,
+                "--adaptive-sampling cannot be used in conjunction with -subsample or --vmaf-segments.",
+            )
+
+        elif shared_reference or stream_to_vmaf or (
+            transcoded_video_paths and len(transcoded_video_paths) > 1
+        ):
+            return (
+                False,
+                "--adaptive-sampling cannot be used in conjunction with --shared-reference, "
+                "--stream-to-vmaf or more than one -tvp.",
+            )
+
+        return (True, "")
+
+    def __validate_target_vmaf(
+        self, target_vmaf, target_percentile, crf_range, crf_values, presets, no_transcoding_mode
+    ):
+        if target_vmaf is None:
+            if target_percentile is not None or crf_range:
+                return (False, "--target-percentile and --crf-range can only be used with --target-vmaf.")
+
+            return (True, "")
+
+        if not 0 < target_vmaf <= 100:
+            return (False, "The value of --target-vmaf must be between 0 and 100.")
+
+        elif target_percentile is not None and not 0 <= target_percentile <= 100:
+            return (False, "The value of --target-percentile must be between 0 and 100.")
+
+        elif crf_range and not 0 <= crf_range[0] < crf_range[1]:
+            return (False, "The minimum of --crf-range must be at least 0 and less than the maximum.")
+
+        elif no_transcoding_mode:
+            return (False, "--target-vmaf cannot be used in conjunction with -ntm.")
+
+        elif (is_list(crf_values) and len(crf_values) > 1) or (is_list(presets) and len(presets) > 1):
+            return (False, "--target-vmaf cannot be used with more than one CRF value or preset.")
+
+        return (True, "")
+
+    def __validate_proxy_scoring(
+        self,
+        proxy_threshold,
+        proxy_margin,
+        proxy_height,
+        proxy_subsample,
+        no_transcoding_mode,
+        target_vmaf,
+        other_scoring_mode,
+    ):
+        if proxy_threshold is None:
+            return (True, "")
+
+        if proxy_margin < 0 or proxy_height < 1 or proxy_subsample < 1:
+            return (
+                False,
+                "--proxy-margin must be at least 0, and --proxy-height and --proxy-subsample at least 1.",
+            )
+
+        elif no_transcoding_mode or target_vmaf is not None:
+            return (False, "--proxy-threshold cannot be used in conjunction with -ntm or --target-vmaf.")
+
+        elif other_scoring_mode:
+            return (
+                False,
+                "--proxy-threshold cannot be used in conjunction with --queue, --pipeline, "
+                "--shared-reference or --stream-to-vmaf.",
+            )
+
+        return (True, "")
+
+    def __validate_resume(self, resume, no_transcoding_mode):
+        if resume and no_transcoding_mode:
+            return (False, "--resume cannot be used in conjunction with -ntm.")
+
+        return (True, "")
+
+    def __validate_max_processes(self, max_processes, stream_to_vmaf):
+        if max_processes is None:
+            return (True, "")
+
+        if max_processes < 1:
+            return (False, "The value of --max-processes must be at least 1.")
+
+        # The encoder and libvmaf must run at the same time, which the limit could prevent.
+        elif stream_to_vmaf:
+            return (False, "--max-processes cannot be used in conjunction with --stream-to-vmaf.")
+
+        return (True, "")
+
+    def __validate_prefilter(self, prefilter, video_filters, no_transcoding_mode):
+        if prefilter is None:
+            return (True, "")
+
+        if not video_filters:
+            return (False, "--prefilter can only be used in conjunction with -vf/--video-filters.")
+
+        # The transcoded videos have already been created, so only the reference would use the filtered video.
+        elif no_transcoding_mode:
+            return (False, "--prefilter cannot be used in -ntm mode.")
+
+        return (True, "")
@@ -0,0 +1,294 @@
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+import glob
+import json
+import os
+from pathlib import Path
+import sys
+import traceback
+
+from prettytable import PrettyTable
+
+from args import parser
+from comparison import (
+    apply_process_settings,
+    ComparisonRun,
+    ConfigError,
+    encoding_time_column,
+    streaming_time_column,
+    validate_config,
+)
+from scheduler import JobScheduler
+from utils import force_decimal_places, line, Logger
+
+log = Logger("batch")
+
+# The files that are used when a directory is given as a source.
+video_extensions = [".avi", ".m2ts", ".m4v", ".mkv", ".mov", ".mp4", ".mxf", ".ts", ".webm", ".y4m"]
+
+
+class Title:
+    """A source video of the batch, along with the main.py arguments that only apply to it."""
+
+    def __init__(self, path, arguments=None):
+        self.path = path
+        self.arguments = arguments if arguments is not None else []
+        self.name = Path(path).name
+
+
+def find_sources(source):
+    """Returns the videos in a directory, the files that match a glob pattern, or just the source."""
+    if os.path.isdir(source):
+        return sorted(
+            entry.path
+            for entry in os.scandir(source)
+            if entry.is_file() and Path(entry.name).suffix.lower() in video_extensions
+        )
+
+    if any(character in source for character in "*?["):
+        return sorted(glob.glob(source, recursive=True))
+
+    return [source]
+
+
+def read_manifest(manifest_path):
+    """
+    Reads a JSON manifest, which is a list of sources. Each source is either a path (of a video or a directory,
+    or a glob pattern) or an object with a "path" and a list of main.py "arguments" for that source only,
+    e.g. {"path": "trailer.mp4", "arguments": ["-crf", "18", "20"]}. Relative paths are relative to the manifest.
+    """
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+
+    titles = []
+    for entry in manifest:
+        if isinstance(entry, str):
+            entry = {"path": entry}
+
+        arguments = [str(argument) for argument in entry.get("arguments", [])]
+        for path in find_sources(os.path.join(os.path.dirname(manifest_path), entry["path"])):
+            titles.append(Title(path, arguments))
+
+    return titles
+
+
+def get_folder_names(titles):
+    # Titles with the same filename (in different directories) are numbered, so that their outputs are kept apart.
+    folder_names = []
+    counts = {}
+    for title in titles:
+        counts[title.name] = counts.get(title.name, 0) + 1
+        count = counts[title.name]
+        folder_names.append(title.name if count == 1 else f"{title.name} ({count})")
+
+    return folder_names
+
+
+def parse_shared_arguments(shared_arguments):
+    # The arguments are parsed without a video, to check them before any title is run.
+    shared_config = parser.parse_args(["-ovp", ""] + shared_arguments)
+    if shared_config.output_folder:
+        raise ConfigError(["Use the -o/--output-folder argument of batch.py rather than that of main.py."])
+
+    return shared_config
+
+
+def get_setting(result, point):
+    # The CRF value or preset of the point, or the transcoded video in -ntm mode.
+    if result.mode == "no_transcoding":
+        return point.label
+
+    setting = f"{result.column_names[0]} {point.label}"
+    if result.mode == "crf_search" and point.crf == result.best_crf:
+        setting += " (search result)"
+
+    return setting
+
+
+def get_encoding_time(point):
+    if streaming_time_column in point.row:
+        # With --stream-to-vmaf, the encode cannot be timed apart from the scoring.
+        return f"{point.row[streaming_time_column]} (with scoring)"
+
+    return point.row.get(encoding_time_column, "N/A")
+
+
+def save_catalogue_summary(summary_path, titles, title_folders, outcomes, decimal_places):
+    """
+    Saves a table with a row for each CRF value/preset (or transcoded video) of each title that has been run,
+    followed by the errors of the titles that failed. The titles are named after their output folders.
+    """
+    table = PrettyTable()
+    table.field_names = ["Title", "Setting", encoding_time_column, "Size", "Bitrate", "Mean VMAF"]
+    errors = []
+
+    for title, title_folder, (result, error) in zip(titles, title_folders, outcomes):
+        title_name = Path(title_folder).name
+        if result is None:
+            table.add_row([title_name, "Failed", "N/A", "N/A", "N/A", "N/A"])
+            errors.append(f"{title.path}: {error}")
+            continue
+
+        for point in result.points:
+            table.add_row(
+                [
+                    title_name,
+                    get_setting(result, point),
+                    get_encoding_time(point),
+                    point.row["Size"],
+                    point.row["Bitrate"],
+                    force_decimal_places(point.mean_vmaf, decimal_places),
+                ]
+            )
+
+    with open(summary_path, "w") as f:
+        f.write(f"{len(outcomes)} of {len(titles)} titles have been run ({len(errors)} failed).\n")
+        f.write(table.get_string())
+        if errors:
+            f.write("\n\nErrors:\n" + "\n".join(errors))
+
+    log.info(f"{summary_path} has been updated.")
+    line()
+
+
+def run_title(title, shared_arguments, output_folder, cpu_budget):
+    """
+    Returns the RunResult of the title and None, or None and the error if the title failed.
+    The title may use up to cpu_budget threads, for its encodes as well as for libvmaf.
+    """
+    try:
+        config = parser.parse_args(
+            ["-ovp", title.path, "-o", output_folder] + shared_arguments + title.arguments
+        )
+        # The titles share the CPU budget of the batch.
+        config.cpu_budget = cpu_budget
+        config.n_threads = str(cpu_budget)
+        validate_config(config)
+        # The process-wide settings were applied by run_batch, as titles may run at the same time.
+        return ComparisonRun(config, cpu_budget).run(), None
+    except ConfigError as error:
+        return None, " ".join(error.errors)
+    except (Exception, SystemExit):
+        # SystemExit is raised by argparse and when FFmpeg fails, in which case the reason has been logged.
+        log.info(f"{title.path} failed:\n{traceback.format_exc()}")
+        return None, traceback.format_exc().strip().splitlines()[-1]
+
+
+def run_batch(titles, shared_arguments, output_folder, cpu_budget, parallel_titles=1):
+    """
+    Runs each title with the shared main.py arguments followed by its own arguments, running up to
+    parallel_titles titles at the same time and splitting cpu_budget evenly between them. Each title gets
+    the usual outputs in a folder of its own within output_folder, and "Catalogue Summary.txt" in output_folder
+    is updated as the titles finish. Returns a (RunResult, None) or (None, error) tuple for each title.
+    The arguments that affect the whole process (--no-graphs, --max-processes, --no-probe-cache and --cache-dir)
+    are taken from the shared arguments.
+    """
+    shared_config = parse_shared_arguments(shared_arguments)
+    # Applied once, from the shared arguments, rather than by each title.
+    apply_process_settings(shared_config)
+
+    scheduler = JobScheduler(cpu_budget, parallel_titles)
+    title_cpu_budget = scheduler.threads_per_job or cpu_budget
+    title_folders = [
+        os.path.join(output_folder, folder_name) for folder_name in get_folder_names(titles)
+    ]
+    summary_path = os.path.join(output_folder, "Catalogue Summary.txt")
+    os.makedirs(output_folder, exist_ok=True)
+
+    log.info(
+        f"{len(titles)} titles will be run, {scheduler.parallel_jobs} at a time, "
+        f"each using {title_cpu_budget} threads."
+    )
+    line()
+
+    outcomes = []
+    for outcome in scheduler.map_ordered(
+        lambda title_and_folder: run_title(
+            title_and_folder[0], shared_arguments, title_and_folder[1], title_cpu_budget
+        ),
+        zip(titles, title_folders),
+    ):
+        outcomes.append(outcome)
+        save_catalogue_summary(
+            summary_path, titles, title_folders, outcomes, shared_config.decimal_places
+        )
+
+    return outcomes
+
+
+if __name__ == "__main__":
+    batch_parser = ArgumentParser(
+        formatter_class=ArgumentDefaultsHelpFormatter,
+        usage="python batch.py [SOURCE ...] [--manifest MANIFEST] [options] -- [main.py arguments]",
+        description="Runs main.py for each source video. The main.py arguments after -- (apart from -ovp and -o) "
+        "are used for every source.",
+    )
+    batch_parser.add_argument(
+        "sources",
+        nargs="*",
+        metavar="SOURCE",
+        help="A video, a directory of videos or a glob pattern (in quotes), e.g. \"Catalogue/**/*.mkv\"",
+    )
+    batch_parser.add_argument(
+        "-m",
+        "--manifest",
+        type=str,
+        help="A JSON file with a list of sources, each of which may have main.py arguments of its own, e.g. "
+        '[{"path": "trailer.mp4", "arguments": ["-crf", "18", "20"]}, "Films/"]',
+    )
+    batch_parser.add_argument(
+        "-o",
+        "--output-folder",
+        type=str,
+        default="VQM Batch",
+        help="The folder in which each source gets a folder of its own and the catalogue summary is saved",
+    )
+    batch_parser.add_argument(
+        "--cpu-budget",
+        type=int,
+        default=os.cpu_count(),
+        metavar="THREADS",
+        help="The total number of CPU threads that all of the sources may use, which is split evenly "
+        "between the sources that are running at the same time",
+    )
+    batch_parser.add_argument(
+        "--parallel-titles",
+        type=int,
+        default=1,
+        metavar="N",
+        help="The number of sources to run at the same time",
+    )
+
+    arguments = sys.argv[1:]
+    separator_index = arguments.index("--") if "--" in arguments else len(arguments)
+    batch_args = batch_parser.parse_args(arguments[:separator_index])
+    shared_arguments = arguments[separator_index + 1 :]
+
+    titles = [Title(path) for source in batch_args.sources for path in find_sources(source)]
+    if batch_args.manifest:
+        titles += read_manifest(batch_args.manifest)
+
+    if not titles:
+        log.info("No source videos were found.")
+        sys.exit(1)
+
+    try:
+        outcomes = run_batch(
+            titles,
+            shared_arguments,
+            batch_args.output_folder,
+            batch_args.cpu_budget,
+            batch_args.parallel_titles,
+        )
+    except ConfigError as error:
+        for message in error.errors:
+            log.info(f"Error: {message}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        log.info("[KeyboardInterrupt] FFmpeg processes killed. Exiting the batch.")
+        sys.exit(0)
+
+    failed_count = sum(result is None for result, error in outcomes)
+    log.info(
+        f"All done! {len(titles) - failed_count} of {len(titles)} titles were run successfully. "
+        f'Check out "{os.path.join(batch_args.output_folder, "Catalogue Summary.txt")}".'
+    )
@@ -0,0 +1,1157 @@
+from copy import copy
+import os
+from pathlib import Path
+
+import numpy as np
+from prettytable import PrettyTable
+
+from args import parser
+from arguments_validator import ArgumentsValidator
+from crf_search import crf_ranges, get_next_crf, get_search_result
+from encode_video import encode_video
+from ffmpeg_process_factory import FfmpegProcessFactory
+from job_queue import JobFailedError, JobQueue
+from libvmaf import run_libvmaf, run_libvmaf_multi, run_libvmaf_proxy
+from frame_log import read_frame_scores
+from metrics import (
+    get_mean_vmaf,
+    get_metrics_save_table,
+    save_prediction_error_table,
+    save_proxy_agreement_table,
+    save_table,
+)
+from overview import create_movie_overview, get_overview_path
+from result_cache import result_cache
+from run_manifest import get_run_key, RunManifest
+from scheduler import JobScheduler
+from streaming import encode_and_score_streaming, StreamingError
+from supervisor import process_supervisor
+from utils import (
+    cut_video,
+    default_probe_cache_dir,
+    exit_program,
+    get_cut_video_path,
+    get_prefiltered_video_path,
+    force_decimal_places,
+    is_list,
+    line,
+    Logger,
+    plot_graph,
+    prefilter_video,
+    probe_cache,
+    set_headless,
+    VideoInfoProvider,
+    write_table_info,
+    write_cut_video_info,
+    get_metrics_list,
+)
+
+log = Logger("comparison")
+
+# The JSON metric keys of all of the metrics that libvmaf can calculate.
+metric_keys = ["vmaf", "psnr_y", "float_ssim", "float_ms_ssim"]
+
+encoding_time_column = "Encoding Time (s)"
+streaming_time_column = "Encoding + Scoring Time (s)"
+
+
+class ConfigError(Exception):
+    """Raised when a config does not pass the same validation as the command line arguments."""
+
+    def __init__(self, errors):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+
+def make_config(original_video_path, **options):
+    """
+    Returns a config for run(), with the default value of every command line argument apart from
+    the options, which are given by their argparse names, e.g. make_config("video.mp4", crf=[20, 24]).
+    """
+    config = parser.parse_args(["-ovp", original_video_path])
+    for name, value in options.items():
+        if not hasattr(config, name):
+            raise ValueError(f"Unknown option: {name}")
+        setattr(config, name, value)
+
+    return config
+
+
+def validate_config(config):
+    validation_result, validation_errors = ArgumentsValidator().validate(config)
+    if not validation_result:
+        raise ConfigError(validation_errors)
+
+
+class ComparisonPoint:
+    """
+    A CRF value or preset that is being compared (or, in -ntm mode, a transcoded video), along with where
+    its output is saved. Once the point has been scored, it also holds the results of the point.
+    """
+
+    def __init__(self, crf, preset, label, output_folder, transcode_output_path, message):
+        self.crf = crf
+        self.preset = preset
+        # The value shown in the first column of the table (the CRF value or the preset).
+        self.label = label
+        self.output_folder = output_folder
+        self.transcode_output_path = transcode_output_path
+        self.message = message
+        self.json_file_path = f"{output_folder}/Metrics of each frame.json"
+        self.proxy_json_file_path = f"{output_folder}/Proxy metrics of each frame.json"
+        # "Proxy" if only the proxy scores were calculated (--proxy-threshold).
+        self.scored_with = "Full"
+        # Identifies the outputs of the point in the run manifest.
+        self.manifest_key = [crf, preset]
+        # The results, which are set once the point has been scored.
+        # Maps each column of the table to the value of the point.
+        self.row = None
+        self.mean_vmaf = None
+        self.time_taken = None
+        self.table_path = None
+        # The libvmaf log that the row was created from (the proxy log if only the proxy was scored).
+        self.scores_path = None
+
+    def get_frame_scores(self, keys=None):
+        """
+        Returns the frame numbers and a dictionary which maps each metric key (e.g. "vmaf") to a NumPy array
+        of the score of each frame. The scores are read when this method is called, rather than kept in memory.
+        """
+        return read_frame_scores(self.scores_path, keys if keys is not None else metric_keys)
+
+
+class RunResult:
+    """What a run created: the table, the scored points and, in CRF search mode, the CRF value found."""
+
+    def __init__(self, mode, output_folder, table_path, column_names, points, original_bitrate):
+        # "crf_search", "crf_comparison", "preset_comparison" or "no_transcoding".
+        self.mode = mode
+        self.output_folder = output_folder
+        # None in -ntm mode, where each point has a table of its own.
+        self.table_path = table_path
+        self.column_names = column_names
+        self.points = points
+        self.original_bitrate = original_bitrate
+        self.best_crf = None
+
+    @property
+    def rows(self):
+        return [point.row for point in self.points]
+
+
+class ComparisonRun:
+    """
+    One run of the program with a config (see make_config), which holds everything that the run needs
+    to know about the original video, so that any number of runs can happen in the same process.
+    """
+
+    def __init__(self, args, threads=None):
+        self.args = args
+        # The number of threads that each encode may use when only one job runs at a time. By default,
+        # the encoder decides.
+        self.threads = threads
+        # The arguments of the encodes and libvmaf runs, which do not apply the -vf filters with --prefilter.
+        self.job_args = args
+        self.original_video_path = args.original_video_path
+        self.filename = Path(self.original_video_path).name
+        self.video_encoder = args.video_encoder
+
+    def run(self):
+        args = self.args
+        # The manifest is always written, so that any run can be resumed with --resume.
+        # Each run has its own manifest, so that runs in the same process do not affect each other.
+        self.manifest = RunManifest()
+        if not args.no_transcoding_mode:
+            self.manifest.open(
+                os.path.join(
+                    args.output_folder if args.output_folder else f"({self.filename})",
+                    "Run Manifest.json",
+                ),
+                get_run_key(args),
+                args.resume,
+            )
+
+        self.probe_original_video()
+        self.initialise_table()
+
+        if args.interval is not None:
+            self.create_overview()
+
+        if args.no_transcoding_mode:
+            return self.run_no_transcoding_mode()
+        elif args.target_vmaf is not None:
+            return self.run_crf_search()
+        elif is_list(args.crf) and len(args.crf) > 1:
+            return self.run_crf_comparison()
+        elif is_list(args.preset):
+            return self.run_preset_comparison()
+
+        raise ConfigError(
+            [
+                "Specify more than one CRF value, a list of presets (-p/--preset) or a target VMAF "
+                "(--target-vmaf), or use the -ntm mode."
+            ]
+        )
+
+    def probe_original_video(self):
+        args = self.args
+        # Use the VideoInfoProvider class to get the framerate, bitrate and duration.
+        self.provider = VideoInfoProvider(args.original_video_path)
+        self.duration = self.provider.get_duration()
+        self.fps = self.provider.get_framerate_fraction()
+        self.fps_float = self.provider.get_framerate_float()
+        self.original_bitrate = self.provider.get_bitrate(args.decimal_places)
+
+        line()
+        log.info("Video Quality Metrics\nGitHub.com/CrypticSignal/video-quality-metrics")
+        line()
+        log.info("Here's some information about the original video:")
+        log.info(f"Filename: {self.filename}")
+        log.info(f"Bitrate: {self.original_bitrate}")
+        log.info(f"Framerate: {self.fps} ({self.fps_float}) FPS")
+        line()
+
+        if args.video_filters:
+            log.info(
+                "The -vf/--video-filters argument has been supplied. The following filter(s) will be used:"
+            )
+            log.info(args.video_filters)
+            line()
+
+    def set_original_video(self, video_path):
+        """
+        Uses video_path (the overview, cut or filtered video) instead of the original video from now on.
+        Its duration is probed, as the encodes and libvmaf runs must know how long the video that they read is.
+        """
+        self.original_video_path = video_path
+        self.duration = VideoInfoProvider(video_path).get_duration()
+
+    def initialise_table(self):
+        args = self.args
+        self.table = PrettyTable()
+        self.metrics_list = get_metrics_list(args)
+        # With --stream-to-vmaf, the encoder is slowed down by libvmaf reading the transcode from the FIFO,
+        # so the time that it takes includes the scoring and is labelled as such.
+        time_column_name = streaming_time_column if args.stream_to_vmaf else encoding_time_column
+        self.table_column_names = [time_column_name, "Size", "Bitrate"] + self.metrics_list
+
+        if args.proxy_threshold is not None:
+            self.table_column_names.insert(3, "Scored With")
+
+        if args.adaptive_sampling:
+            self.table_column_names += ["Frames Scored", "VMAF Confidence Interval (Approx.)"]
+
+        if args.no_transcoding_mode:
+            del self.table_column_names[0]
+
+    def create_overview(self):
+        args = self.args
+        # With -o (as used by batch.py), the overview is created in the output folder, so that titles
+        # that are compared at the same time, or have the same filename, do not share an overview folder.
+        output_folder = args.output_folder if args.output_folder else f"({self.filename})"
+        clip_length = str(args.clip_length)
+        extension = Path(self.original_video_path).suffix
+        overview_path = get_overview_path(
+            output_folder, extension, args.interval, clip_length, args.overview_sampling
+        )
+        # Both engines select the same frames, but the overview videos are not bit-identical.
+        cache_key = result_cache.make_file_key(
+            "overview",
+            self.original_video_path,
+            args.interval,
+            clip_length,
+            extension,
+            args.overview_engine,
+            args.overview_sampling,
+        )
+
+        os.makedirs(output_folder, exist_ok=True)
+        if self.manifest.get_completed("overview", overview_path, []) is not None:
+            log.info(f"Resuming: the overview video has already been created: {overview_path}")
+            line()
+            self.set_original_video(overview_path)
+        elif result_cache.restore_file(cache_key, overview_path) is not None:
+            log.info(f"Using the cached overview video: {overview_path}")
+            line()
+            self.set_original_video(overview_path)
+            self.manifest.complete("overview", overview_path, [], [overview_path])
+        else:
+            result_cache.discard_output(overview_path)
+            result, concatenated_video = create_movie_overview(
+                self.original_video_path,
+                output_folder,
+                args.interval,
+                clip_length,
+                args.clip_jobs,
+                args.cpu_budget,
+                args.overview_engine,
+                args.overview_sampling,
+                args.show_commands,
+            )
+            if result:
+                self.set_original_video(concatenated_video)
+                result_cache.store_file(cache_key, concatenated_video)
+                self.manifest.complete("overview", overview_path, [], [overview_path])
+            else:
+                exit_program("Something went wrong when trying to create the overview video.")
+
+    def cut_original_video(self, output_ext, output_folder, comparison_table):
+        args = self.args
+        cut_video_path = get_cut_video_path(self.filename, args, output_ext, output_folder)
+        cache_key = result_cache.make_file_key(
+            "cut", self.original_video_path, args.encode_length, output_ext
+        )
+
+        os.makedirs(output_folder, exist_ok=True)
+        if self.manifest.get_completed("cut", cut_video_path, [args.encode_length]) is not None:
+            log.info(f"Resuming: the {args.encode_length} second version of the video already exists.")
+            write_cut_video_info(self.filename, args, comparison_table)
+            return cut_video_path
+
+        if result_cache.restore_file(cache_key, cut_video_path) is not None:
+            log.info(f"Using the cached {args.encode_length} second version of the video.")
+            write_cut_video_info(self.filename, args, comparison_table)
+        else:
+            result_cache.discard_output(cut_video_path)
+            cut_video_path = cut_video(self.filename, args, output_ext, output_folder, comparison_table)
+            result_cache.store_file(cache_key, cut_video_path)
+
+        self.manifest.complete("cut", cut_video_path, [args.encode_length], [cut_video_path])
+        return cut_video_path
+
+    def prefilter_original_video(self, output_folder):
+        """
+        Applies the -vf filters to the original video once (--prefilter). The filtered video is then encoded
+        and used as the reference of every libvmaf run, without applying the filters again.
+        """
+        args = self.args
+        prefiltered_video_path = get_prefiltered_video_path(
+            self.original_video_path, args.prefilter, output_folder
+        )
+        cache_key = result_cache.make_file_key(
+            "prefilter", self.original_video_path, args.video_filters, args.prefilter
+        )
+
+        os.makedirs(output_folder, exist_ok=True)
+        if self.manifest.get_completed("prefilter", prefiltered_video_path, [args.video_filters]) is not None:
+            log.info(f"Resuming: the filters have already been applied: {prefiltered_video_path}")
+        elif result_cache.restore_file(cache_key, prefiltered_video_path) is not None:
+            log.info(f"Using the cached filtered video: {prefiltered_video_path}")
+        else:
+            result_cache.discard_output(prefiltered_video_path)
+            prefilter_video(self.original_video_path, args, prefiltered_video_path)
+            result_cache.store_file(cache_key, prefiltered_video_path)
+
+        self.manifest.complete(
+            "prefilter", prefiltered_video_path, [args.video_filters], [prefiltered_video_path]
+        )
+        line()
+
+        # The filters have been applied, so the encodes and libvmaf runs must not apply them again.
+        self.job_args = copy(args)
+        self.job_args.video_filters = None
+        return prefiltered_video_path
+
+    def prepare_original_video(self, output_ext, output_folder, comparison_table):
+        # The user only wants to transcode the first x seconds of the video (-t/--encode-length).
+        if self.args.encode_length:
+            self.set_original_video(
+                self.cut_original_video(output_ext, output_folder, comparison_table)
+            )
+
+        if self.args.prefilter:
+            self.set_original_video(self.prefilter_original_video(output_folder))
+
+    def create_output_folder_initialise_table(self, crf_or_preset):
+        args = self.args
+        if args.output_folder:
+            output_folder = f"{args.output_folder}/{crf_or_preset} Comparison"
+        else:
+            output_folder = f"({self.filename})/{crf_or_preset} Comparison"
+
+        comparison_table = os.path.join(output_folder, "Table.txt")
+        self.table_column_names.insert(0, crf_or_preset)
+        # Set the names of the columns
+        self.table.field_names = self.table_column_names
+
+        output_ext = Path(args.original_video_path).suffix
+        # The M4V container does not support the H.265 codec.
+        if output_ext == ".m4v" and args.video_encoder == "x265":
+            output_ext = ".mp4"
+
+        return output_folder, comparison_table, output_ext
+
+    def encode_point(self, point, n_threads=None):
+        log.info(f"| {Path(point.output_folder).name} |")
+        line()
+        os.makedirs(point.output_folder, exist_ok=True)
+
+        completed = self.manifest.get_completed("encode", point.output_folder, point.manifest_key)
+        if completed is not None:
+            log.info(f"Resuming: {point.message} has already been encoded.")
+            return FfmpegProcessFactory(), completed["time_taken"]
+
+        # Encode the video.
+        factory, time_taken = encode_video(
+            self.original_video_path,
+            self.job_args,
+            point.crf,
+            point.preset,
+            point.transcode_output_path,
+            point.message,
+            self.duration,
+            n_threads if n_threads else self.threads,
+        )
+
+        # The transcode is only created if the encode succeeded.
+        if os.path.exists(point.transcode_output_path):
+            self.manifest.complete(
+                "encode",
+                point.output_folder,
+                point.manifest_key,
+                [point.transcode_output_path],
+                {"time_taken": time_taken},
+            )
+
+        return factory, time_taken
+
+    def get_size_and_bitrate(self, transcode_output_path):
+        transcode_size = os.path.getsize(transcode_output_path) / 1_000_000
+        transcoded_bitrate = self.provider.get_bitrate(self.args.decimal_places, transcode_output_path)
+        size_rounded = force_decimal_places(transcode_size, self.args.decimal_places)
+        return [f"{size_rounded} MB", transcoded_bitrate]
+
+    def score_point(self, point, encode_result, n_threads=None):
+        factory, time_taken = encode_result
+        data_for_current_row = self.get_size_and_bitrate(point.transcode_output_path)
+
+        if self.manifest.get_completed("score", point.output_folder, point.manifest_key) is not None:
+            log.info(f"Resuming: the metrics of {point.message} have already been calculated.")
+            return time_taken, data_for_current_row
+
+        discard_scores(point.json_file_path)
+        # Run the libvmaf filter.
+        run_libvmaf(
+            point.transcode_output_path,
+            self.job_args,
+            point.json_file_path,
+            self.fps,
+            self.original_video_path,
+            factory,
+            self.duration,
+            point.label,
+            n_threads,
+        )
+        self.complete_score(point, point.json_file_path)
+
+        return time_taken, data_for_current_row
+
+    def complete_score(self, point, json_file_path, stage="score"):
+        if os.path.exists(json_file_path):
+            self.manifest.complete(
+                stage,
+                point.output_folder,
+                point.manifest_key,
+                [point.transcode_output_path, json_file_path],
+            )
+
+    def encode_and_score(self, point, n_threads=None):
+        if self.args.stream_to_vmaf:
+            return self.encode_and_score_streaming_point(point, n_threads)
+
+        return self.score_point(point, self.encode_point(point, n_threads), n_threads)
+
+    def encode_and_score_streaming_point(self, point, n_threads=None):
+        log.info(f"| {Path(point.output_folder).name} |")
+        line()
+        os.makedirs(point.output_folder, exist_ok=True)
+
+        completed = self.manifest.get_completed("encode", point.output_folder, point.manifest_key)
+        if (
+            completed is not None
+            and self.manifest.get_completed("score", point.output_folder, point.manifest_key) is not None
+        ):
+            log.info(f"Resuming: {point.message} has already been encoded and scored.")
+            return completed["time_taken"], self.get_size_and_bitrate(point.transcode_output_path)
+
+        discard_scores(point.json_file_path)
+        try:
+            factory, time_taken = encode_and_score_streaming(
+                self.original_video_path,
+                self.job_args,
+                point.crf,
+                point.preset,
+                point.transcode_output_path,
+                point.message,
+                self.duration,
+                point.json_file_path,
+                self.fps,
+                point.label,
+                n_threads,
+            )
+        except StreamingError as error:
+            exit_program(error)
+
+        if os.path.exists(point.transcode_output_path):
+            self.manifest.complete(
+                "encode",
+                point.output_folder,
+                point.manifest_key,
+                [point.transcode_output_path],
+                {"time_taken": time_taken},
+            )
+            self.complete_score(point, point.json_file_path)
+
+        return time_taken, self.get_size_and_bitrate(point.transcode_output_path)
+
+    def score_points_together(self, points):
+        """
+        Encodes every comparison point and then calculates the metrics of all of the transcodes
+        in a single libvmaf pass, so that the original video is only decoded once.
+        """
+        args = self.args
+        scheduler = JobScheduler(args.cpu_budget, args.parallel_jobs)
+        encode_results = list(
+            scheduler.map_ordered(
+                lambda point: self.encode_point(point, scheduler.threads_per_job), points
+            )
+        )
+
+        unscored_points = [
+            point
+            for point in points
+            if self.manifest.get_completed("score", point.output_folder, point.manifest_key) is None
+        ]
+        if unscored_points:
+            for point in unscored_points:
+                discard_scores(point.json_file_path)
+
+            run_libvmaf_multi(
+                [point.transcode_output_path for point in unscored_points],
+                self.job_args,
+                [point.json_file_path for point in unscored_points],
+                self.fps,
+                self.original_video_path,
+                FfmpegProcessFactory(),
+                self.duration,
+                args.cpu_budget if scheduler.parallel_jobs > 1 else None,
+            )
+
+            for point in unscored_points:
+                self.complete_score(point, point.json_file_path)
+
+        return [
+            (time_taken, self.get_size_and_bitrate(point.transcode_output_path))
+            for point, (factory, time_taken) in zip(points, encode_results)
+        ]
+
+    def score_points_on_queue(self, points):
+        """
+        Adds an encode job and a score job for each comparison point to the --queue file,
+        and waits for the jobs to be run by worker processes (worker.py), which may be on other machines.
+        """
+        args = self.args
+        queue = JobQueue(args.queue)
+        job_args = vars(self.job_args)
+
+        job_ids = []
+        for point in points:
+            completed = self.manifest.get_completed("encode", point.output_folder, point.manifest_key)
+            if (
+                completed is not None
+                and self.manifest.get_completed("score", point.output_folder, point.manifest_key) is not None
+            ):
+                log.info(f"Resuming: {point.message} has already been encoded and scored.")
+                job_ids.append((None, None, completed["time_taken"]))
+                continue
+
+            discard_scores(point.json_file_path)
+            encode_job_id = queue.add_job(
+                "encode",
+                {
+                    "args": job_args,
+                    "video_path": os.path.abspath(self.original_video_path),
+                    "crf": point.crf,
+                    "preset": point.preset,
+                    "output_path": os.path.abspath(point.transcode_output_path),
+                    "message": point.message,
+                    "duration": self.duration,
+                },
+            )
+            score_job_id = queue.add_job(
+                "score",
+                {
+                    "args": job_args,
+                    "transcode_output_path": os.path.abspath(point.transcode_output_path),
+                    "json_file_path": os.path.abspath(point.json_file_path),
+                    "fps": self.fps,
+                    "original_video_path": os.path.abspath(self.original_video_path),
+                    "duration": self.duration,
+                    "crf_or_preset": point.label,
+                },
+                depends_on=encode_job_id,
+            )
+            job_ids.append((encode_job_id, score_job_id, None))
+
+        log.info(
+            f"{sum(score_job_id is not None for _, score_job_id, _ in job_ids) * 2} jobs have been added "
+            f"to {args.queue}. "
+            f'Start workers with "python worker.py --queue {args.queue}".'
+        )
+        line()
+
+        for point, (encode_job_id, score_job_id, time_taken) in zip(points, job_ids):
+            # The point was completed by an earlier run.
+            if score_job_id is None:
+                yield time_taken, self.get_size_and_bitrate(point.transcode_output_path)
+                continue
+
+            try:
+                queue.wait_for_result(score_job_id)
+                time_taken = queue.wait_for_result(encode_job_id)["time_taken"]
+            except JobFailedError as error:
+                exit_program(f"A job for {point.message} failed:\n{error}")
+
+            log.info(f"The jobs for {point.message} are done.")
+            self.manifest.complete(
+                "encode",
+                point.output_folder,
+                point.manifest_key,
+                [point.transcode_output_path],
+                {"time_taken": time_taken},
+            )
+            self.complete_score(point, point.json_file_path)
+            yield time_taken, self.get_size_and_bitrate(point.transcode_output_path)
+
+    def score_points_in_two_stages(self, points):
+        """
+        Encodes every comparison point and calculates cheap proxy scores (downscaled and subsampled).
+        Only the points whose proxy VMAF is within --proxy-margin of --proxy-threshold, i.e. those whose
+        side of the threshold is uncertain, are then scored in full. The proxy and full scores of those points
+        are compared in "Proxy Agreement.txt".
+        """
+        args = self.args
+        scheduler = JobScheduler(args.cpu_budget, args.parallel_jobs)
+
+        def encode_and_score_proxy(point):
+            encode_result = self.encode_point(point, scheduler.threads_per_job)
+            if self.manifest.get_completed("proxy", point.output_folder, point.manifest_key) is None:
+                discard_scores(point.proxy_json_file_path)
+                run_libvmaf_proxy(
+                    point.transcode_output_path,
+                    self.job_args,
+                    point.proxy_json_file_path,
+                    self.fps,
+                    self.original_video_path,
+                    FfmpegProcessFactory(),
+                    self.duration,
+                    scheduler.threads_per_job,
+                )
+                self.complete_score(point, point.proxy_json_file_path, "proxy")
+
+            return encode_result
+
+        encode_results = list(scheduler.map_ordered(encode_and_score_proxy, points))
+        proxy_vmaf_scores = [get_mean_vmaf(point.proxy_json_file_path) for point in points]
+
+        full_points = []
+        for point, encode_result, proxy_vmaf in zip(points, encode_results, proxy_vmaf_scores):
+            if abs(proxy_vmaf - args.proxy_threshold) <= args.proxy_margin:
+                full_points.append((point, encode_result))
+            else:
+                point.scored_with = "Proxy"
+
+        line()
+        log.info(
+            f"{len(full_points)} of the {len(points)} transcodes have a proxy VMAF within "
+            f"{args.proxy_margin} of {args.proxy_threshold} and will be scored in full."
+        )
+        line()
+
+        list(
+            scheduler.map_ordered(
+                lambda full_point: self.score_point(*full_point, scheduler.threads_per_job),
+                full_points,
+            )
+        )
+
+        if full_points:
+            save_proxy_agreement_table(
+                os.path.join(os.path.dirname(points[0].output_folder), "Proxy Agreement.txt"),
+                self.table.field_names[0],
+                [point.label for point, encode_result in full_points],
+                [
+                    proxy_vmaf
+                    for point, proxy_vmaf in zip(points, proxy_vmaf_scores)
+                    if point.scored_with == "Full"
+                ],
+                [get_mean_vmaf(point.json_file_path) for point, encode_result in full_points],
+                args.proxy_threshold,
+                args.decimal_places,
+            )
+
+        return [
+            (time_taken, self.get_size_and_bitrate(point.transcode_output_path))
+            for point, (factory, time_taken) in zip(points, encode_results)
+        ]
+
+    def run_comparison(self, points, comparison_table, table_info_video, crf_or_preset_info):
+        """
+        Encodes and scores each comparison point, either running --parallel-jobs points at the same time,
+        overlapping the encode of each point with the scoring of the previous one (--pipeline)
+        scoring all of the transcodes in one pass (--shared-reference),
+        scoring them in two stages (--proxy-threshold)
+        or handing the jobs to worker processes through a job queue (--queue).
+        The rows of the table are added in the same order as the points, so Table.txt and the graphs
+        are the same regardless of how many jobs are used.
+        """
+        args = self.args
+        if args.queue:
+            results = self.score_points_on_queue(points)
+        elif args.proxy_threshold is not None:
+            results = self.score_points_in_two_stages(points)
+        elif args.shared_reference:
+            results = self.score_points_together(points)
+        elif args.pipeline:
+            # The encoding stage and the scoring stage each get half of the CPU budget.
+            scheduler = JobScheduler(args.cpu_budget, 2)
+            log.info(
+                "Pipelined mode: each encode will run alongside the VMAF calculation of the previous "
+                f"transcode, using {scheduler.threads_per_job} threads each."
+            )
+            line()
+            results = scheduler.run_pipelined(
+                lambda point: self.encode_point(point, scheduler.threads_per_job),
+                lambda point, encode_result: self.score_point(
+                    point, encode_result, scheduler.threads_per_job
+                ),
+                points,
+                args.pipeline_depth,
+            )
+        else:
+            scheduler = JobScheduler(args.cpu_budget, args.parallel_jobs)
+            if scheduler.parallel_jobs > 1:
+                log.info(
+                    f"{scheduler.parallel_jobs} jobs will run at the same time, "
+                    f"each using {scheduler.threads_per_job} threads."
+                )
+                line()
+            results = scheduler.map_ordered(
+                lambda point: self.encode_and_score(point, scheduler.threads_per_job), points
+            )
+
+        vmaf_scores = []
+
+        for point, (time_taken, data_for_current_row) in zip(points, results):
+            json_file_path = point.json_file_path
+            if args.proxy_threshold is not None:
+                data_for_current_row.append(point.scored_with)
+                if point.scored_with == "Proxy":
+                    json_file_path = point.proxy_json_file_path
+
+            # The row and the graphs of the point were created by an earlier run.
+            completed = self.manifest.get_completed("row", point.output_folder, point.manifest_key)
+            if completed is not None:
+                data_for_current_row = completed["row"]
+                self.table.add_row(data_for_current_row)
+                save_table(comparison_table, self.table, args)
+                vmaf_scores.append(completed["vmaf"])
+            else:
+                vmaf_scores.append(
+                    get_metrics_save_table(
+                        comparison_table,
+                        json_file_path,
+                        args,
+                        args.decimal_places,
+                        data_for_current_row,
+                        self.table,
+                        point.output_folder,
+                        time_taken,
+                        point.label,
+                    )
+                )
+                graph_paths = [
+                    os.path.join(point.output_folder, f"{metric_type}.png")
+                    for metric_type in self.metrics_list
+                ]
+                self.manifest.complete(
+                    "row",
+                    point.output_folder,
+                    point.manifest_key,
+                    [json_file_path] + [path for path in graph_paths if os.path.exists(path)],
+                    {"row": data_for_current_row, "vmaf": vmaf_scores[-1]},
+                )
+
+            set_point_results(
+                point, self.table.field_names, data_for_current_row, vmaf_scores[-1],
+                time_taken, comparison_table, json_file_path,
+            )
+            mean_vmaf = force_decimal_places(np.mean(vmaf_scores), args.decimal_places)
+
+            write_table_info(
+                comparison_table, table_info_video, self.original_bitrate, args, crf_or_preset_info
+            )
+
+        return vmaf_scores, mean_vmaf
+
+    def get_target_score(self, point, mean_vmaf):
+        # The mean VMAF, or the --target-percentile percentile of the VMAF of the frames.
+        if self.args.target_percentile is None:
+            return mean_vmaf
+
+        frame_numbers, scores = point.get_frame_scores(["vmaf"])
+        return float(np.percentile(scores["vmaf"], self.args.target_percentile))
+
+    def report_overview_prediction_error(self, points, vmaf_scores, crf_or_preset, output_folder):
+        """
+        Compares the VMAF of each transcode of the overview video with the VMAF of the same transcode of
+        the whole video, which is in the --overview-reference folder created by a run without Overview Mode.
+        """
+        args = self.args
+        reference_json_file_paths = [
+            os.path.join(
+                args.overview_reference, Path(point.output_folder).name, "Metrics of each frame.json"
+            )
+            for point in points
+        ]
+        save_prediction_error_table(
+            os.path.join(output_folder, "Overview Prediction Error.txt"),
+            crf_or_preset,
+            [point.label for point in points],
+            vmaf_scores,
+            reference_json_file_paths,
+            args.decimal_places,
+        )
+
+    def get_default_crf(self):
+        if self.video_encoder == "x264":
+            return "23"
+        elif self.video_encoder == "x265":
+            return "28"
+        elif self.video_encoder == "libaom-av1":
+            return "32"
+
+    def run_crf_search(self):
+        args = self.args
+        preset = args.preset[0] if is_list(args.preset) else args.preset
+        crf_min, crf_max = args.crf_range if args.crf_range else crf_ranges[self.video_encoder]
+        start_crf = args.crf[0] if is_list(args.crf) else int(self.get_default_crf())
+        target_name = (
+            "mean VMAF" if args.target_percentile is None
+            else f"{args.target_percentile}th percentile VMAF"
+        )
+        log.info("CRF search mode activated.")
+        log.info(
+            f"Searching for the highest CRF value between {crf_min} and {crf_max} with a {target_name} "
+            f"of at least {args.target_vmaf}. The {preset} preset will be used."
+        )
+        line()
+
+        output_folder, comparison_table, output_ext = self.create_output_folder_initialise_table("CRF")
+
+        self.prepare_original_video(output_ext, output_folder, comparison_table)
+
+        # The rows are sorted by CRF value rather than in the order in which the CRF values were tried.
+        self.table.sortby = "CRF"
+        probes = {}
+        mean_vmaf_scores = {}
+        points = []
+
+        while True:
+            crf = get_next_crf(probes, args.target_vmaf, crf_min, crf_max, start_crf)
+            if crf is None:
+                break
+
+            point = ComparisonPoint(
+                crf,
+                preset,
+                crf,
+                f"{output_folder}/CRF {crf}",
+                os.path.join(f"{output_folder}/CRF {crf}", f"CRF {crf}{output_ext}"),
+                f"CRF {crf}",
+            )
+            points.append(point)
+            vmaf_scores, mean_vmaf = self.run_comparison(
+                [point], comparison_table, self.filename, f"Preset {preset}"
+            )
+            mean_vmaf_scores[crf] = vmaf_scores[0]
+            probes[crf] = self.get_target_score(point, vmaf_scores[0])
+            log.info(f"CRF {crf}: {target_name} {force_decimal_places(probes[crf], args.decimal_places)}")
+            line()
+
+        best_crf = get_search_result(probes, args.target_vmaf)
+        if best_crf is None:
+            search_result = (
+                f"None of the CRF values between {crf_min} and {crf_max} achieved a {target_name} "
+                f"of at least {args.target_vmaf}."
+            )
+        else:
+            search_result = (
+                f"The highest CRF value with a {target_name} of at least {args.target_vmaf} "
+                f"is {best_crf} ({len(probes)} CRF values were tried)."
+            )
+
+        log.info(search_result)
+        with open(comparison_table, "a") as f:
+            f.write(f"\n{search_result}")
+
+        crf_values = sorted(mean_vmaf_scores)
+        vmaf_scores = [mean_vmaf_scores[crf] for crf in crf_values]
+        # Plot a bar graph showing the average VMAF score of each CRF value that was tried.
+        plot_graph(
+            "CRF vs VMAF",
+            "CRF",
+            "VMAF",
+            crf_values,
+            vmaf_scores,
+            force_decimal_places(np.mean(vmaf_scores), args.decimal_places),
+            f"{output_folder}/CRF vs VMAF",
+            bar_graph=True,
+        )
+
+        result = RunResult(
+            "crf_search",
+            output_folder,
+            comparison_table,
+            self.table.field_names,
+            sorted(points, key=lambda point: point.crf),
+            self.original_bitrate,
+        )
+        result.best_crf = best_crf
+        return result
+
+    def run_crf_comparison(self):
+        args = self.args
+        log.info("CRF comparison mode activated.")
+        crf_values = args.crf
+        crf_values_string = ", ".join(str(crf) for crf in crf_values)
+        preset = args.preset[0] if is_list(args.preset) else args.preset
+        log.info(
+            f"CRF values {crf_values_string} will be compared and the {preset} preset will be used."
+        )
+        line()
+
+        output_folder, comparison_table, output_ext = self.create_output_folder_initialise_table("CRF")
+
+        self.prepare_original_video(output_ext, output_folder, comparison_table)
+
+        points = [
+            ComparisonPoint(
+                crf,
+                preset,
+                crf,
+                f"{output_folder}/CRF {crf}",
+                os.path.join(f"{output_folder}/CRF {crf}", f"CRF {crf}{output_ext}"),
+                f"CRF {crf}",
+            )
+            for crf in crf_values
+        ]
+
+        vmaf_scores, mean_vmaf = self.run_comparison(
+            points, comparison_table, self.filename, f"Preset {preset}"
+        )
+
+        if args.overview_reference:
+            self.report_overview_prediction_error(points, vmaf_scores, "CRF", output_folder)
+
+        # Plot a bar graph showing the average VMAF score of each CRF value.
+        plot_graph(
+            "CRF vs VMAF",
+            "CRF",
+            "VMAF",
+            crf_values,
+            vmaf_scores,
+            mean_vmaf,
+            f"{output_folder}/CRF vs VMAF",
+            bar_graph=True,
+        )
+
+        return RunResult(
+            "crf_comparison",
+            output_folder,
+            comparison_table,
+            self.table.field_names,
+            points,
+            self.original_bitrate,
+        )
+
+    def run_preset_comparison(self):
+        args = self.args
+        log.info("Presets comparison mode activated.")
+        chosen_presets = args.preset
+        presets_string = ", ".join(chosen_presets)
+        crf = args.crf[0] if is_list(args.crf) else self.get_default_crf()
+        log.info(f"Presets {presets_string} will be compared at a CRF of {crf}.")
+        line()
+
+        output_folder, comparison_table, output_ext = self.create_output_folder_initialise_table(
+            "Preset"
+        )
+
+        self.prepare_original_video(output_ext, output_folder, comparison_table)
+
+        points = [
+            ComparisonPoint(
+                crf,
+                preset,
+                preset,
+                f"{output_folder}/Preset {preset}",
+                os.path.join(f"{output_folder}/Preset {preset}", f"{preset}{output_ext}"),
+                f"preset {preset}",
+            )
+            for preset in chosen_presets
+        ]
+
+        vmaf_scores, mean_vmaf = self.run_comparison(
+            points, comparison_table, self.original_video_path, f"CRF {crf}"
+        )
+
+        if args.overview_reference:
+            self.report_overview_prediction_error(points, vmaf_scores, "Preset", output_folder)
+
+        # Plot a bar graph showing the average VMAF score of each preset.
+        plot_graph(
+            "Preset vs VMAF",
+            "Preset",
+            "VMAF",
+            chosen_presets,
+            vmaf_scores,
+            mean_vmaf,
+            f"{output_folder}/Preset vs VMAF",
+            bar_graph=True,
+        )
+
+        return RunResult(
+            "preset_comparison",
+            output_folder,
+            comparison_table,
+            self.table.field_names,
+            points,
+            self.original_bitrate,
+        )
+
+    def run_no_transcoding_mode(self):
+        args = self.args
+        transcoded_video_paths = args.transcoded_video_path
+        points = []
+        for transcoded_video_path in transcoded_video_paths:
+            if args.output_folder and len(transcoded_video_paths) == 1:
+                output_folder = args.output_folder
+            elif args.output_folder:
+                output_folder = os.path.join(args.output_folder, Path(transcoded_video_path).name)
+            else:
+                output_folder = f"[VQM] {Path(transcoded_video_path).name}"
+
+            os.makedirs(output_folder, exist_ok=True)
+            points.append(
+                ComparisonPoint(
+                    None,
+                    None,
+                    Path(transcoded_video_path).name,
+                    output_folder,
+                    transcoded_video_path,
+                    transcoded_video_path,
+                )
+            )
+
+        factory = FfmpegProcessFactory()
+        if len(points) == 1:
+            run_libvmaf(
+                points[0].transcode_output_path,
+                args,
+                points[0].json_file_path,
+                self.fps,
+                self.original_video_path,
+                factory,
+                self.duration,
+            )
+        else:
+            # Decode the original video once and compare it with all of the transcoded videos.
+            run_libvmaf_multi(
+                [point.transcode_output_path for point in points],
+                args,
+                [point.json_file_path for point in points],
+                self.fps,
+                self.original_video_path,
+                factory,
+                self.duration,
+            )
+
+        self.table.field_names = self.table_column_names
+
+        for point in points:
+            table_path = os.path.join(point.output_folder, "Table.txt")
+            # Each transcoded video has its own table.
+            self.table.clear_rows()
+
+            data_for_current_row = self.get_size_and_bitrate(point.transcode_output_path)
+
+            mean_vmaf = get_metrics_save_table(
+                table_path,
+                point.json_file_path,
+                args,
+                args.decimal_places,
+                data_for_current_row,
+                self.table,
+                point.output_folder,
+                time_taken=None,
+            )
+
+            with open(table_path, "a") as f:
+                f.write(f"\nOriginal Bitrate: {self.original_bitrate}")
+
+            set_point_results(
+                point, self.table.field_names, data_for_current_row, mean_vmaf,
+                None, table_path, point.json_file_path,
+            )
+
+        return RunResult(
+            "no_transcoding",
+            ", ".join(point.output_folder for point in points),
+            None,
+            self.table.field_names,
+            points,
+            self.original_bitrate,
+        )
+
+
+def discard_scores(json_file_path):
+    # So that the log of an earlier run is not mistaken for the log of this run if libvmaf fails.
+    if os.path.exists(json_file_path):
+        os.remove(json_file_path)
+
+
+def set_point_results(point, column_names, row, mean_vmaf, time_taken, table_path, scores_path):
+    point.row = dict(zip(column_names, row))
+    point.mean_vmaf = mean_vmaf
+    point.time_taken = time_taken
+    point.table_path = table_path
+    point.scores_path = scores_path
+
+
+def apply_process_settings(config):
+    """
+    Applies the settings of config that affect the whole process rather than a single run: --no-graphs,
+    --max-processes, --no-probe-cache and --cache-dir. Runs that happen at the same time share these settings,
+    so they are applied once, from the main thread (which is the only thread that can handle Ctrl-C).
+    """
+    set_headless(config.no_graphs)
+
+    if config.max_processes and not process_supervisor.enabled:
+        process_supervisor.start(config.max_processes)
+
+    # Both caches are always set, so that the settings of an earlier run in the process do not carry over.
+    probe_cache.set_cache_dir(None if config.no_probe_cache else default_probe_cache_dir)
+    result_cache.set_cache_dir(config.cache_dir)
+
+
+def run(config):
+    """
+    Runs the comparison (or -ntm mode) described by config, which is either made by make_config or is
+    the Namespace of the parsed command line arguments, and returns a RunResult.
+    Raises ConfigError if the config is not valid. As with the command line, a failed FFmpeg process
+    ends the run with SystemExit.
+    """
+    validate_config(config)
+    apply_process_settings(config)
+    return ComparisonRun(config).run()
@@ -0,0 +1,74 @@
+import math
+
+# The range of CRF values supported by each encoder.
+crf_ranges = {
+    "x264": (0, 51),
+    "x265": (0, 51),
+    "libaom-av1": (0, 63),
+}
+
+# How many VMAF points the score is assumed to drop per CRF step, until two CRF values have been scored.
+assumed_vmaf_per_crf = 1.5
+
+
+def extrapolate_crf(probes, target):
+    """
+    Estimates the CRF value at which the score would equal target, using the straight line through the
+    two probes whose scores are closest to the target. Returns None if there are fewer than two probes or
+    if the scores of those probes do not decrease as the CRF value increases.
+    """
+    if len(probes) < 2:
+        return None
+
+    (crf_a, score_a), (crf_b, score_b) = sorted(
+        probes.items(), key=lambda probe: abs(probe[1] - target)
+    )[:2]
+    if (score_b - score_a) * (crf_b - crf_a) >= 0:
+        return None
+
+    return crf_a + (target - score_a) * (crf_b - crf_a) / (score_b - score_a)
+
+
+def get_next_crf(probes, target, crf_min, crf_max, start_crf):
+    """
+    Returns the next CRF value to encode and score when searching for the highest CRF value whose score
+    is at least target, or None if the search is finished. probes maps each CRF value that has already
+    been scored to its score. The score is assumed to decrease as the CRF value increases.
+
+    Until both a CRF value that reaches the target and one that does not are known, the next CRF value is
+    extrapolated from the scores so far. After that, the next CRF value is interpolated between the two,
+    but at least a quarter of the way into the range of CRF values that are left, so that the range
+    shrinks at least as quickly as with bisection (give or take) even if the curve is not straight.
+    """
+    if not probes:
+        return min(max(start_crf, crf_min), crf_max)
+
+    passing = [crf for crf, score in probes.items() if score >= target]
+    failing = [crf for crf, score in probes.items() if score < target]
+
+    # The range of CRF values that could still be the answer.
+    low = max(passing) + 1 if passing else crf_min
+    high = min(failing) - 1 if failing else crf_max
+    if low > high:
+        return None
+
+    if passing and failing:
+        passing_crf, failing_crf = max(passing), min(failing)
+        estimate = passing_crf + (target - probes[passing_crf]) * (failing_crf - passing_crf) / (
+            probes[failing_crf] - probes[passing_crf]
+        )
+        quarter = (high - low) // 4
+        return min(max(math.floor(estimate), low + quarter), high - quarter)
+
+    estimate = extrapolate_crf(probes, target)
+    if estimate is None:
+        nearest_crf = max(passing) if passing else min(failing)
+        estimate = nearest_crf + (probes[nearest_crf] - target) / assumed_vmaf_per_crf
+
+    return min(max(math.floor(estimate), low), high)
+
+
+def get_search_result(probes, target):
+    """Returns the highest CRF value whose score is at least target, or None if there is no such value."""
+    passing = [crf for crf, score in probes.items() if score >= target]
+    return max(passing) if passing else None
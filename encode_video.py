@@ -1,10 +1,17 @@
+import os
+from pathlib import Path
+import shutil
+
 from ffmpeg_process_factory import EncodingArguments, FfmpegProcessFactory
-from utils import Logger, Timer
+from result_cache import result_cache
+from scheduler import JobScheduler
+from supervisor import run_command
+from utils import exit_program, get_partial_path, Logger, Timer, VideoInfoProvider
 
 log = Logger("encode_video.py")
 
 
-def encode_video(video_path, args, crf, preset, output_path, message, duration):
+def get_encoding_arguments(video_path, args, crf, preset, output_path, threads=None):
     arguments = EncodingArguments(video_path, args.video_encoder, output_path)
 
     if args.video_encoder == "libaom-av1":
@@ -14,15 +21,153 @@ def encode_video(video_path, args, crf, preset, output_path, message, duration):
     arguments.preset(preset)
     video_filters = args.video_filters if args.video_filters else None
     arguments.video_filters(video_filters)
+    arguments.threads(threads)
+
+    return arguments
+
+
+def get_encode_cache_key(video_path, arguments, output_path, encode_chunks=1):
+    if not result_cache.enabled:
+        return None
+
+    # The input and output paths do not affect the transcode, so they are not part of the key.
+    placeholders = {video_path: "<input>", output_path: "<output>"}
+    encoder_arguments = [placeholders.get(argument, argument) for argument in arguments.get_arguments()]
+    # Encoding in chunks produces a different transcode, as each chunk starts with a keyframe.
+    if encode_chunks > 1:
+        encoder_arguments.append(f"<{encode_chunks} chunks>")
+
+    return result_cache.make_file_key(
+        "encode", video_path, encoder_arguments, Path(output_path).suffix
+    )
+
+
+def split_into_chunks(video_path, chunks_folder, chunk_count):
+    """
+    Splits the video (without re-encoding it) into roughly chunk_count chunks. As the video is not
+    re-encoded, each chunk starts at a keyframe, which is usually where a scene cut is.
+    """
+    duration = VideoInfoProvider(video_path).get_duration()
+    subprocess_split_args = [
+        "ffmpeg",
+        "-loglevel",
+        "warning",
+        "-y",
+        "-i",
+        video_path,
+        "-map",
+        "0:V",
+        "-c",
+        "copy",
+        "-f",
+        "segment",
+        "-segment_time",
+        str(duration / chunk_count),
+        "-reset_timestamps",
+        "1",
+        os.path.join(chunks_folder, "source%04d.mkv"),
+    ]
+    if run_command(subprocess_split_args, capture_output=False).returncode != 0:
+        exit_program(f"Unable to split {video_path} into chunks.")
+
+    return sorted(
+        os.path.join(chunks_folder, filename)
+        for filename in os.listdir(chunks_folder)
+        if filename.startswith("source")
+    )
+
+
+def encode_video_in_chunks(video_path, args, crf, preset, output_path, message, threads=None):
+    """
+    Splits the video into --encode-chunks chunks at keyframes, encodes the chunks at the same time
+    with the same encoding arguments and joins the encoded chunks without re-encoding them.
+    """
+    chunks_folder = os.path.join(os.path.dirname(output_path), "chunks")
+    if os.path.exists(chunks_folder):
+        shutil.rmtree(chunks_folder)
+    os.makedirs(chunks_folder)
+
+    source_chunks = split_into_chunks(video_path, chunks_folder, args.encode_chunks)
+    scheduler = JobScheduler(threads if threads else args.cpu_budget, len(source_chunks))
+    log.info(
+        f"Converting the video using {message} in {len(source_chunks)} chunks, "
+        f"{scheduler.parallel_jobs} at a time..."
+    )
 
+    def encode_chunk(source_chunk):
+        encoded_chunk = os.path.join(
+            chunks_folder, os.path.basename(source_chunk).replace("source", "encoded")
+        )
+        arguments = get_encoding_arguments(
+            source_chunk, args, crf, preset, encoded_chunk, scheduler.threads_per_job
+        )
+        process = FfmpegProcessFactory().create_process(arguments, args)
+        process.run(source_chunk, VideoInfoProvider(source_chunk).get_duration())
+        if process.returncode != 0:
+            exit_program(f"Unable to encode {source_chunk}.")
+
+        return encoded_chunk
+
+    encoded_chunks = list(scheduler.map_ordered(encode_chunk, source_chunks))
+
+    txt_file_path = os.path.join(chunks_folder, "chunks.txt")
+    with open(txt_file_path, "w") as f:
+        for encoded_chunk in encoded_chunks:
+            f.write(f"file '{os.path.basename(encoded_chunk)}'\n")
+
+    subprocess_concatenate_args = [
+        "ffmpeg",
+        "-loglevel",
+        "warning",
+        "-y",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        txt_file_path,
+        "-c",
+        "copy",
+        output_path,
+    ]
+    result = run_command(subprocess_concatenate_args, capture_output=False)
+    shutil.rmtree(chunks_folder)
+
+    return result.returncode == 0
+
+
+def encode_video(video_path, args, crf, preset, output_path, message, duration, threads=None):
+    # The transcode is only moved to output_path once it is complete.
+    partial_path = get_partial_path(output_path)
+    arguments = get_encoding_arguments(video_path, args, crf, preset, partial_path, threads)
     factory = FfmpegProcessFactory()
-    process = factory.create_process(arguments, args)
 
-    log.info(f"Converting the video using {message}...")
+    cache_key = get_encode_cache_key(video_path, arguments, partial_path, args.encode_chunks)
+    metadata = result_cache.restore_file(cache_key, output_path)
+    if metadata is not None:
+        log.info(f"Using the cached transcode for {message}.")
+        return factory, metadata["time_taken"]
+
+    result_cache.discard_output(output_path)
+
     timer = Timer()
-    timer.start()
-    process.run(video_path, duration)
+    # The encoding time of a chunked encode is the time taken by the whole process (splitting, encoding
+    # the chunks at the same time and joining them), not the sum of the encoding time of each chunk.
+    if args.encode_chunks > 1:
+        timer.start()
+        success = encode_video_in_chunks(video_path, args, crf, preset, partial_path, message, threads)
+    else:
+        process = factory.create_process(arguments, args)
+        log.info(f"Converting the video using {message}...")
+        timer.start()
+        process.run(video_path, duration)
+        success = process.returncode == 0
+
     time_taken = timer.stop(args.decimal_places)
     log.info("Done!")
 
+    if success:
+        os.replace(partial_path, output_path)
+        result_cache.store_file(cache_key, output_path, {"time_taken": time_taken})
+
     return factory, time_taken
@@ -1,6 +1,9 @@
 import subprocess
+import sys
 
-from utils import line, Logger, show_progress_bar, VideoInfoProvider
+from progress import progress_reader, ProgressBar, ProgressStream
+from supervisor import process_supervisor
+from utils import line, Logger, VideoInfoProvider
 
 log = Logger("factory")
 
@@ -11,6 +14,8 @@ class EncodingArguments:
         self._encoder = encoder
         self._outfile = outfile
         self._base_ffmpeg_arguments = ["-i", self._infile]
+        self._threads = []
+        self._tee_outfile = None
 
     # libaom-av1 "cpu-used" option.
     def av1_cpu_used(self, value):
@@ -28,9 +33,32 @@ class EncodingArguments:
         else:
             self._video_filters = ""
 
+    def threads(self, value):
+        if value is None:
+            self._threads = []
+        elif self._encoder == "x265":
+            # x265 uses its own thread pool, so the size of the pool must also be set.
+            self._threads = ["-threads", str(value), "-x265-params", f"pools={value}"]
+        else:
+            self._threads = ["-threads", str(value)]
+
     def outfile(self, value):
         self._outfile = value
 
+    # Also write the encoded video to a second output (e.g. a FIFO) in the NUT format.
+    def tee_output(self, path):
+        self._tee_outfile = path
+
+    def _get_output_arguments(self):
+        if self._tee_outfile is None:
+            return [self._outfile]
+
+        return [
+            "-f",
+            "tee",
+            f"{_escape_tee_path(self._outfile)}|[f=nut]{_escape_tee_path(self._tee_outfile)}",
+        ]
+
     def get_arguments(self):
         base_encoding_arguments = [
             "-map",
@@ -47,15 +75,17 @@ class EncodingArguments:
                 "0",
                 "-cpu-used",
                 self._av1_cpu_used,
+                *self._threads,
                 *self._video_filters,
-                self._outfile,
+                *self._get_output_arguments(),
             ]
         else:
             encoding_arguments = base_encoding_arguments + [
                 "-preset",
                 self._preset,
+                *self._threads,
                 *self._video_filters,
-                self._outfile,
+                *self._get_output_arguments(),
             ]
 
         return self._base_ffmpeg_arguments + encoding_arguments
@@ -67,6 +97,10 @@ class LibVmafArguments:
         self._distorted_video = distorted_video
         self._original_video = original_video
         self._vmaf_options = vmaf_options
+        self._distorted_format = []
+        self._seek = []
+        self._trim = ""
+        self._scale = ""
 
     def video_filters(self, filters):
         if filters is not None:
@@ -74,14 +108,31 @@ class LibVmafArguments:
         else:
             self._video_filters = ""
 
+    # Needed when the distorted video is read from a FIFO, as the format cannot be probed by seeking.
+    def distorted_format(self, value):
+        self._distorted_format = ["-f", value] if value else []
+
+    # Only compare frame_count frames (or all of the remaining frames if frame_count is None),
+    # starting at start_time seconds in both videos.
+    def segment(self, start_time, frame_count):
+        self._seek = ["-ss", str(start_time)] if start_time else []
+        self._trim = f",trim=end_frame={frame_count}" if frame_count else ""
+
+    # Downscale both videos to a height of max_height if they are taller.
+    def scale(self, max_height):
+        self._scale = f",scale=-2:'min({max_height},ih)':flags=bicubic" if max_height else ""
+
     def get_arguments(self):
         return [
             "-r",
             self._fps,
+            *self._seek,
+            *self._distorted_format,
             "-i",
             self._distorted_video,
             "-r",
             self._fps,
+            *self._seek,
             "-i",
             self._original_video,
             "-map",
@@ -89,8 +140,8 @@ class LibVmafArguments:
             "-map",
             "1:V",
             "-lavfi",
-            f"[0:v]setpts=PTS-STARTPTS[dist];"
-            f"[1:v]setpts=PTS-STARTPTS{self._video_filters}[ref];"
+            f"[0:v]setpts=PTS-STARTPTS{self._trim}{self._scale}[dist];"
+            f"[1:v]setpts=PTS-STARTPTS{self._trim}{self._video_filters}{self._scale}[ref];"
             f"[dist][ref]libvmaf={self._vmaf_options}",
             "-f",
             "null",
@@ -98,6 +149,47 @@ class LibVmafArguments:
         ]
 
 
+class MultiLibVmafArguments:
+    """
+    Compares several distorted videos with the same original video. The original video is decoded once,
+    split in the filter graph and fed to one libvmaf filter per distorted video.
+    """
+
+    def __init__(self, fps, distorted_videos, original_video, vmaf_options):
+        self._fps = fps
+        self._distorted_videos = distorted_videos
+        self._original_video = original_video
+        # One string of libvmaf options (and therefore one log path) per distorted video.
+        self._vmaf_options = vmaf_options
+
+    def video_filters(self, filters):
+        if filters is not None:
+            self._video_filters = f",{filters}"
+        else:
+            self._video_filters = ""
+
+    def get_arguments(self):
+        count = len(self._distorted_videos)
+        # The original video is the last input.
+        reference_index = count
+
+        input_arguments = []
+        for video in self._distorted_videos + [self._original_video]:
+            input_arguments += ["-r", self._fps, "-i", video]
+
+        reference_labels = "".join(f"[ref{i}]" for i in range(count))
+        filter_graph = [
+            f"[{reference_index}:v]setpts=PTS-STARTPTS{self._video_filters},split={count}{reference_labels}"
+        ]
+        output_arguments = []
+        for i, vmaf_options in enumerate(self._vmaf_options):
+            filter_graph.append(f"[{i}:v]setpts=PTS-STARTPTS[dist{i}]")
+            filter_graph.append(f"[dist{i}][ref{i}]libvmaf={vmaf_options.strip()}[vmaf{i}]")
+            output_arguments += ["-map", f"[vmaf{i}]", "-f", "null", "-"]
+
+        return input_arguments + ["-lavfi", ";".join(filter_graph)] + output_arguments
+
+
 class FfmpegProcessFactory:
     def create_process(self, arguments, args):
         _process_base_arguments = [
@@ -113,14 +205,31 @@ class FfmpegProcessFactory:
         return process
 
 
+def _escape_tee_path(path):
+    # Characters that have a special meaning in the tee muxer's list of outputs.
+    for character in ["\\", "'", "|", "[", "]"]:
+        path = path.replace(character, f"\\{character}")
+    return path
+
+
 class FfmpegProcess:
     def __init__(self, arguments, args):
         self._arguments = arguments
+        self._callbacks = []
+        self._stream = None
+        self._returncode = None
         if args.show_commands:
             line()
             log.debug(f'Running the following command:\n{" ".join(self._arguments)}')
             line()
 
+    def subscribe(self, callback):
+        """
+        Calls callback with a ProgressEvent (frame, fps, bitrate, total_size, out_time, speed etc.)
+        each time FFmpeg reports its progress. Must be called before run().
+        """
+        self._callbacks.append(callback)
+
     def run(self, video_path, duration):
         self._video_path = video_path
         self._duration = duration
@@ -128,7 +237,50 @@ class FfmpegProcess:
         video_info = VideoInfoProvider(self._video_path)
         self._total_frames = int((video_info.get_framerate_float() * self._duration) + 1)
 
-        # Start the FFmpeg process.
-        self._process = subprocess.Popen(self._arguments, stdout=subprocess.PIPE)
         # Use tqdm to show a progress bar.
-        show_progress_bar(self._process, self._total_frames)
+        progress_bar = ProgressBar(self._total_frames)
+        self._stream = ProgressStream()
+        self._stream.subscribe(progress_bar.update)
+        for callback in self._callbacks:
+            self._stream.subscribe(callback)
+        # FFmpeg's warnings and errors are shown above the progress bar.
+        self._stream.subscribe_stderr(progress_bar.write)
+
+        try:
+            if process_supervisor.enabled:
+                # The supervisor kills all of the FFmpeg processes on Ctrl-C.
+                self._returncode, _, _ = process_supervisor.run(self._arguments, self._stream)
+            else:
+                self._run_process()
+        except KeyboardInterrupt:
+            progress_bar.close()
+            log.info("[KeyboardInterrupt] FFmpeg process killed. Exiting Video Quality Metrics.")
+            sys.exit(0)
+
+        progress_bar.close()
+
+    def _run_process(self):
+        # Start the FFmpeg process.
+        process = subprocess.Popen(self._arguments, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        progress_reader.watch(process, self._stream)
+
+        try:
+            self._stream.wait()
+            self._returncode = process.wait()
+        except KeyboardInterrupt:
+            process.kill()
+            raise
+
+    @property
+    def returncode(self):
+        return self._returncode
+
+    @property
+    def last_progress(self):
+        # The last ProgressEvent, or None if FFmpeg has not reported its progress.
+        return self._stream.last_event if self._stream else None
+
+    @property
+    def stderr_lines(self):
+        # The last lines that FFmpeg wrote to stderr.
+        return list(self._stream.stderr_lines) if self._stream else []
@@ -0,0 +1,305 @@
+from array import array
+import json
+import os
+from threading import get_ident
+
+import numpy as np
+
+# The number of characters read from the libvmaf log at a time.
+_CHUNK_SIZE = 1024 * 1024
+
+
+class FrameLogError(Exception):
+    pass
+
+
+def read_frame_log(log_path, metric_keys):
+    """
+    Reads the per-frame scores from a JSON log created by libvmaf without loading the whole file.
+    The frames are decoded one at a time and their scores are appended to compact float32 buffers,
+    so the memory used is proportional to the number of frames multiplied by the number of metrics.
+
+    Returns the frame numbers and a dictionary that maps each of the metric keys found in the log
+    (e.g. "vmaf" or "psnr_y") to a float32 NumPy array with the score of each frame.
+    """
+    frame_numbers = array("l")
+    scores = {metric_key: array("f") for metric_key in metric_keys}
+    found_keys = set()
+
+    for frame in _iterate_frames(log_path):
+        frame_numbers.append(frame["frameNum"])
+        metrics = frame["metrics"]
+        for metric_key, metric_scores in scores.items():
+            score = metrics.get(metric_key)
+            if score is None:
+                metric_scores.append(np.nan)
+            else:
+                metric_scores.append(score)
+                found_keys.add(metric_key)
+
+    # np.frombuffer uses the buffers directly instead of copying them.
+    frame_numbers = np.frombuffer(frame_numbers, dtype=np.dtype(frame_numbers.typecode))
+    scores = {
+        metric_key: np.frombuffer(metric_scores, dtype=np.float32)
+        for metric_key, metric_scores in scores.items()
+        if metric_key in found_keys
+    }
+
+    return frame_numbers, scores
+
+
+def read_frame_columns(log_path):
+    """
+    Reads every metric of every frame from a JSON log created by libvmaf without loading the whole file.
+    Unlike read_frame_log(), the scores are kept as float64, so that they can be written back unchanged.
+
+    Returns the frame numbers and a dictionary that maps each metric key found in the log to a NumPy array
+    with the score of each frame (NaN for the frames that do not have the metric).
+    """
+    frame_numbers = array("l")
+    columns = {}
+
+    for frame in _iterate_frames(log_path):
+        for metric_key, score in frame["metrics"].items():
+            if metric_key not in columns:
+                columns[metric_key] = array("d", [np.nan]) * len(frame_numbers)
+            columns[metric_key].append(score)
+        frame_numbers.append(frame["frameNum"])
+        for metric_scores in columns.values():
+            if len(metric_scores) < len(frame_numbers):
+                metric_scores.append(np.nan)
+
+    return (
+        np.frombuffer(frame_numbers, dtype=np.dtype(frame_numbers.typecode)),
+        {
+            metric_key: np.frombuffer(metric_scores, dtype=np.float64)
+            for metric_key, metric_scores in columns.items()
+        },
+    )
+
+
+def write_frame_log(output_path, frame_numbers, columns):
+    """
+    Writes per-frame scores (as returned by read_frame_columns()) as a JSON log in the same format as
+    libvmaf, one frame at a time. The pooled metrics are calculated from the scores.
+    """
+
+    def get_frames():
+        for index, frame_number in enumerate(frame_numbers):
+            yield {
+                "frameNum": int(frame_number),
+                "metrics": {
+                    metric_key: float(metric_scores[index])
+                    for metric_key, metric_scores in columns.items()
+                    if not np.isnan(metric_scores[index])
+                },
+            }
+
+    _write_frames(output_path, get_frames())
+
+
+def merge_frame_logs(log_paths, frame_offsets, output_path):
+    """
+    Merges the JSON logs created by libvmaf for consecutive segments of a video into a single log.
+    frame_offsets contains the number of the first frame of each segment, which is added to the frame
+    numbers in the corresponding log. The pooled metrics are recalculated across all of the frames.
+    The logs are read and written one frame at a time.
+    """
+
+    def get_frames():
+        for log_path, frame_offset in zip(log_paths, frame_offsets):
+            for frame in _iterate_frames(log_path):
+                frame["frameNum"] += frame_offset
+                yield frame
+
+    _write_frames(output_path, get_frames())
+
+
+def _write_frames(output_path, frames):
+    pooled = {}
+
+    with open(output_path, "w") as f:
+        f.write('{\n  "frames": [')
+        separator = "\n    "
+        for frame in frames:
+            f.write(separator + json.dumps(frame))
+            separator = ",\n    "
+
+            for metric_key, score in frame["metrics"].items():
+                if metric_key not in pooled:
+                    pooled[metric_key] = {
+                        "min": score, "max": score, "sum": 0.0, "inverse_sum": 0.0, "count": 0
+                    }
+                metric = pooled[metric_key]
+                metric["min"] = min(metric["min"], score)
+                metric["max"] = max(metric["max"], score)
+                metric["sum"] += score
+                metric["inverse_sum"] += 1 / (score + 1)
+                metric["count"] += 1
+
+        pooled_metrics = {
+            metric_key: {
+                "min": metric["min"],
+                "max": metric["max"],
+                "mean": metric["sum"] / metric["count"],
+                # The same definition of the harmonic mean as libvmaf.
+                "harmonic_mean": metric["count"] / metric["inverse_sum"] - 1,
+            }
+            for metric_key, metric in pooled.items()
+        }
+        f.write("\n  ],\n")
+        f.write(f'  "pooled_metrics": {json.dumps(pooled_metrics)},\n')
+        f.write('  "aggregate_metrics": {}\n}\n')
+
+
+def _iterate_frames(log_path):
+    decoder = json.JSONDecoder()
+
+    with open(log_path, "r") as f:
+        buffer = ""
+        end_of_file = False
+
+        def read_more():
+            nonlocal buffer, end_of_file
+            chunk = f.read(_CHUNK_SIZE)
+            if not chunk:
+                end_of_file = True
+            buffer += chunk
+
+        # Find the start of the "frames" array.
+        while True:
+            start = buffer.find('"frames"')
+            if start != -1:
+                bracket = buffer.find("[", start)
+                if bracket != -1:
+                    buffer = buffer[bracket + 1:]
+                    break
+            if end_of_file:
+                raise FrameLogError(f"{log_path} does not contain any frames.")
+            read_more()
+
+        position = 0
+        while True:
+            # Skip the whitespace and the commas between the frames.
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+
+            if position == len(buffer):
+                if end_of_file:
+                    raise FrameLogError(f"{log_path} ended before the end of the frames.")
+                buffer = ""
+                position = 0
+                read_more()
+                continue
+
+            if buffer[position] == "]":
+                return
+
+            try:
+                frame, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # The frame is split across chunks.
+                if end_of_file:
+                    raise FrameLogError(f"{log_path} contains an incomplete frame.")
+                buffer = buffer[position:]
+                position = 0
+                read_more()
+                continue
+
+            yield frame
+
+
+def get_frame_store_path(log_path):
+    return os.path.splitext(log_path)[0] + ".npz"
+
+
+def get_sampling_info_path(log_path):
+    # Created by adaptive sampling, which only scores some of the frames.
+    return os.path.splitext(log_path)[0] + ".sampling.json"
+
+
+def get_log_identity(log_path):
+    # The size and modification time of a libvmaf log, which identify the log that a store was created from.
+    stat = os.stat(log_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def save_frame_store(store_path, frame_numbers, scores, metric_keys, log_identity=None):
+    """
+    Saves the per-frame scores in a compressed columnar file (.npz), with one column per metric
+    and a column of frame numbers. metric_keys are the metrics that were looked for in the libvmaf log,
+    which may include metrics that were not calculated. log_identity (see get_log_identity) records
+    which libvmaf log the scores were read from.
+    """
+    columns = {f"metric_{metric_key}": metric_scores for metric_key, metric_scores in scores.items()}
+    if log_identity is not None:
+        columns["log_identity"] = np.array(log_identity, dtype=np.int64)
+    temporary_path = f"{store_path}.{os.getpid()}.{get_ident()}.tmp"
+    with open(temporary_path, "wb") as f:
+        np.savez_compressed(
+            f,
+            frame_numbers=frame_numbers.astype(np.int32),
+            metric_keys=np.array(sorted(metric_keys)),
+            **columns,
+        )
+    os.replace(temporary_path, store_path)
+
+
+def is_frame_store_of_log(store_path, log_path):
+    """
+    Returns True if the store was created from the libvmaf log as it is now. The size and modification time
+    of the log are compared rather than which file is newer, as a log can be replaced by an older one,
+    e.g. when it is restored from the cache, and the store of a deleted log can outlive it.
+    """
+    try:
+        with np.load(store_path) as store:
+            if "log_identity" not in store.files:
+                return False
+            return store["log_identity"].tolist() == get_log_identity(log_path)
+    except (OSError, ValueError):
+        return False
+
+
+def load_frame_store(store_path, metric_keys=None):
+    """
+    Loads the frame numbers, the per-frame scores and the metric keys that were looked for
+    from a file saved with save_frame_store(). Only the columns of metric_keys are read (all of them
+    if metric_keys is None), as each column of an .npz file is decompressed when it is accessed.
+    """
+    with np.load(store_path) as store:
+        frame_numbers = store["frame_numbers"]
+        stored_keys = set(store["metric_keys"].tolist())
+        if metric_keys is None:
+            names = [name for name in store.files if name.startswith("metric_") and name != "metric_keys"]
+        else:
+            names = [f"metric_{metric_key}" for metric_key in metric_keys]
+        scores = {name[len("metric_"):]: store[name] for name in names if name in store.files}
+
+    return frame_numbers, scores, stored_keys
+
+
+def read_frame_scores(log_path, metric_keys):
+    """
+    Returns the same as read_frame_log(), but reads the columnar store next to the libvmaf log if it is
+    up to date and contains the requested metrics. Otherwise, the log is read and the store is (re)created.
+    """
+    store_path = get_frame_store_path(log_path)
+
+    if is_frame_store_of_log(store_path, log_path):
+        try:
+            frame_numbers, scores, stored_keys = load_frame_store(store_path, metric_keys)
+        except (OSError, ValueError, KeyError):
+            stored_keys = set()
+
+        if set(metric_keys) <= stored_keys:
+            return frame_numbers, scores
+
+    log_identity = get_log_identity(log_path)
+    frame_numbers, scores = read_frame_log(log_path, metric_keys)
+    try:
+        save_frame_store(store_path, frame_numbers, scores, metric_keys, log_identity)
+    except OSError:
+        # The store only saves time later on, so the scores can still be used without it.
+        pass
+
+    return frame_numbers, scores
@@ -0,0 +1,189 @@
+import json
+import sqlite3
+import time
+
+
+class JobFailedError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, kind, payload, attempts):
+        self.id = job_id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+
+
+class JobQueue:
+    """
+    A queue of jobs (encodes and libvmaf runs) stored in an SQLite file, which can be put on storage
+    that is shared by several machines. Workers claim jobs with a lease that they must renew while the job
+    is running. If a worker stops renewing the lease (e.g. because it crashed), the job can be claimed
+    by another worker once the lease has expired. A job is only claimed after the job it depends on is done.
+
+    Note that SQLite relies on file locking, which must work on the shared storage (e.g. NFS with locking).
+    """
+
+    def __init__(self, path, lease_seconds=600, max_attempts=3):
+        self._path = path
+        self._lease_seconds = lease_seconds
+        self._max_attempts = max_attempts
+
+        with self._connect() as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    depends_on INTEGER REFERENCES jobs(id),
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT
+                )
+                """
+            )
+
+    @property
+    def lease_seconds(self):
+        return self._lease_seconds
+
+    def _connect(self):
+        # isolation_level=None lets the transactions be controlled explicitly with BEGIN IMMEDIATE.
+        return _Connection(sqlite3.connect(self._path, timeout=60, isolation_level=None))
+
+    def add_job(self, kind, payload, depends_on=None):
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "INSERT INTO jobs (kind, payload, depends_on) VALUES (?, ?, ?)",
+                (kind, json.dumps(payload), depends_on),
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker_id):
+        """Returns the next job that can be run, or None if there is no such job at the moment."""
+        now = time.time()
+        with self._connect() as connection:
+            # Take the write lock before reading, so that two workers cannot claim the same job.
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose workers kept disappearing are not attempted again.
+                connection.execute(
+                    """
+                    UPDATE jobs SET status = 'failed', error = 'The lease of the job expired.'
+                    WHERE status = 'running' AND lease_expires < ? AND attempts >= ?
+                    """,
+                    (now, self._max_attempts),
+                )
+                row = connection.execute(
+                    """
+                    SELECT jobs.id, jobs.kind, jobs.payload, jobs.attempts FROM jobs
+                    LEFT JOIN jobs AS dependency ON dependency.id = jobs.depends_on
+                    WHERE (jobs.status = 'pending' OR (jobs.status = 'running' AND jobs.lease_expires < ?))
+                    AND (jobs.depends_on IS NULL OR dependency.status = 'done')
+                    ORDER BY jobs.id
+                    LIMIT 1
+                    """,
+                    (now,),
+                ).fetchone()
+
+                if row is None:
+                    connection.execute("COMMIT")
+                    return None
+
+                job_id, kind, payload, attempts = row
+                connection.execute(
+                    """
+                    UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, attempts = ?
+                    WHERE id = ?
+                    """,
+                    (worker_id, now + self._lease_seconds, attempts + 1, job_id),
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+        return Job(job_id, kind, json.loads(payload), attempts + 1)
+
+    def renew_lease(self, job_id, worker_id):
+        """Returns False if the job is no longer leased by the worker."""
+        with self._connect() as connection:
+            cursor = connection.execute(
+                """
+                UPDATE jobs SET lease_expires = ?
+                WHERE id = ? AND worker = ? AND status = 'running'
+                """,
+                (time.time() + self._lease_seconds, job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id, result):
+        with self._connect() as connection:
+            connection.execute(
+                """
+                UPDATE jobs SET status = 'done', result = ?, lease_expires = NULL
+                WHERE id = ? AND worker = ? AND status = 'running'
+                """,
+                (json.dumps(result), job_id, worker_id),
+            )
+
+    def fail(self, job_id, worker_id, error):
+        """Puts the job back in the queue, unless it has already been attempted max_attempts times."""
+        with self._connect() as connection:
+            connection.execute(
+                """
+                UPDATE jobs SET
+                    status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    error = ?,
+                    lease_expires = NULL
+                WHERE id = ? AND worker = ? AND status = 'running'
+                """,
+                (self._max_attempts, error, job_id, worker_id),
+            )
+
+    def wait_for_result(self, job_id, poll_interval=2):
+        """Waits for a job to finish and returns its result. Raises JobFailedError if the job failed."""
+        while True:
+            with self._connect() as connection:
+                status, result, error, dependency_status, dependency_error = connection.execute(
+                    """
+                    SELECT jobs.status, jobs.result, jobs.error, dependency.status, dependency.error
+                    FROM jobs LEFT JOIN jobs AS dependency ON dependency.id = jobs.depends_on
+                    WHERE jobs.id = ?
+                    """,
+                    (job_id,),
+                ).fetchone()
+
+            if status == "done":
+                return json.loads(result)
+            elif status == "failed":
+                raise JobFailedError(error)
+            # The job will never run if the job that it depends on has failed.
+            elif dependency_status == "failed":
+                raise JobFailedError(dependency_error)
+
+            time.sleep(poll_interval)
+
+    def has_unfinished_jobs(self):
+        with self._connect() as connection:
+            (count,) = connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')"
+            ).fetchone()
+        return count > 0
+
+
+class _Connection:
+    # sqlite3.Connection's context manager does not close the connection, so this one does.
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __enter__(self):
+        return self._connection
+
+    def __exit__(self, *exc_info):
+        self._connection.close()
@@ -1,60 +1,121 @@
-from ffmpeg_process_factory import LibVmafArguments
-from utils import line, Logger, get_metrics_list
+from copy import copy
+import json
+import math
+import os
+from statistics import NormalDist
+
+import numpy as np
+
+from ffmpeg_process_factory import FfmpegProcessFactory, LibVmafArguments, MultiLibVmafArguments
+from frame_log import get_sampling_info_path, merge_frame_logs, read_frame_log
+from result_cache import result_cache
+from scheduler import JobScheduler
+from utils import line, Logger, get_metrics_list, VideoInfoProvider
 
 log = Logger("libvmaf")
 
 # Change this if you want to use a different VMAF model file.
 model_file_path = "vmaf_models/vmaf_v0.6.1.json"
 
+# The minimum number of chunks that are scored before the confidence interval is used to stop early,
+# as the standard deviation of fewer chunks is not a reliable estimate.
+adaptive_min_chunks = 10
 
-def run_libvmaf(
-    transcode_output_path,
-    args,
-    json_file_path,
-    fps,
-    original_video_path,
-    factory,
-    duration,
-    crf_or_preset=None,
-):
+# Maps the optional metric types to the corresponding libvmaf feature names.
+feature_lookup = {
+    "PSNR": "psnr",
+    "SSIM": "float_ssim",
+    "MS-SSIM": "float_ms_ssim",
+}
+
+
+def get_model_string(args):
+    model_params = filter(None, [
+        f"path={model_file_path}",
+        "enable_transform=true" if args.phone_model else ""
+    ])
+    return f"model='{'|'.join(model_params)}'"
+
+
+def get_vmaf_options(args, json_file_path, n_threads=None, metrics_list=None):
     characters_to_escape = ["'", ":", ",", "[", "]"]
     for character in characters_to_escape:
         if character in json_file_path:
             json_file_path = json_file_path.replace(character, f"\{character}")
 
     n_subsample = "1" if not args.subsample else args.subsample
+    n_threads = n_threads if n_threads else args.n_threads
 
-    model_params = filter(None, [
-        f"path={model_file_path}",
-        "enable_transform=true" if args.phone_model else ""
-    ])
-    model_string = f"model='{'|'.join(model_params)}'"
+    model_string = get_model_string(args)
 
-    features = filter(None, [
-        "name=psnr" if args.calculate_psnr else "",
-        "name=float_ssim" if args.calculate_ssim else "",
-        "name=float_ms_ssim" if args.calculate_msssim else ""
-    ])
+    # VMAF is always calculated, so only the optional metrics need to be added as features.
+    metrics_list = metrics_list if metrics_list is not None else get_metrics_list(args)
+    features = [
+        f"name={feature_lookup[metric_type]}"
+        for metric_type in metrics_list
+        if metric_type in feature_lookup
+    ]
     feature_string = f":feature='{'|'.join(features)}'"
 
     vmaf_options = f"""
-    {model_string}:log_fmt=json:log_path='{json_file_path}':n_subsample={n_subsample}:n_threads={args.n_threads}{feature_string}
+    {model_string}:log_fmt=json:log_path='{json_file_path}':n_subsample={n_subsample}:n_threads={n_threads}{feature_string}
     """
 
-    libvmaf_arguments = LibVmafArguments(
-        fps, transcode_output_path, original_video_path, vmaf_options
+    return vmaf_options
+
+
+def get_metrics_cache_key(args, transcode_output_path, original_video_path, fps, proxy_height=None):
+    # Transcodes that are being streamed (through a FIFO) cannot be fingerprinted.
+    if not result_cache.enabled or not os.path.isfile(transcode_output_path):
+        return None
+
+    # With adaptive sampling, only some of the frames are scored, so the metrics are not cached.
+    if args.adaptive_sampling:
+        return None
+
+    return result_cache.make_key(
+        "metrics",
+        result_cache.fingerprint(transcode_output_path),
+        result_cache.fingerprint(original_video_path),
+        fps,
+        get_model_string(args),
+        "1" if not args.subsample else args.subsample,
+        args.video_filters,
+        *([f"<proxy {proxy_height}>"] if proxy_height else []),
     )
-    video_filters = args.video_filters if args.video_filters else None
-    libvmaf_arguments.video_filters(video_filters)
 
-    process = factory.create_process(libvmaf_arguments, args)
 
+def get_metric_types(args):
     metrics_list = get_metrics_list(args)
 
     metric_types = metrics_list[0]
     if len(metrics_list) > 1:
         metric_types = f"{', '.join(metrics_list[:-1])} and {metrics_list[-1]}"
 
+    return metric_types
+
+
+def run_libvmaf(
+    transcode_output_path,
+    args,
+    json_file_path,
+    fps,
+    original_video_path,
+    factory,
+    duration,
+    crf_or_preset=None,
+    n_threads=None,
+    distorted_format=None,
+):
+    metrics_list = get_metrics_list(args)
+    cache_key = get_metrics_cache_key(args, transcode_output_path, original_video_path, fps)
+    missing_metrics = result_cache.restore_metrics(cache_key, metrics_list, json_file_path)
+    if not missing_metrics:
+        log.info(f"Using the cached metrics of {transcode_output_path}.")
+        return
+
+    metric_types = get_metric_types(args)
+
     message_transcoding_mode = ""
     if not args.no_transcoding_mode:
         if isinstance(args.crf, list) and len(args.crf) > 1:
@@ -65,5 +126,466 @@ def run_libvmaf(
     line()
     log.info(f"Calculating the {metric_types}{message_transcoding_mode}...")
 
+    # A video that is being streamed cannot be seeked, so it cannot be split into segments or chunks.
+    if args.adaptive_sampling and distorted_format is None:
+        success = run_libvmaf_adaptive(
+            transcode_output_path,
+            args,
+            json_file_path,
+            fps,
+            original_video_path,
+            duration,
+            n_threads,
+            missing_metrics,
+        )
+    elif args.vmaf_segments > 1 and distorted_format is None:
+        success = run_libvmaf_segments(
+            transcode_output_path,
+            args,
+            json_file_path,
+            fps,
+            original_video_path,
+            duration,
+            n_threads,
+            missing_metrics,
+        )
+    else:
+        vmaf_options = get_vmaf_options(args, json_file_path, n_threads, missing_metrics)
+
+        libvmaf_arguments = LibVmafArguments(
+            fps, transcode_output_path, original_video_path, vmaf_options
+        )
+        video_filters = args.video_filters if args.video_filters else None
+        libvmaf_arguments.video_filters(video_filters)
+        libvmaf_arguments.distorted_format(distorted_format)
+
+        process = factory.create_process(libvmaf_arguments, args)
+        process.run(original_video_path, duration)
+        success = process.returncode == 0
+
+    log.info("Done!")
+
+    if success:
+        result_cache.store_metrics(cache_key, missing_metrics, json_file_path)
+
+
+def run_libvmaf_proxy(
+    transcode_output_path,
+    args,
+    json_file_path,
+    fps,
+    original_video_path,
+    factory,
+    duration,
+    n_threads=None,
+):
+    """
+    Calculates cheap proxy scores for the two-stage mode (--proxy-threshold). Both videos are downscaled
+    to --proxy-height (if they are taller), which is the resolution that the default VMAF model is meant
+    for, and only every --proxy-subsample th frame is scored.
+    """
+    proxy_args = copy(args)
+    proxy_args.subsample = str(args.proxy_subsample)
+
+    metrics_list = get_metrics_list(args)
+    cache_key = get_metrics_cache_key(
+        proxy_args, transcode_output_path, original_video_path, fps, args.proxy_height
+    )
+    missing_metrics = result_cache.restore_metrics(cache_key, metrics_list, json_file_path)
+    if not missing_metrics:
+        log.info(f"Using the cached proxy scores of {transcode_output_path}.")
+        return
+
+    line()
+    log.info(
+        f"Calculating the proxy {get_metric_types(args)} at up to {args.proxy_height}p, "
+        f"scoring every {args.proxy_subsample} frames..."
+    )
+
+    vmaf_options = get_vmaf_options(proxy_args, json_file_path, n_threads, missing_metrics)
+    libvmaf_arguments = LibVmafArguments(
+        fps, transcode_output_path, original_video_path, vmaf_options
+    )
+    video_filters = args.video_filters if args.video_filters else None
+    libvmaf_arguments.video_filters(video_filters)
+    libvmaf_arguments.scale(args.proxy_height)
+
+    process = factory.create_process(libvmaf_arguments, args)
     process.run(original_video_path, duration)
     log.info("Done!")
+
+    if process.returncode == 0:
+        result_cache.store_metrics(cache_key, missing_metrics, json_file_path)
+
+
+def get_segments(total_frames, segment_count, n_subsample):
+    """
+    Splits the frames into at most segment_count consecutive segments. Returns the first frame and the
+    number of frames of each segment (None for the last segment, which takes all of the remaining frames).
+    The length of each segment is a multiple of n_subsample, so that libvmaf subsamples the same frames
+    as it would if the whole video was compared in one go.
+    """
+    segment_length = math.ceil(total_frames / segment_count / n_subsample) * n_subsample
+    start_frames = [
+        i * segment_length for i in range(segment_count) if i * segment_length < total_frames
+    ]
+    return [
+        (start_frame, segment_length if start_frame != start_frames[-1] else None)
+        for start_frame in start_frames
+    ]
+
+
+def get_fps_float(fps):
+    numerator, denominator = fps.split("/") if "/" in fps else (fps, "1")
+    return int(numerator) / int(denominator)
+
+
+def run_libvmaf_segment(
+    transcode_output_path,
+    args,
+    segment_json_file_path,
+    fps,
+    original_video_path,
+    duration,
+    start_frame,
+    frame_count,
+    n_threads,
+    metrics_list,
+):
+    """
+    Compares frame_count frames (or all of the remaining frames if frame_count is None) starting at
+    start_frame. The frame numbers in the log start at 0. Returns True if FFmpeg succeeded.
+    """
+    fps_float = get_fps_float(fps)
+    vmaf_options = get_vmaf_options(args, segment_json_file_path, n_threads, metrics_list)
+
+    libvmaf_arguments = LibVmafArguments(
+        fps, transcode_output_path, original_video_path, vmaf_options
+    )
+    video_filters = args.video_filters if args.video_filters else None
+    libvmaf_arguments.video_filters(video_filters)
+    # Seek to half a frame before the first frame of the segment, so that the first frame that is kept
+    # is the right one even if the timestamps are slightly off.
+    start_time = (start_frame - 0.5) / fps_float if start_frame else None
+    libvmaf_arguments.segment(start_time, frame_count)
+
+    process = FfmpegProcessFactory().create_process(libvmaf_arguments, args)
+    if frame_count:
+        segment_duration = frame_count / fps_float
+    else:
+        segment_duration = duration - start_frame / fps_float
+    process.run(original_video_path, segment_duration)
+
+    return process.returncode == 0
+
+
+def run_libvmaf_segments(
+    transcode_output_path,
+    args,
+    json_file_path,
+    fps,
+    original_video_path,
+    duration,
+    n_threads,
+    metrics_list,
+):
+    """
+    Splits the comparison into --vmaf-segments time segments, each compared by its own FFmpeg process,
+    and merges the per-frame logs into json_file_path with the frame numbers of the whole video.
+    """
+    # The reference may be shorter than the original video (-t, -i or --prefilter), so the segments are
+    # laid out over the duration of the reference that is actually scored.
+    duration = VideoInfoProvider(original_video_path).get_duration()
+    total_frames = int(get_fps_float(fps) * duration)
+    n_subsample = int(args.subsample) if args.subsample else 1
+
+    segments = get_segments(total_frames, args.vmaf_segments, n_subsample)
+    n_threads = int(n_threads if n_threads else args.n_threads)
+    scheduler = JobScheduler(n_threads, len(segments))
+    log.info(
+        f"The comparison has been split into {len(segments)} segments, "
+        f"{scheduler.parallel_jobs} of which are scored at a time."
+    )
+    if scheduler.parallel_jobs < len(segments):
+        # Each segment needs at least one thread, e.g. with -j or --pipeline, each job only gets a share.
+        log.warning(
+            f"Only {n_threads} threads are available for the VMAF calculation, so fewer segments are scored "
+            f"at a time than --vmaf-segments ({args.vmaf_segments}). Consider a lower value or a higher "
+            "--cpu-budget/--n-threads."
+        )
+
+    def run_segment(indexed_segment):
+        index, (start_frame, frame_count) = indexed_segment
+        segment_json_file_path = f"{json_file_path}.segment{index}.json"
+        success = run_libvmaf_segment(
+            transcode_output_path,
+            args,
+            segment_json_file_path,
+            fps,
+            original_video_path,
+            duration,
+            start_frame,
+            frame_count,
+            scheduler.threads_per_job,
+            metrics_list,
+        )
+        return segment_json_file_path, success
+
+    results = list(scheduler.map_ordered(run_segment, enumerate(segments)))
+    segment_json_file_paths = [segment_json_file_path for segment_json_file_path, _ in results]
+
+    success = all(segment_success for _, segment_success in results)
+    if success:
+        # libvmaf may not create a log for a segment without any frames, e.g. if the duration in the
+        # container is longer than the video stream.
+        merged_segments = [
+            (segment_json_file_path, start_frame)
+            for segment_json_file_path, (start_frame, _) in zip(segment_json_file_paths, segments)
+            if os.path.exists(segment_json_file_path)
+        ]
+        merge_frame_logs(
+            [segment_json_file_path for segment_json_file_path, _ in merged_segments],
+            [start_frame for _, start_frame in merged_segments],
+            json_file_path,
+        )
+
+    for segment_json_file_path in segment_json_file_paths:
+        if os.path.exists(segment_json_file_path):
+            os.remove(segment_json_file_path)
+
+    return success
+
+
+def get_chunk_order(chunk_count):
+    """
+    Orders the chunks by the bit-reversed value of their index (0, 1/2, 1/4, 3/4, 1/8...), so that the
+    chunks scored so far are always spread evenly across the whole video. This is systematic rather than
+    random sampling, which is why the confidence interval is an approximation.
+    """
+    bits = max(1, (chunk_count - 1).bit_length())
+    return sorted(range(chunk_count), key=lambda index: int(f"{index:0{bits}b}"[::-1], 2))
+
+
+def get_confidence_interval(chunk_means, chunk_count, confidence):
+    """
+    Returns the mean and the half-width of the approximate confidence interval of the mean VMAF, using
+    the mean VMAF of each chunk scored so far. Consecutive frames have very similar scores, so the chunks
+    rather than the frames are treated as the samples. The finite population correction accounts for the
+    chunks that have been scored making up a large part of the video.
+
+    The interval is that of a simple random sample, but the chunks are picked systematically (see
+    get_chunk_order), so it is only an approximation. It is usually conservative, as evenly spread chunks
+    cover the video better than random ones, but it can be too narrow for content whose quality varies
+    periodically with the same period as the chunks.
+    """
+    chunk_means = np.asarray(chunk_means, dtype=np.float64)
+    mean = float(np.mean(chunk_means))
+    if len(chunk_means) < 2:
+        return mean, math.inf
+
+    standard_error = np.std(chunk_means, ddof=1) / math.sqrt(len(chunk_means))
+    finite_population_correction = math.sqrt(1 - len(chunk_means) / chunk_count)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return mean, float(z * standard_error * finite_population_correction)
+
+
+def run_libvmaf_adaptive(
+    transcode_output_path,
+    args,
+    json_file_path,
+    fps,
+    original_video_path,
+    duration,
+    n_threads,
+    metrics_list,
+):
+    """
+    Scores one second chunks of the video in rounds, in an order that spreads them evenly across the video,
+    until the confidence interval of the mean VMAF is within +/- --adaptive-sampling. The per-frame logs of
+    the chunks are merged into json_file_path with the frame numbers of the whole video, and the number of
+    frames scored and the confidence interval are saved next to it.
+    """
+    fps_float = get_fps_float(fps)
+    # The reference may be shorter than the original video (-t, -i or --prefilter), so the chunks are
+    # laid out over the duration of the reference that is actually scored.
+    duration = VideoInfoProvider(original_video_path).get_duration()
+    total_frames = int(fps_float * duration)
+    chunk_frames = max(1, round(fps_float))
+    chunk_count = max(1, total_frames // chunk_frames)
+    remaining_chunks = get_chunk_order(chunk_count)
+
+    n_threads = int(n_threads if n_threads else args.n_threads)
+    scheduler = JobScheduler(n_threads, adaptive_min_chunks)
+    tolerance = args.adaptive_sampling
+    confidence = args.adaptive_confidence
+
+    sampling_info_path = get_sampling_info_path(json_file_path)
+    if os.path.exists(sampling_info_path):
+        os.remove(sampling_info_path)
+
+    def run_chunk(chunk_index):
+        chunk_json_file_path = f"{json_file_path}.chunk{chunk_index}.json"
+        success = run_libvmaf_segment(
+            transcode_output_path,
+            args,
+            chunk_json_file_path,
+            fps,
+            original_video_path,
+            duration,
+            chunk_index * chunk_frames,
+            chunk_frames if chunk_count > 1 else None,
+            scheduler.threads_per_job,
+            metrics_list,
+        )
+        return chunk_index, chunk_json_file_path, success
+
+    scored_chunks = {}
+    chunk_means = {}
+    frames_scored = 0
+    success = True
+    mean, half_width = math.nan, math.inf
+
+    try:
+        while remaining_chunks:
+            round_size = adaptive_min_chunks if not scored_chunks else scheduler.parallel_jobs
+            chunk_indexes = remaining_chunks[:round_size]
+            remaining_chunks = remaining_chunks[round_size:]
+
+            for chunk_index, chunk_json_file_path, chunk_success in scheduler.map_ordered(
+                run_chunk, chunk_indexes
+            ):
+                scored_chunks[chunk_index] = chunk_json_file_path
+                success = success and chunk_success
+                if not chunk_success:
+                    continue
+
+                if os.path.exists(chunk_json_file_path):
+                    frame_numbers, scores = read_frame_log(chunk_json_file_path, ["vmaf"])
+                else:
+                    frame_numbers, scores = [], {}
+
+                if "vmaf" not in scores:
+                    # The chunk starts after the last frame, as the duration in the container is longer
+                    # than the video stream, so this chunk and the chunks after it do not exist.
+                    chunk_count = min(chunk_count, chunk_index)
+                    continue
+
+                chunk_means[chunk_index] = np.mean(scores["vmaf"], dtype=np.float64)
+                frames_scored += len(frame_numbers)
+
+            if not success:
+                break
+
+            remaining_chunks = [
+                chunk_index for chunk_index in remaining_chunks if chunk_index < chunk_count
+            ]
+            if not chunk_means:
+                continue
+
+            mean, half_width = get_confidence_interval(
+                list(chunk_means.values()), chunk_count, confidence
+            )
+            log.info(
+                f"{len(chunk_means)}/{chunk_count} chunks scored. Mean VMAF: {mean:.2f} +/- "
+                f"{half_width:.2f} ({confidence:.0%} confidence)."
+            )
+
+            if len(chunk_means) >= adaptive_min_chunks and half_width <= tolerance:
+                break
+
+        if success and not chunk_means:
+            log.info(f"None of the frames of {original_video_path} could be scored.")
+            success = False
+
+        if success:
+            total_frames = min(total_frames, chunk_count * chunk_frames)
+            chunk_indexes = sorted(chunk_means)
+            merge_frame_logs(
+                [scored_chunks[chunk_index] for chunk_index in chunk_indexes],
+                [chunk_index * chunk_frames for chunk_index in chunk_indexes],
+                json_file_path,
+            )
+
+            with open(sampling_info_path, "w") as f:
+                json.dump(
+                    {
+                        "frames_scored": frames_scored,
+                        "total_frames": total_frames,
+                        "mean": mean,
+                        "half_width": half_width if math.isfinite(half_width) else None,
+                        "confidence": confidence,
+                    },
+                    f,
+                )
+    finally:
+        for chunk_json_file_path in scored_chunks.values():
+            if os.path.exists(chunk_json_file_path):
+                os.remove(chunk_json_file_path)
+
+    return success
+
+
+def run_libvmaf_multi(
+    transcode_output_paths,
+    args,
+    json_file_paths,
+    fps,
+    original_video_path,
+    factory,
+    duration,
+    n_threads=None,
+):
+    """
+    Calculates the metrics of several transcodes of the same original video in a single FFmpeg process.
+    The original video is only decoded once and is fed to one libvmaf filter per transcode.
+    Each libvmaf filter writes its own per-frame JSON file.
+    """
+    metrics_list = get_metrics_list(args)
+    cache_keys = [
+        get_metrics_cache_key(args, transcode_output_path, original_video_path, fps)
+        for transcode_output_path in transcode_output_paths
+    ]
+
+    # Only score the transcodes whose metrics have not been cached.
+    uncached = [
+        (transcode_output_path, json_file_path, cache_key)
+        for transcode_output_path, json_file_path, cache_key in zip(
+            transcode_output_paths, json_file_paths, cache_keys
+        )
+        if result_cache.restore_metrics(cache_key, metrics_list, json_file_path)
+    ]
+    if not uncached:
+        log.info("Using the cached metrics of all of the transcodes.")
+        return
+
+    transcode_output_paths, json_file_paths, cache_keys = [list(values) for values in zip(*uncached)]
+
+    n_threads = n_threads if n_threads else args.n_threads
+    # Split the threads between the libvmaf filters.
+    threads_per_filter = max(1, int(n_threads) // len(transcode_output_paths))
+
+    vmaf_options = [
+        get_vmaf_options(args, json_file_path, threads_per_filter)
+        for json_file_path in json_file_paths
+    ]
+
+    libvmaf_arguments = MultiLibVmafArguments(
+        fps, transcode_output_paths, original_video_path, vmaf_options
+    )
+    video_filters = args.video_filters if args.video_filters else None
+    libvmaf_arguments.video_filters(video_filters)
+
+    process = factory.create_process(libvmaf_arguments, args)
+
+    line()
+    log.info(
+        f"Calculating the {get_metric_types(args)} of {len(transcode_output_paths)} transcodes "
+        "while decoding the original video only once..."
+    )
+
+    process.run(original_video_path, duration)
+    log.info("Done!")
+
+    if process.returncode == 0:
+        for cache_key, json_file_path in zip(cache_keys, json_file_paths):
+            result_cache.store_metrics(cache_key, metrics_list, json_file_path)
@@ -1,9 +1,10 @@
 import json
 import os
 
-import matplotlib.pyplot as plt
 import numpy as np
+from prettytable import PrettyTable
 
+from frame_log import get_sampling_info_path, read_frame_scores
 from utils import force_decimal_places, line, Logger, plot_graph, get_metrics_list
 
 log = Logger("save_metrics")
@@ -20,12 +21,6 @@ def get_metrics_save_table(
     time_taken,
     crf_or_preset=None,
 ):
-    with open(json_file_path, "r") as f:
-        file_contents = json.load(f)
-
-    frames = file_contents["frames"]
-    frame_numbers = [frame["frameNum"] for frame in frames]
-
     # Maps the metric type to the corresponding JSON metric key.
     metric_lookup = {
         "VMAF": "vmaf",
@@ -38,16 +33,22 @@ def get_metrics_save_table(
     collected_scores = {}
     # Process metrics captured for each requested metric type.
     metrics_list = get_metrics_list(args)
+    # Get the score of each frame from the JSON file created by libvmaf, or from the columnar store
+    # next to it if it has already been created. All of the metrics are looked for, so that the store
+    # can be reused if the metrics to show change.
+    frame_numbers, scores = read_frame_scores(json_file_path, list(metric_lookup.values()))
+
     for metric_type in metrics_list:
         metric_key = metric_lookup[metric_type]
-        if frames[0]["metrics"][metric_key]:
-            # Get the <metric_type> score of each frame from the JSON file created by libvmaf.
-            metric_scores = [frame["metrics"][metric_key] for frame in frames]
+        if metric_key in scores:
+            metric_scores = scores[metric_key]
 
             # Calculate the mean, minimum and standard deviation scores across all frames.
-            mean_score = force_decimal_places(np.mean(metric_scores), decimal_places)
-            min_score = force_decimal_places(min(metric_scores), decimal_places)
-            std_score = force_decimal_places(np.std(metric_scores), decimal_places)
+            # The scores are stored as float32, so every statistic is calculated in float64, like the
+            # scores that were read from the JSON file before, to keep the values in the table the same.
+            mean_score = force_decimal_places(np.mean(metric_scores, dtype=np.float64), decimal_places)
+            min_score = force_decimal_places(np.min(metric_scores.astype(np.float64)), decimal_places)
+            std_score = force_decimal_places(np.std(metric_scores, dtype=np.float64), decimal_places)
 
             collected_scores[metric_type] = {
                 "min": min_score,
@@ -55,27 +56,36 @@ def get_metrics_save_table(
                 "mean": mean_score
             }
 
-            log.info(f"Creating {metric_type} graph...")
-            plot_graph(
-                f"{metric_type}\nn_subsample: {args.subsample}",
-                "Frame Number",
-                metric_type,
-                frame_numbers,
-                metric_scores,
-                mean_score,
-                os.path.join(output_folder, metric_type),
-            )
+            if not args.no_graphs:
+                log.info(f"Creating {metric_type} graph...")
+                plot_graph(
+                    f"{metric_type}\nn_subsample: {args.subsample}",
+                    "Frame Number",
+                    metric_type,
+                    frame_numbers,
+                    metric_scores,
+                    mean_score,
+                    os.path.join(output_folder, metric_type),
+                )
 
             # Add the <metric_type> values to the table.
             data_for_current_row.append(f"{min_score} | {std_score} | {mean_score}")
 
+    if args.adaptive_sampling:
+        data_for_current_row.extend(get_sampling_columns(json_file_path, decimal_places))
+
     if not args.no_transcoding_mode:
         data_for_current_row.insert(0, crf_or_preset)
         data_for_current_row.insert(1, time_taken)
 
     table.add_row(data_for_current_row)
+    save_table(comparison_table, table, args)
+
+    return float(collected_scores["VMAF"]["mean"])
 
-    collected_metric_types = '/'.join(metrics_list)
+
+def save_table(comparison_table, table, args):
+    collected_metric_types = '/'.join(get_metrics_list(args))
     table_title = (
         f"{collected_metric_types} values are in the format: Min | Standard Deviation | Mean"
     )
@@ -87,4 +97,121 @@ def get_metrics_save_table(
 
     log.info(f"{comparison_table} has been updated.")
     line()
-    return float(collected_scores["VMAF"]["mean"])
+
+
+def get_mean_vmaf(json_file_path):
+    frame_numbers, scores = read_frame_scores(json_file_path, ["vmaf"])
+    return float(np.mean(scores["vmaf"], dtype=np.float64))
+
+
+def get_sampling_columns(json_file_path, decimal_places):
+    """Returns the "Frames Scored" and "VMAF Confidence Interval (Approx.)" columns of adaptive sampling."""
+    sampling_info_path = get_sampling_info_path(json_file_path)
+    if not os.path.exists(sampling_info_path):
+        return ["N/A", "N/A"]
+
+    with open(sampling_info_path, "r") as f:
+        sampling_info = json.load(f)
+
+    frames_scored = f"{sampling_info['frames_scored']}/{sampling_info['total_frames']}"
+    if sampling_info["half_width"] is None:
+        return [frames_scored, "N/A"]
+
+    half_width = force_decimal_places(sampling_info["half_width"], decimal_places)
+    return [frames_scored, f"+/- {half_width} ({sampling_info['confidence']:.0%})"]
+
+
+def save_prediction_error_table(
+    table_path, crf_or_preset, labels, overview_vmaf_scores, reference_json_file_paths, decimal_places
+):
+    """
+    Saves a table which compares the mean VMAF of each transcode of the overview video with the mean VMAF
+    in the corresponding libvmaf log of a run without Overview Mode. Returns the mean absolute error,
+    or None if none of the logs of the run without Overview Mode exist.
+    """
+    table = PrettyTable()
+    table.field_names = [crf_or_preset, "Overview VMAF", "Full VMAF", "Error"]
+    absolute_errors = []
+
+    for label, overview_vmaf, reference_json_file_path in zip(
+        labels, overview_vmaf_scores, reference_json_file_paths
+    ):
+        if not os.path.exists(reference_json_file_path):
+            log.info(
+                f"Unable to find {reference_json_file_path}, "
+                f"so the prediction error of {label} cannot be calculated."
+            )
+            continue
+
+        full_vmaf = get_mean_vmaf(reference_json_file_path)
+        error = overview_vmaf - full_vmaf
+        absolute_errors.append(abs(error))
+        table.add_row(
+            [
+                label,
+                force_decimal_places(overview_vmaf, decimal_places),
+                force_decimal_places(full_vmaf, decimal_places),
+                force_decimal_places(error, decimal_places),
+            ]
+        )
+
+    if not absolute_errors:
+        return None
+
+    mean_absolute_error = float(np.mean(absolute_errors))
+    with open(table_path, "w") as f:
+        f.write("Prediction error of the overview video (Overview VMAF - Full VMAF)\n")
+        f.write(table.get_string())
+        f.write(
+            f"\nMean Absolute Error: {force_decimal_places(mean_absolute_error, decimal_places)}"
+            f"\nMaximum Absolute Error: {force_decimal_places(max(absolute_errors), decimal_places)}"
+        )
+
+    log.info(table.get_string())
+    log.info(f"{table_path} has been created.")
+    line()
+    return mean_absolute_error
+
+
+def save_proxy_agreement_table(
+    table_path, crf_or_preset, labels, proxy_vmaf_scores, full_vmaf_scores, threshold, decimal_places
+):
+    """
+    Saves a table which compares the proxy VMAF and the full VMAF of the transcodes that were scored
+    in both stages, and whether both scores are on the same side of the threshold.
+    Returns the mean absolute difference.
+    """
+    table = PrettyTable()
+    table.field_names = [crf_or_preset, "Proxy VMAF", "Full VMAF", "Difference", "Same Decision"]
+    differences = []
+
+    for label, proxy_vmaf, full_vmaf in zip(labels, proxy_vmaf_scores, full_vmaf_scores):
+        difference = proxy_vmaf - full_vmaf
+        differences.append(difference)
+        same_decision = (proxy_vmaf >= threshold) == (full_vmaf >= threshold)
+        table.add_row(
+            [
+                label,
+                force_decimal_places(proxy_vmaf, decimal_places),
+                force_decimal_places(full_vmaf, decimal_places),
+                force_decimal_places(difference, decimal_places),
+                "Yes" if same_decision else "No",
+            ]
+        )
+
+    absolute_differences = np.abs(differences)
+    mean_absolute_difference = float(np.mean(absolute_differences))
+    with open(table_path, "w") as f:
+        f.write(f"Proxy VMAF vs full VMAF (threshold: {threshold})\n")
+        f.write(table.get_string())
+        f.write(
+            f"\nMean Difference: {force_decimal_places(np.mean(differences), decimal_places)}"
+            f"\nMean Absolute Difference: {force_decimal_places(mean_absolute_difference, decimal_places)}"
+            f"\nMaximum Absolute Difference: "
+            f"{force_decimal_places(np.max(absolute_differences), decimal_places)}"
+        )
+
+    log.info(table.get_string())
+    log.info(f"{table_path} has been created.")
+    line()
+    return mean_absolute_difference
@@ -1,10 +1,14 @@
 import math
 import os
 from pathlib import Path
+import re
 import shutil
-import subprocess
 import time
 
+import numpy as np
+
+from scheduler import JobScheduler
+from supervisor import run_command
 from utils import VideoInfoProvider, line, exit_program, Logger
 
 log = Logger("overview")
@@ -24,16 +28,71 @@ def step_to_movie_timestamp(step_seconds):
     return timestamp
 
 
-def create_clips(video_path, output_folder, interval_seconds, clip_length):
-    # The output folder for the clips.
-    output_folder = os.path.join(output_folder, "clips")
+def create_clip(video_path, clip_output_path, clip_offset, clip_length, threads=None):
+    subprocess_cut_args = [
+        "ffmpeg",
+        "-loglevel",
+        "warning",
+        "-y",
+        "-ss",
+        clip_offset,
+        "-i",
+        video_path,
+        "-map",
+        "0:V",
+        "-t",
+        clip_length,
+        "-c:v",
+        "libx264",
+        "-crf",
+        "0",
+        "-preset",
+        "ultrafast",
+        *(["-threads", str(threads)] if threads else []),
+        clip_output_path,
+    ]
+    result = run_command(subprocess_cut_args)
+    if result.returncode != 0:
+        error = result.stderr.decode("utf-8", errors="replace").strip()
+        raise ClipError(
+            f"Unable to create the clip which starts at {clip_offset} "
+            f"(FFmpeg exit code {result.returncode}).\n{error}"
+        )
+
 
+def extract_clips(video_path, output_folder, clip_offsets, clip_length, jobs=1, cpu_budget=None):
+    """
+    Creates a lossless clip starting at each of the offsets (in seconds), running up to jobs FFmpeg
+    processes at the same time. The clips are listed in clips.txt in the same order as the offsets,
+    regardless of the order in which they are created. Returns the path of clips.txt.
+    """
+    txt_file_path = f"{output_folder}/clips.txt"
+    clips = []
+    with open(txt_file_path, "w") as f:
+        for clip_number, offset in enumerate(clip_offsets, start=1):
+            clip_name = f"clip{clip_number}.mkv"
+            f.write(f"file '{clip_name}'\n")
+            clips.append((clip_number, os.path.join(output_folder, clip_name), offset))
+
+    scheduler = JobScheduler(cpu_budget if cpu_budget else jobs, jobs)
+
+    def create_numbered_clip(clip):
+        clip_number, clip_output_path, offset = clip
+        clip_offset = step_to_movie_timestamp(offset)
+        log.info(f"Creating clip {clip_number} which starts at {clip_offset}...")
+        create_clip(
+            video_path, clip_output_path, clip_offset, clip_length, scheduler.threads_per_job
+        )
+
+    # Stops creating clips as soon as one of them cannot be created.
+    scheduler.run_all(create_numbered_clip, clips)
+    return txt_file_path
+
+
+def get_clip_offsets(video_path, interval_seconds):
     if not os.path.exists(video_path):
         raise ClipError("The specified video file does not exist.")
 
-    if not os.path.exists(output_folder):
-        os.mkdir(output_folder)
-
     provider = VideoInfoProvider(video_path)
     duration = int(float(provider.get_duration()))
 
@@ -43,48 +102,23 @@ def create_clips(video_path, output_folder, interval_seconds, clip_length):
         )
 
     number_steps = math.trunc(duration / interval_seconds)
+    return [step * interval_seconds for step in range(1, number_steps)]
 
-    txt_file_path = f"{output_folder}/clips.txt"
-    # Create the file.
-    open(txt_file_path, "w").close()
 
-    log.info("Overview mode activated.")
-    log.info(
-        f"Creating a {clip_length} second clip every {interval_seconds} seconds from {video_path}..."
-    )
+def create_clips(video_path, output_folder, clip_offsets, clip_length, jobs=1, cpu_budget=None):
+    # The output folder for the clips.
+    output_folder = os.path.join(output_folder, "clips")
+
+    if not os.path.exists(output_folder):
+        os.mkdir(output_folder)
+
+    log.info(f"Creating {len(clip_offsets)} clips, each {clip_length} seconds long...")
     line()
 
     try:
-        for step in range(1, number_steps):
-            clip_name = f"clip{step}.mkv"
-            with open(txt_file_path, "a") as f:
-                f.write(f"file '{clip_name}'\n")
-            clip_output_path = os.path.join(output_folder, clip_name)
-            clip_offset = step_to_movie_timestamp(step * interval_seconds)
-            log.info(f"Creating clip {step} which starts at {clip_offset}...")
-            subprocess_cut_args = [
-                "ffmpeg",
-                "-loglevel",
-                "warning",
-                "-stats",
-                "-y",
-                "-ss",
-                clip_offset,
-                "-i",
-                video_path,
-                "-map",
-                "0:V",
-                "-t",
-                clip_length,
-                "-c:v",
-                "libx264",
-                "-crf",
-                "0",
-                "-preset",
-                "ultrafast",
-                clip_output_path,
-            ]
-            subprocess.run(subprocess_cut_args)
+        txt_file_path = extract_clips(
+            video_path, output_folder, clip_offsets, clip_length, jobs, cpu_budget
+        )
     except Exception as error:
         log.info("An error occurred while trying to create the clips.")
         exit_program(error)
@@ -92,13 +126,233 @@ def create_clips(video_path, output_folder, interval_seconds, clip_length):
         return txt_file_path
 
 
-def concatenate_clips(txt_file_path, output_folder, extension, interval_seconds, clip_length):
+def analyse_complexity(video_path, clip_length, threads=None, show_commands=False):
+    """
+    Runs a cheap analysis pass over a downscaled version of the video, sampled at 4 frames per second.
+    Returns a (offset, spatial complexity, temporal complexity) tuple for each clip_length long window
+    of the video. The spatial complexity is the density of edges in the frames and the temporal
+    complexity is the scene change score, i.e. how different each frame is from the previous one.
+    """
+    subprocess_analysis_args = [
+        "ffmpeg",
+        "-loglevel",
+        "info",
+        "-nostats",
+        "-i",
+        video_path,
+        "-map",
+        "0:V",
+        "-vf",
+        "setpts=PTS-STARTPTS,fps=4,scale=256:-2,select='gte(scene,0)',"
+        "edgedetect,signalstats,metadata=print",
+        *(["-threads", str(threads)] if threads else []),
+        "-f",
+        "null",
+        "-",
+    ]
+
+    if show_commands:
+        line()
+        log.debug(f'Running the following command:\n{" ".join(subprocess_analysis_args)}')
+        line()
+
+    result = run_command(subprocess_analysis_args)
+    if result.returncode != 0:
+        raise ClipError(f"Unable to analyse the complexity of {video_path}.")
+
+    # The metadata filter prints the statistics of each frame on separate lines of stderr.
+    pts_time_pattern = re.compile(r"pts_time:(\S+)")
+    statistic_pattern = re.compile(r"lavfi\.(scene_score|signalstats\.YAVG)=(\S+)")
+
+    windows = {}
+    window = None
+    for output_line in result.stderr.decode("utf-8", errors="replace").splitlines():
+        match = pts_time_pattern.search(output_line)
+        if match:
+            window_index = int(float(match.group(1)) // clip_length)
+            window = windows.setdefault(window_index, {"scene_score": [], "signalstats.YAVG": []})
+            continue
+
+        match = statistic_pattern.search(output_line)
+        if match and window is not None:
+            try:
+                window[match.group(1)].append(float(match.group(2)))
+            except ValueError:
+                pass
+
+    if not windows:
+        raise ClipError(f"Unable to analyse the complexity of {video_path}.")
+
+    # The last window is not used if it is shorter than the clips.
+    duration = float(VideoInfoProvider(video_path).get_duration())
+    return [
+        (
+            window_index * clip_length,
+            np.mean(window["signalstats.YAVG"]) / 255 if window["signalstats.YAVG"] else 0,
+            np.mean(window["scene_score"]) if window["scene_score"] else 0,
+        )
+        for window_index, window in sorted(windows.items())
+        if (window_index + 1) * clip_length <= duration
+    ]
+
+
+def choose_representative_offsets(windows, clip_count):
+    """
+    Chooses clip_count windows that cover the distribution of complexity of the video. The windows are
+    sorted by complexity and split into clip_count groups of the same size, and the most typical window
+    of each group is chosen. Therefore, each clip represents the same proportion of the video, so the
+    mean score of the overview video is a stratified estimate of the mean score of the whole video.
+    """
+    if clip_count >= len(windows):
+        return [offset for offset, spatial, temporal in windows]
+
+    def get_ranks(values):
+        # Ranks between 0 and 1, so that neither statistic dominates because of its scale.
+        return np.argsort(np.argsort(values, kind="stable")) / max(len(values) - 1, 1)
+
+    complexity = (
+        get_ranks(np.array([spatial for offset, spatial, temporal in windows]))
+        + get_ranks(np.array([temporal for offset, spatial, temporal in windows]))
+    ) / 2
+
+    clip_offsets = []
+    for group in np.array_split(np.argsort(complexity, kind="stable"), clip_count):
+        group_complexity = complexity[group]
+        chosen_window = group[np.argmin(np.abs(group_complexity - np.median(group_complexity)))]
+        clip_offsets.append(windows[chosen_window][0])
+
+    return sorted(clip_offsets)
+
+
+def get_representative_clip_offsets(
+    video_path, interval_seconds, clip_length, threads=None, show_commands=False
+):
+    # The overview video has the same number of clips as with --overview-sampling interval.
+    clip_count = len(get_clip_offsets(video_path, interval_seconds))
+
+    log.info("Analysing the complexity of the video to choose representative clips...")
+    windows = analyse_complexity(video_path, int(clip_length), threads, show_commands)
+    clip_offsets = choose_representative_offsets(windows, clip_count)
+    log.info(
+        f"{len(clip_offsets)} of the {len(windows)} {clip_length} second windows of the video "
+        "have been chosen."
+    )
+
+    return clip_offsets
+
+
+# The number of clips that are read by each FFmpeg process of the single-pass engine. FFmpeg opens the
+# demuxer and the decoder of every input when it starts, so the clips are split into batches.
+max_clips_per_process = 16
+
+
+def get_concat_filter(clip_count):
+    # Each input is one clip, so its timestamps start from 0 and the concat filter joins the clips in order.
+    inputs = "".join(f"[{clip_number}:V:0]" for clip_number in range(clip_count))
+    return f"{inputs}concat=n={clip_count}:v=1:a=0[overview]"
+
+
+def get_single_pass_arguments(video_path, clip_offsets, clip_length, output_path, threads=None):
+    """
+    Returns the FFmpeg arguments that read the clips from the original video, with one input per clip
+    (seeking to the start of the clip and only reading clip_length seconds, so only the clips are decoded),
+    join them with the concat filter and encode the result losslessly.
+    """
+    clip_inputs = []
+    for offset in clip_offsets:
+        clip_inputs += ["-ss", str(offset), "-t", str(clip_length), "-i", video_path]
+
+    return [
+        "ffmpeg",
+        "-loglevel",
+        "warning",
+        "-stats",
+        "-y",
+        *clip_inputs,
+        "-filter_complex",
+        get_concat_filter(len(clip_offsets)),
+        "-map",
+        "[overview]",
+        "-c:v",
+        "libx264",
+        "-crf",
+        "0",
+        "-preset",
+        "ultrafast",
+        *(["-threads", str(threads)] if threads else []),
+        output_path,
+    ]
+
+
+def create_overview_single_pass(video_path, clip_offsets, clip_length, output_path, threads=None):
+    """
+    Creates the overview video without creating a file for each clip. Each FFmpeg process reads up to
+    max_clips_per_process clips from the original video (see get_single_pass_arguments). If there are more
+    clips than that, each batch of clips is encoded to a part of the overview video, and the parts are
+    concatenated without re-encoding them.
+    """
+    batches = [
+        clip_offsets[start:start + max_clips_per_process]
+        for start in range(0, len(clip_offsets), max_clips_per_process)
+    ]
+    log.info(
+        f"Creating the overview video from {len(clip_offsets)} {clip_length} second segments "
+        + ("in a single pass..." if len(batches) == 1 else f"in {len(batches)} parts...")
+    )
+    line()
+
+    if len(batches) == 1:
+        run_single_pass(
+            get_single_pass_arguments(video_path, clip_offsets, clip_length, output_path, threads)
+        )
+        log.info("Done!")
+        return output_path
+
+    # The parts are saved and concatenated in the same way as the clips of the "clips" engine.
+    output_folder = os.path.dirname(output_path)
+    parts_folder = os.path.join(output_folder, "clips")
+    os.makedirs(parts_folder, exist_ok=True)
+    txt_file_path = os.path.join(parts_folder, "clips.txt")
+    with open(txt_file_path, "w") as f:
+        for part_number, batch in enumerate(batches, start=1):
+            part_name = f"part{part_number}.mkv"
+            log.info(f"Creating part {part_number} of {len(batches)}...")
+            run_single_pass(
+                get_single_pass_arguments(
+                    video_path, batch, clip_length, os.path.join(parts_folder, part_name), threads
+                )
+            )
+            f.write(f"file '{part_name}'\n")
+
+    if concatenate_clips(txt_file_path, output_folder, output_path) is None:
+        raise ConcatenateError("Unable to concatenate the parts of the overview video.")
+
+    return output_path
+
+
+def run_single_pass(subprocess_overview_args):
+    result = run_command(subprocess_overview_args, capture_output=False)
+    if result.returncode != 0:
+        raise ConcatenateError("Unable to create the overview video.")
+
+
+def get_overview_name(extension, interval_seconds, clip_length, sampling="interval"):
+    if sampling == "content":
+        return f"{clip_length}-{interval_seconds} (ClipLength-IntervalSeconds) Content-Aware{extension}"
+
+    return f"{clip_length}-{interval_seconds} (ClipLength-IntervalSeconds){extension}"
+
+
+def get_overview_path(output_folder, extension, interval_seconds, clip_length, sampling="interval"):
+    return os.path.join(
+        output_folder, get_overview_name(extension, interval_seconds, clip_length, sampling)
+    )
+
+
+def concatenate_clips(txt_file_path, output_folder, concatenated_filepath):
     if not os.path.exists(txt_file_path):
         raise ConcatenateError(f"{txt_file_path} does not exist.")
 
-    overview_filename = f"{clip_length}-{interval_seconds} (ClipLength-IntervalSeconds){extension}"
-    concatenated_filepath = os.path.join(output_folder, overview_filename)
-
     subprocess_concatenate_args = [
         "ffmpeg",
         "-loglevel",
@@ -118,7 +372,7 @@ def concatenate_clips(txt_file_path, output_folder, extension, interval_seconds,
 
     line()
     log.info("Concatenating the clips to create the overview video...")
-    result = subprocess.run(subprocess_concatenate_args)
+    result = run_command(subprocess_concatenate_args, capture_output=False)
     log.info("Done!")
     shutil.rmtree(os.path.join(output_folder, "clips"))
     log.info("The clips have been deleted as they are no longer needed.")
@@ -127,14 +381,42 @@ def concatenate_clips(txt_file_path, output_folder, extension, interval_seconds,
         return concatenated_filepath
 
 
-def create_movie_overview(video_path, output_folder, interval_seconds, clip_length):
+def create_movie_overview(
+    video_path,
+    output_folder,
+    interval_seconds,
+    clip_length,
+    jobs=1,
+    cpu_budget=None,
+    engine="clips",
+    sampling="interval",
+    show_commands=False,
+):
     os.makedirs(output_folder, exist_ok=True)
     extension = Path(video_path).suffix
+    output_file = get_overview_path(output_folder, extension, interval_seconds, clip_length, sampling)
+
+    log.info("Overview mode activated.")
     try:
-        txt_file_path = create_clips(video_path, output_folder, interval_seconds, clip_length)
-        output_file = concatenate_clips(
-            txt_file_path, output_folder, extension, interval_seconds, clip_length
-        )
+        if sampling == "content":
+            clip_offsets = get_representative_clip_offsets(
+                video_path, interval_seconds, clip_length, cpu_budget, show_commands
+            )
+        else:
+            log.info(
+                f"Using a {clip_length} second clip every {interval_seconds} seconds from {video_path}."
+            )
+            clip_offsets = get_clip_offsets(video_path, interval_seconds)
+
+        if engine == "filter":
+            output_file = create_overview_single_pass(
+                video_path, clip_offsets, clip_length, output_file, cpu_budget
+            )
+        else:
+            txt_file_path = create_clips(
+                video_path, output_folder, clip_offsets, clip_length, jobs, cpu_budget
+            )
+            output_file = concatenate_clips(txt_file_path, output_folder, output_file)
         result = True
     except ClipError as err:
         result = False
@@ -145,7 +427,7 @@ def create_movie_overview(video_path, output_folder, interval_seconds, clip_leng
 
     if result:
         log.info(
-            f"Overview Video: {clip_length}-{interval_seconds} (ClipLength-IntervalSeconds){extension}"
+            f"Overview Video: {get_overview_name(extension, interval_seconds, clip_length, sampling)}"
         )
         line()
         return result, output_file
@@ -0,0 +1,238 @@
+from collections import deque
+import os
+import selectors
+from threading import Event, Lock, Thread
+
+from utils import is_headless, Logger
+
+log = Logger("progress")
+
+# The number of lines of stderr kept for each process, e.g. to show why FFmpeg failed.
+stderr_lines_kept = 50
+
+
+def _parse_number(value, number_type=float, suffix=""):
+    # FFmpeg reports "N/A" for values that are not known yet.
+    if value is None or value == "N/A":
+        return None
+
+    try:
+        return number_type(value[: -len(suffix)] if suffix and value.endswith(suffix) else value)
+    except ValueError:
+        return None
+
+
+class ProgressEvent:
+    """
+    One block of the key=value pairs written by FFmpeg's -progress option, which ends with progress=continue
+    or progress=end. The values that are not known (N/A) are None. All of the pairs are kept in fields.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.frame = _parse_number(fields.get("frame"), int)
+        self.fps = _parse_number(fields.get("fps"))
+        # In kbit/s.
+        self.bitrate = _parse_number(fields.get("bitrate"), suffix="kbits/s")
+        # In bytes.
+        self.total_size = _parse_number(fields.get("total_size"), int)
+        # In seconds. out_time_ms is actually in microseconds, like out_time_us.
+        out_time_us = _parse_number(fields.get("out_time_us", fields.get("out_time_ms")), int)
+        self.out_time = out_time_us / 1_000_000 if out_time_us is not None else None
+        self.dup_frames = _parse_number(fields.get("dup_frames"), int)
+        self.drop_frames = _parse_number(fields.get("drop_frames"), int)
+        # How many times faster than real time.
+        self.speed = _parse_number(fields.get("speed"), suffix="x")
+        self.is_end = fields.get("progress") == "end"
+
+
+class ProgressStream:
+    """
+    Parses the -progress output and the stderr of an FFmpeg process, which are fed to it by the
+    ProgressReader, and calls the subscribed callbacks with a ProgressEvent for each progress block
+    and with each line of stderr. The callbacks are called from the thread of the ProgressReader,
+    so they should return quickly.
+    """
+
+    def __init__(self):
+        self._event_callbacks = []
+        self._stderr_callbacks = []
+        self._fields = {}
+        self._finished = Event()
+        self.last_event = None
+        self.stderr_lines = deque(maxlen=stderr_lines_kept)
+
+    def subscribe(self, callback):
+        self._event_callbacks.append(callback)
+
+    def subscribe_stderr(self, callback):
+        self._stderr_callbacks.append(callback)
+
+    def feed_stdout_line(self, line):
+        key, separator, value = line.strip().partition("=")
+        if not separator:
+            return
+
+        self._fields[key.strip()] = value.strip()
+        # "progress" is the last key of each block.
+        if key.strip() == "progress":
+            event = ProgressEvent(self._fields)
+            self._fields = {}
+            self.last_event = event
+            for callback in self._event_callbacks:
+                callback(event)
+
+    def feed_stderr_line(self, line):
+        line = line.rstrip()
+        if not line:
+            return
+
+        self.stderr_lines.append(line)
+        for callback in self._stderr_callbacks:
+            callback(line)
+
+    def finish(self):
+        self._finished.set()
+
+    def wait(self):
+        # Wait in short steps, so that KeyboardInterrupt is raised promptly on every platform.
+        while not self._finished.wait(0.5):
+            pass
+
+
+class ProgressReader:
+    """
+    Reads the stdout (-progress output) and stderr of any number of FFmpeg processes with a single thread,
+    which waits for any of the pipes to have data with the selectors module. Both pipes are always
+    drained, so a process that writes a lot to stderr cannot block. Windows does not support waiting for
+    pipes, so a thread per pipe is used there instead.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._selector = None
+        self._thread = None
+        # Written to when a pipe is registered, to wake up the thread.
+        self._wake_up_read, self._wake_up_write = None, None
+        # The number of pipes of each stream that are still open.
+        self._open_pipes = {}
+
+    def watch(self, process, stream):
+        """Feeds the stdout and stderr of a subprocess.Popen process (both must be pipes) to stream."""
+        pipes = [(process.stdout, stream.feed_stdout_line), (process.stderr, stream.feed_stderr_line)]
+
+        if os.name == "nt":
+            with self._lock:
+                self._open_pipes[stream] = len(pipes)
+            for pipe, feed_line in pipes:
+                Thread(
+                    target=self._read_pipe_blocking, args=(pipe, feed_line, stream), daemon=True
+                ).start()
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._selector = selectors.DefaultSelector()
+                self._wake_up_read, self._wake_up_write = os.pipe()
+                os.set_blocking(self._wake_up_read, False)
+                self._selector.register(self._wake_up_read, selectors.EVENT_READ, None)
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+            self._open_pipes[stream] = len(pipes)
+            for pipe, feed_line in pipes:
+                os.set_blocking(pipe.fileno(), False)
+                # The data of each pipe is buffered until a whole line has been read.
+                self._selector.register(pipe, selectors.EVENT_READ, [feed_line, stream, b""])
+
+        os.write(self._wake_up_write, b"\0")
+
+    def _run(self):
+        while True:
+            for key, _ in self._selector.select():
+                if key.data is None:
+                    try:
+                        os.read(self._wake_up_read, 4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                feed_line, stream, buffer = key.data
+                try:
+                    data = os.read(key.fd, 65536)
+                except BlockingIOError:
+                    continue
+
+                if data:
+                    *lines, key.data[2] = (buffer + data).split(b"\n")
+                    for line in lines:
+                        feed_line(line.decode("utf-8", errors="replace"))
+                    continue
+
+                # End of file.
+                if buffer:
+                    feed_line(buffer.decode("utf-8", errors="replace"))
+                with self._lock:
+                    self._selector.unregister(key.fileobj)
+                key.fileobj.close()
+                self._close_pipe(stream)
+
+    def _read_pipe_blocking(self, pipe, feed_line, stream):
+        for line in pipe:
+            feed_line(line.decode("utf-8", errors="replace"))
+        pipe.close()
+        self._close_pipe(stream)
+
+    def _close_pipe(self, stream):
+        with self._lock:
+            self._open_pipes[stream] -= 1
+            finished = self._open_pipes[stream] == 0
+            if finished:
+                del self._open_pipes[stream]
+
+        if finished:
+            stream.finish()
+
+
+class ProgressBar:
+    """
+    Shows the progress of an FFmpeg process with tqdm, along with its speed.
+    In headless mode (--no-graphs), there is no progress bar and tqdm is not imported.
+    """
+
+    def __init__(self, total_frames):
+        self._previous_frame_number = 0
+        if is_headless():
+            self._progress_bar = None
+            return
+
+        from tqdm import tqdm
+
+        self._progress_bar = tqdm(total=total_frames, unit=" frames", dynamic_ncols=True)
+        self._progress_bar.clear()
+
+    def update(self, event):
+        if self._progress_bar is None:
+            return
+
+        if event.frame is not None:
+            self._progress_bar.update(event.frame - self._previous_frame_number)
+            self._previous_frame_number = event.frame
+
+        if event.speed is not None:
+            self._progress_bar.set_postfix(speed=f"{event.speed}x", refresh=False)
+
+    def write(self, line):
+        if self._progress_bar is None:
+            log.info(line)
+            return
+
+        # Printed above the progress bar, so that the progress bar is not broken up.
+        self._progress_bar.write(line)
+
+    def close(self):
+        if self._progress_bar is not None:
+            self._progress_bar.close()
+
+
+progress_reader = ProgressReader()
@@ -0,0 +1,205 @@
+from hashlib import sha256
+import json
+import os
+import shutil
+from threading import get_ident, Lock
+
+from frame_log import load_frame_store, read_frame_columns, save_frame_store, write_frame_log
+from utils import Logger
+
+log = Logger("result_cache")
+
+# The number of bytes read from the start, middle and end of a file when fingerprinting it.
+_SAMPLE_SIZE = 1024 * 1024
+
+
+class ResultCache:
+    """
+    A content-addressed cache for transcodes, intermediate videos (cut and overview videos) and
+    per-frame metrics. Files are identified by a fingerprint of their content rather than their path,
+    and results are keyed by the fingerprints of their inputs plus everything else that affects them
+    (e.g. the encoder arguments or the libvmaf options), so only missing results are computed.
+    The cache is disabled until a directory is set.
+    """
+
+    def __init__(self, cache_dir=None):
+        self._cache_dir = cache_dir
+        self._fingerprints = {}
+        self._lock = Lock()
+
+    @property
+    def enabled(self):
+        return self._cache_dir is not None
+
+    def set_cache_dir(self, cache_dir):
+        self._cache_dir = cache_dir
+
+    def fingerprint(self, file_path):
+        """
+        Returns a fingerprint of the content of a file, calculated from its size and samples taken from
+        its start, middle and end, so that large videos do not have to be read in full.
+        """
+        stat = os.stat(file_path)
+        memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            if memo_key in self._fingerprints:
+                return self._fingerprints[memo_key]
+
+        digest = sha256(str(stat.st_size).encode("utf-8"))
+        with open(file_path, "rb") as f:
+            for offset in [0, stat.st_size // 2, max(0, stat.st_size - _SAMPLE_SIZE)]:
+                f.seek(offset)
+                digest.update(f.read(_SAMPLE_SIZE))
+
+        fingerprint = digest.hexdigest()
+        with self._lock:
+            self._fingerprints[memo_key] = fingerprint
+
+        return fingerprint
+
+    def make_key(self, *parts):
+        """
+        Returns a key for a result, or None if the cache is disabled.
+        File paths must be passed through fingerprint() before being used as a part of the key.
+        """
+        if not self.enabled:
+            return None
+
+        return sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def make_file_key(self, kind, file_path, *parts):
+        """Returns a key for a result derived from a single file, or None if the cache is disabled."""
+        if not self.enabled:
+            return None
+
+        return self.make_key(kind, self.fingerprint(file_path), *parts)
+
+    def discard_output(self, output_path):
+        """
+        Cached files are hard linked into the output folder when possible. FFmpeg truncates existing
+        output files, so an output file must be removed before it is written to, otherwise the cached
+        file that it is linked to would be overwritten.
+        """
+        if self.enabled and os.path.isfile(output_path):
+            os.remove(output_path)
+
+    def restore_file(self, key, output_path):
+        """Puts the cached file at output_path. Returns the metadata of the file, or None on a cache miss."""
+        if key is None:
+            return None
+
+        cached_file_path = self._get_path("files", key)
+        metadata = self._read_json(f"{cached_file_path}.json")
+        if metadata is None or not os.path.exists(cached_file_path):
+            return None
+
+        _link_or_copy(cached_file_path, output_path)
+        return metadata
+
+    def store_file(self, key, file_path, metadata=None):
+        if key is None:
+            return
+
+        cached_file_path = self._get_path("files", key)
+        temporary_file_path = _get_temporary_path(cached_file_path)
+        try:
+            _link_or_copy(file_path, temporary_file_path)
+            os.replace(temporary_file_path, cached_file_path)
+            # The metadata is written last, as its presence marks the cached file as complete.
+            self._write_json(f"{cached_file_path}.json", metadata or {})
+        except OSError as error:
+            log.warning(f"Unable to save {file_path} in the cache: {error}")
+
+    def restore_metrics(self, key, features, json_file_path):
+        """
+        Writes the cached per-frame metrics to json_file_path if they contain all of the requested features.
+        Returns the features that still need to be calculated. If nothing has been cached for the key,
+        all of the features are returned and nothing is written.
+        """
+        if key is None:
+            return list(features)
+
+        cached = self._read_json(self._get_path("metrics", f"{key}.json"))
+        if cached is None:
+            return list(features)
+
+        missing_features = [feature for feature in features if feature not in cached["features"]]
+        if not missing_features:
+            try:
+                frame_numbers, columns, _ = load_frame_store(self._get_path("metrics", f"{key}.npz"))
+            except (OSError, ValueError, KeyError):
+                return list(features)
+            write_frame_log(json_file_path, frame_numbers, columns)
+
+        return missing_features
+
+    def store_metrics(self, key, features, json_file_path):
+        """
+        Saves the per-frame metrics in json_file_path, which contains the given features (and the VMAF,
+        which libvmaf always calculates). The metrics are cached as one column per metric, so that the
+        log is never held in memory as JSON. If metrics have already been cached for the key, the columns
+        are merged and the merged metrics are also written back to json_file_path.
+        """
+        if key is None:
+            return
+
+        frame_numbers, columns = read_frame_columns(json_file_path)
+        features = set(features) | {"VMAF"}
+
+        features_path = self._get_path("metrics", f"{key}.json")
+        store_path = self._get_path("metrics", f"{key}.npz")
+        cached = self._read_json(features_path)
+        if cached is not None:
+            try:
+                cached_frame_numbers, cached_columns, _ = load_frame_store(store_path)
+            except (OSError, ValueError, KeyError):
+                cached = None
+
+        if cached is not None and len(cached_frame_numbers) == len(frame_numbers):
+            cached_columns.update(columns)
+            columns = cached_columns
+            features |= set(cached["features"])
+            write_frame_log(json_file_path, frame_numbers, columns)
+
+        try:
+            save_frame_store(store_path, frame_numbers, columns, columns.keys())
+            # The features are written last, as their presence marks the cached metrics as complete.
+            self._write_json(features_path, {"features": sorted(features)})
+        except OSError as error:
+            log.warning(f"Unable to save the metrics in the cache: {error}")
+
+    def _get_path(self, kind, key):
+        directory = os.path.join(self._cache_dir, kind)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, key)
+
+    def _read_json(self, file_path):
+        try:
+            with open(file_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_json(self, file_path, content):
+        temporary_file_path = _get_temporary_path(file_path)
+        with open(temporary_file_path, "w") as f:
+            json.dump(content, f)
+        os.replace(temporary_file_path, file_path)
+
+
+def _get_temporary_path(file_path):
+    return f"{file_path}.{os.getpid()}.{get_ident()}.tmp"
+
+
+def _link_or_copy(source_path, destination_path):
+    if os.path.exists(destination_path):
+        os.remove(destination_path)
+
+    try:
+        os.link(source_path, destination_path)
+    except OSError:
+        shutil.copyfile(source_path, destination_path)
+
+
+result_cache = ResultCache()
@@ -0,0 +1,138 @@
+from hashlib import sha256
+import json
+import os
+from threading import get_ident, Lock
+
+from utils import Logger
+
+log = Logger("run_manifest")
+
+# Arguments that only affect how quickly the outputs are created, not the outputs themselves.
+# The CRF values and presets are not part of the run key either, as each comparison point
+# records its own CRF value and preset, so a resumed run may compare more (or fewer) of them.
+# --encode-chunks (which changes the transcode) and --stream-to-vmaf (which changes what the time
+# column measures) are part of the run key, so that a table never mixes their outputs with others.
+ignored_arguments = [
+    "cache_dir",
+    "clip_jobs",
+    "cpu_budget",
+    "crf",
+    "max_processes",
+    "n_threads",
+    "no_probe_cache",
+    "overview_engine",
+    "parallel_jobs",
+    "pipeline",
+    "pipeline_depth",
+    "preset",
+    "queue",
+    "resume",
+    "shared_reference",
+    "show_commands",
+    "vmaf_segments",
+]
+
+
+def get_run_key(args):
+    """
+    Returns a key for the arguments that affect the outputs and for the original video,
+    so that a run is only resumed with the same arguments and the same original video.
+    """
+    arguments = {
+        name: value for name, value in sorted(vars(args).items()) if name not in ignored_arguments
+    }
+    stat = os.stat(args.original_video_path)
+    return sha256(
+        json.dumps([arguments, stat.st_size, stat.st_mtime_ns], default=str).encode("utf-8")
+    ).hexdigest()
+
+
+class RunManifest:
+    """
+    Records the stages of a run (the overview video, the cut video and the encode, the scores and the table
+    row of each comparison point) that have been completed, along with the size and modification time of
+    their outputs. With --resume, a stage is skipped if it was completed by a previous run with the same
+    run key and its outputs have not changed since, so an interrupted run carries on from the first
+    stage that is incomplete. The manifest is disabled until it is opened.
+    """
+
+    def __init__(self):
+        self._path = None
+        self._run_key = None
+        self._stages = {}
+        self._lock = Lock()
+
+    @property
+    def enabled(self):
+        return self._path is not None
+
+    def open(self, manifest_path, run_key, resume):
+        self._path = manifest_path
+        self._run_key = run_key
+        self._stages = {}
+
+        if not resume:
+            return
+
+        try:
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            log.info("There is no run to resume, so the run will start from the beginning.")
+            return
+
+        if manifest.get("run_key") != run_key:
+            log.info(
+                "The previous run used different arguments or a different original video, "
+                "so the run will start from the beginning."
+            )
+            return
+
+        self._stages = manifest.get("stages", {})
+
+    def get_completed(self, stage, name, key):
+        """
+        Returns the data recorded when the stage was completed, or None if the stage needs to be run,
+        because it was not completed with the same key or one of its outputs has changed since.
+        """
+        with self._lock:
+            record = self._stages.get(f"{stage}|{name}")
+
+        if record is None or record["key"] != json.loads(json.dumps(key)):
+            return None
+
+        for output_path, (size, mtime_ns) in record["outputs"].items():
+            try:
+                stat = os.stat(output_path)
+            except OSError:
+                return None
+            if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+                return None
+
+        return record["data"]
+
+    def complete(self, stage, name, key, output_paths, data=None):
+        """Records that the stage has been completed and has created output_paths."""
+        if not self.enabled:
+            return
+
+        outputs = {}
+        for output_path in output_paths:
+            stat = os.stat(output_path)
+            outputs[output_path] = [stat.st_size, stat.st_mtime_ns]
+
+        with self._lock:
+            self._stages[f"{stage}|{name}"] = {
+                "key": key,
+                "outputs": outputs,
+                "data": data if data is not None else {},
+            }
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        # Write to a temporary file first, so that an interrupted run never leaves a partial manifest.
+        temporary_path = f"{self._path}.{os.getpid()}.{get_ident()}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump({"run_key": self._run_key, "stages": self._stages}, f, indent=2)
+        os.replace(temporary_path, self._path)
@@ -0,0 +1,139 @@
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from queue import Queue
+from threading import Event, Thread
+
+
+class JobScheduler:
+    """
+    Runs jobs (encodes, libvmaf runs etc.) concurrently while keeping the total number of threads
+    within a CPU budget. The heavy lifting is done by FFmpeg processes, so a thread per running job
+    is enough to drive them.
+    """
+
+    def __init__(self, cpu_budget, parallel_jobs=1):
+        self._cpu_budget = max(1, cpu_budget)
+        self._parallel_jobs = max(1, min(parallel_jobs, self._cpu_budget))
+
+    @property
+    def parallel_jobs(self):
+        return self._parallel_jobs
+
+    @property
+    def threads_per_job(self):
+        # When only one job runs at a time, the encoder and libvmaf decide how many threads to use.
+        if self._parallel_jobs == 1:
+            return None
+        return max(1, self._cpu_budget // self._parallel_jobs)
+
+    def map_ordered(self, function, items):
+        """
+        Calls function(item) for each item, running up to parallel_jobs calls at the same time.
+        The results are yielded in the same order as the items, regardless of which job finishes first.
+        When only one job runs at a time, the calls are made in the calling thread, so that Ctrl-C
+        interrupts the running job (only the main thread receives KeyboardInterrupt).
+        """
+        items = list(items)
+        if self._parallel_jobs == 1:
+            for item in items:
+                yield function(item)
+            return
+
+        with ThreadPoolExecutor(max_workers=self._parallel_jobs) as executor:
+            futures = [executor.submit(function, item) for item in items]
+            try:
+                for future in futures:
+                    yield future.result()
+            except BaseException:
+                # Do not start any jobs that are still waiting if one of the jobs has failed.
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def run_all(self, function, items):
+        """
+        Calls function(item) for each item, running up to parallel_jobs calls at the same time, and returns
+        the results in the same order as the items. As soon as one call fails, the calls that have not
+        started yet are cancelled and the error is raised. As with map_ordered, the calls are made in the
+        calling thread when only one job runs at a time.
+        """
+        items = list(items)
+        if self._parallel_jobs == 1:
+            return [function(item) for item in items]
+
+        with ThreadPoolExecutor(max_workers=self._parallel_jobs) as executor:
+            futures = [executor.submit(function, item) for item in items]
+            done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in not_done:
+                future.cancel()
+            for future in done:
+                if future.exception() is not None:
+                    raise future.exception()
+
+            return [future.result() for future in futures]
+
+    def run_pipelined(self, first_stage, second_stage, items, queue_size=1):
+        """
+        Runs first_stage(item) for each item in one thread and second_stage(item, first_stage_result)
+        in another, so that the first stage of the next item overlaps the second stage of the previous
+        item. At most queue_size items wait between the two stages. The results of second_stage are
+        yielded in the same order as the items.
+        """
+        items = list(items)
+        handoff = Queue(maxsize=max(1, queue_size))
+        results = Queue()
+        stop = Event()
+
+        def run_first_stage():
+            try:
+                for item in items:
+                    if stop.is_set():
+                        return
+                    handoff.put((item, first_stage(item)))
+            except BaseException as error:
+                handoff.put(_StageFailed(error))
+            else:
+                handoff.put(_END_OF_ITEMS)
+
+        def run_second_stage():
+            while True:
+                entry = handoff.get()
+                if entry is _END_OF_ITEMS:
+                    return
+                if isinstance(entry, _StageFailed):
+                    results.put(entry)
+                    return
+                item, first_stage_result = entry
+                try:
+                    results.put(second_stage(item, first_stage_result))
+                except BaseException as error:
+                    results.put(_StageFailed(error))
+                    stop.set()
+                    # Unblock the first stage if it is waiting for space in the queue.
+                    while not handoff.empty():
+                        handoff.get_nowait()
+                    return
+
+        threads = [
+            Thread(target=run_first_stage, daemon=True),
+            Thread(target=run_second_stage, daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        for _ in items:
+            result = results.get()
+            if isinstance(result, _StageFailed):
+                stop.set()
+                raise result.error
+            yield result
+
+        for thread in threads:
+            thread.join()
+
+
+class _StageFailed:
+    def __init__(self, error):
+        self.error = error
+
+
+_END_OF_ITEMS = object()
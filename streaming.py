@@ -0,0 +1,142 @@
+import os
+from threading import Event, Thread
+from time import sleep
+
+from encode_video import get_encode_cache_key, get_encoding_arguments
+from ffmpeg_process_factory import FfmpegProcessFactory
+from libvmaf import get_metrics_cache_key, run_libvmaf
+from result_cache import result_cache
+from utils import get_metrics_list, get_partial_path, is_streaming_supported, Logger, Timer
+
+log = Logger("streaming")
+
+
+class StreamingError(Exception):
+    pass
+
+
+def encode_and_score_streaming(
+    video_path,
+    args,
+    crf,
+    preset,
+    output_path,
+    message,
+    duration,
+    json_file_path,
+    fps,
+    crf_or_preset,
+    n_threads=None,
+):
+    """
+    Encodes the video and calculates the metrics of the transcode at the same time.
+    The encoder writes the transcode to output_path and, through the tee muxer, to a FIFO
+    that libvmaf reads from, so the transcode does not have to be read from the disk again.
+    Raises StreamingError if the video cannot be encoded or scored.
+    """
+    if not is_streaming_supported():
+        raise StreamingError("Streaming the transcode to libvmaf is not supported on this platform.")
+
+    # The encoder and libvmaf run at the same time, so they each get half of the threads.
+    threads = n_threads if n_threads else int(args.n_threads)
+    threads_per_process = max(1, threads // 2)
+
+    # As with encode_video, the transcode is only moved to output_path once it is complete.
+    partial_path = get_partial_path(output_path)
+    arguments = get_encoding_arguments(
+        video_path, args, crf, preset, partial_path, threads_per_process
+    )
+    factory = FfmpegProcessFactory()
+
+    cache_key = get_encode_cache_key(video_path, arguments, partial_path)
+    metadata = result_cache.restore_file(cache_key, output_path)
+    if metadata is not None:
+        # There is nothing to stream, so score the cached transcode (or use its cached metrics).
+        log.info(f"Using the cached transcode for {message}.")
+        run_libvmaf(
+            output_path, args, json_file_path, fps, video_path, factory, duration, crf_or_preset, threads
+        )
+        return factory, metadata["time_taken"]
+
+    result_cache.discard_output(output_path)
+
+    fifo_path = os.path.join(os.path.dirname(output_path), ".stream.nut")
+    if os.path.exists(fifo_path):
+        os.remove(fifo_path)
+    os.mkfifo(fifo_path)
+
+    arguments.tee_output(fifo_path)
+    encoding_process = factory.create_process(arguments, args)
+
+    encode_result = {}
+    scoring_finished = Event()
+
+    def encode():
+        # The encoder can only write to the FIFO as fast as libvmaf reads from it, so this is the time taken
+        # to encode and score the video.
+        timer = Timer()
+        timer.start()
+        try:
+            encoding_process.run(video_path, duration)
+        finally:
+            encode_result["time_taken"] = timer.stop(args.decimal_places)
+            if getattr(encoding_process, "returncode", None) != 0:
+                _release_reader(fifo_path, scoring_finished)
+
+    log.info(f"Converting the video using {message} and streaming the transcode to libvmaf...")
+    encoding_thread = Thread(target=encode, daemon=True)
+    encoding_thread.start()
+
+    try:
+        run_libvmaf(
+            fifo_path,
+            args,
+            json_file_path,
+            fps,
+            video_path,
+            factory,
+            duration,
+            crf_or_preset,
+            threads_per_process,
+            distorted_format="nut",
+        )
+    finally:
+        scoring_finished.set()
+        _release_writer(fifo_path, encoding_thread)
+        os.remove(fifo_path)
+
+    if encoding_process.returncode != 0:
+        raise StreamingError(f"Unable to encode the video using {message}.")
+
+    if not os.path.exists(json_file_path):
+        raise StreamingError(f"Unable to calculate the metrics of the transcode created using {message}.")
+
+    os.replace(partial_path, output_path)
+    result_cache.store_file(cache_key, output_path, {"time_taken": encode_result["time_taken"]})
+    # The metrics could not be cached while the transcode was being streamed.
+    result_cache.store_metrics(
+        get_metrics_cache_key(args, output_path, video_path, fps), get_metrics_list(args), json_file_path
+    )
+
+    return factory, encode_result["time_taken"]
+
+
+def _release_reader(fifo_path, scoring_finished):
+    # If the encoder fails before opening the FIFO, libvmaf would wait forever for a writer.
+    # Briefly opening the FIFO for writing lets libvmaf see the end of the stream instead.
+    # Opening a FIFO for writing without blocking fails until the reader has opened it, so keep trying.
+    while not scoring_finished.is_set():
+        try:
+            os.close(os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK))
+            return
+        except OSError:
+            sleep(0.1)
+
+
+def _release_writer(fifo_path, encoding_thread):
+    # If libvmaf fails before opening the FIFO, the encoder would wait forever for a reader.
+    # Opening and closing the FIFO for reading makes the encoder's writes fail so that it exits.
+    while encoding_thread.is_alive():
+        reader = os.open(fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+        encoding_thread.join(0.1)
+        os.close(reader)
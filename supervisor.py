@@ -0,0 +1,138 @@
+import asyncio
+from concurrent.futures import CancelledError
+import signal
+import subprocess
+import sys
+from threading import Thread
+
+# The number of bytes read from a pipe at a time.
+_CHUNK_SIZE = 65536
+
+
+class ProcessSupervisor:
+    """
+    Runs FFmpeg and ffprobe processes on an asyncio event loop in a background thread. Any thread can hand
+    a process to the supervisor and wait for it to finish, so the encodes, libvmaf runs, cuts, overview clips
+    and probes of all of the jobs are run by the same event loop. At most max_processes processes run at the
+    same time (the others wait for their turn), the pipes of all of the processes are read by the event loop
+    rather than by a thread each, and Ctrl-C kills every process, including those that are waiting.
+    The supervisor is disabled until it is started.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._semaphore = None
+        self._tasks = set()
+
+    @property
+    def enabled(self):
+        return self._loop is not None
+
+    def start(self, max_processes):
+        """Starts the event loop. Must be called from the main thread, as it handles Ctrl-C."""
+        self._loop = asyncio.new_event_loop()
+        Thread(target=self._loop.run_forever, daemon=True).start()
+        self._semaphore = asyncio.run_coroutine_threadsafe(
+            self._create_semaphore(max_processes), self._loop
+        ).result()
+        signal.signal(signal.SIGINT, self._handle_interrupt)
+
+    async def _create_semaphore(self, max_processes):
+        # The semaphore must be created by the event loop that uses it.
+        return asyncio.Semaphore(max_processes)
+
+    def run(self, arguments, stream=None):
+        """
+        Runs a process and waits for it to finish. If stream (a ProgressStream) is given, the stdout and stderr
+        of the process are fed to it as they are written. Otherwise, they are captured.
+        Returns the return code, the stdout and the stderr (None if they were fed to stream).
+        """
+        future = asyncio.run_coroutine_threadsafe(self._run_tracked(arguments, stream), self._loop)
+        try:
+            return future.result()
+        except CancelledError:
+            # All of the processes have been killed because of Ctrl-C.
+            raise KeyboardInterrupt
+
+    async def _run_tracked(self, arguments, stream):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            async with self._semaphore:
+                return await self._run(arguments, stream)
+        finally:
+            self._tasks.discard(task)
+
+    async def _run(self, arguments, stream):
+        process = await asyncio.create_subprocess_exec(
+            *arguments, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        try:
+            if stream is None:
+                stdout, stderr = await process.communicate()
+                return process.returncode, stdout, stderr
+
+            await asyncio.gather(
+                self._read_lines(process.stdout, stream.feed_stdout_line),
+                self._read_lines(process.stderr, stream.feed_stderr_line),
+            )
+            return await process.wait(), None, None
+        except asyncio.CancelledError:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        finally:
+            if stream is not None:
+                stream.finish()
+
+    async def _read_lines(self, pipe, feed_line):
+        # Read in chunks rather than with readline(), which fails if a line is longer than its buffer.
+        buffer = b""
+        while True:
+            data = await pipe.read(_CHUNK_SIZE)
+            if not data:
+                break
+            *lines, buffer = (buffer + data).split(b"\n")
+            for line in lines:
+                feed_line(line.decode("utf-8", errors="replace"))
+
+        if buffer:
+            feed_line(buffer.decode("utf-8", errors="replace"))
+
+    def cancel_all(self):
+        """Kills all of the processes that are running and cancels those that are waiting for their turn."""
+        if self.enabled:
+            asyncio.run_coroutine_threadsafe(self._cancel_all(), self._loop).result(timeout=10)
+
+    async def _cancel_all(self):
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _handle_interrupt(self, signal_number, frame):
+        self.cancel_all()
+        signal.default_int_handler(signal_number, frame)
+
+
+process_supervisor = ProcessSupervisor()
+
+
+def run_command(arguments, capture_output=True):
+    """
+    Runs a command to completion, through the supervisor if it has been started.
+    Returns a subprocess.CompletedProcess. If capture_output is False and the supervisor has not been started,
+    the output is shown in the terminal. With the supervisor, the output is always captured, and stderr is
+    written to the terminal once the command has finished if capture_output is False.
+    """
+    if not process_supervisor.enabled:
+        if capture_output:
+            return subprocess.run(arguments, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return subprocess.run(arguments)
+
+    returncode, stdout, stderr = process_supervisor.run(arguments)
+    if not capture_output and stderr:
+        sys.stderr.write(stderr.decode("utf-8", errors="replace"))
+
+    return subprocess.CompletedProcess(arguments, returncode, stdout, stderr)
@@ -0,0 +1,62 @@
+import json
+import os
+
+from batch import find_sources, get_folder_names, read_manifest, Title
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "w").close()
+
+
+def test_find_sources_of_a_directory(tmp_path):
+    for name in ["b.mkv", "a.MP4", "notes.txt", "sub/c.mkv"]:
+        touch(str(tmp_path / name))
+
+    assert find_sources(str(tmp_path)) == [str(tmp_path / "a.MP4"), str(tmp_path / "b.mkv")]
+
+
+def test_find_sources_of_a_glob_pattern(tmp_path):
+    for name in ["one.mkv", "two.mkv", "three.mp4", "sub/four.mkv"]:
+        touch(str(tmp_path / name))
+
+    assert find_sources(str(tmp_path / "*.mkv")) == [str(tmp_path / "one.mkv"), str(tmp_path / "two.mkv")]
+    assert find_sources(str(tmp_path / "**" / "*.mkv")) == [
+        str(tmp_path / "one.mkv"),
+        str(tmp_path / "sub" / "four.mkv"),
+        str(tmp_path / "two.mkv"),
+    ]
+
+
+def test_find_sources_of_a_path():
+    # A path is used as it is, so that a missing video is reported when its title is run.
+    assert find_sources("missing.mkv") == ["missing.mkv"]
+
+
+def test_read_manifest(tmp_path):
+    touch(str(tmp_path / "videos" / "a.mkv"))
+    touch(str(tmp_path / "videos" / "b.mkv"))
+    manifest_path = tmp_path / "manifest.json"
+    with open(manifest_path, "w") as f:
+        json.dump(
+            [
+                "trailer.mp4",
+                {"path": "videos", "arguments": ["-crf", 18, 20]},
+            ],
+            f,
+        )
+
+    titles = read_manifest(str(manifest_path))
+
+    assert [title.path for title in titles] == [
+        str(tmp_path / "trailer.mp4"),
+        str(tmp_path / "videos" / "a.mkv"),
+        str(tmp_path / "videos" / "b.mkv"),
+    ]
+    assert [title.arguments for title in titles] == [[], ["-crf", "18", "20"], ["-crf", "18", "20"]]
+
+
+def test_get_folder_names():
+    titles = [Title("a/movie.mkv"), Title("b/movie.mkv"), Title("a/trailer.mkv"), Title("c/movie.mkv")]
+
+    assert get_folder_names(titles) == ["movie.mkv", "movie.mkv (2)", "trailer.mkv", "movie.mkv (3)"]
@@ -0,0 +1,63 @@
+from crf_search import extrapolate_crf, get_next_crf, get_search_result
+
+
+def run_search(score_of_crf, target, crf_min=0, crf_max=51, start_crf=23):
+    probes = {}
+    while True:
+        crf = get_next_crf(probes, target, crf_min, crf_max, start_crf)
+        if crf is None:
+            return get_search_result(probes, target), probes
+        assert crf not in probes
+        probes[crf] = score_of_crf(crf)
+
+
+def test_extrapolate_crf():
+    assert extrapolate_crf({}, 90) is None
+    assert extrapolate_crf({20: 95}, 90) is None
+    assert extrapolate_crf({20: 95, 24: 91}, 90) == 25
+    # The scores must decrease as the CRF value increases.
+    assert extrapolate_crf({20: 91, 24: 95}, 90) is None
+
+
+def test_extrapolate_crf_uses_the_probes_closest_to_the_target():
+    assert extrapolate_crf({10: 99, 20: 95, 24: 91}, 90) == 25
+
+
+def test_first_crf_is_the_start_crf_within_the_range():
+    assert get_next_crf({}, 90, 0, 51, 23) == 23
+    assert get_next_crf({}, 90, 30, 51, 23) == 30
+    assert get_next_crf({}, 90, 0, 20, 23) == 20
+
+
+def test_next_crf_is_interpolated_between_passing_and_failing_crf():
+    assert get_next_crf({20: 95, 30: 85}, 90, 0, 51, 23) == 25
+
+
+def test_search_is_finished_when_the_range_is_empty():
+    assert get_next_crf({24: 90.5, 25: 89.5}, 90, 0, 51, 23) is None
+    assert get_next_crf({0: 80}, 90, 0, 51, 23) is None
+    assert get_next_crf({51: 95}, 90, 0, 51, 23) is None
+
+
+def test_get_search_result():
+    assert get_search_result({}, 90) is None
+    assert get_search_result({20: 89}, 90) is None
+    assert get_search_result({18: 95, 22: 90, 26: 85}, 90) == 22
+
+
+def test_search_finds_the_highest_passing_crf():
+    def score_of_crf(crf):
+        # Not a straight line, so the search cannot find the answer by interpolation alone.
+        return 100 - 0.02 * crf ** 2
+
+    for target in [99, 95, 90, 80, 60]:
+        result, probes = run_search(score_of_crf, target)
+        expected = max(crf for crf in range(52) if score_of_crf(crf) >= target)
+        assert result == expected
+        assert len(probes) <= 8
+
+
+def test_search_without_a_passing_crf():
+    result, probes = run_search(lambda crf: 50 - crf, 90)
+    assert result is None
+    assert 0 in probes
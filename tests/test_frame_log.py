@@ -0,0 +1,112 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import frame_log
+from frame_log import (
+    FrameLogError,
+    merge_frame_logs,
+    read_frame_columns,
+    read_frame_log,
+    write_frame_log,
+)
+
+
+def write_log(path, scores):
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "frames": [
+                    {"frameNum": frame_number, "metrics": metrics}
+                    for frame_number, metrics in enumerate(scores)
+                ],
+                "pooled_metrics": {},
+            },
+            f,
+        )
+
+
+def test_merge_frame_logs(tmp_path):
+    first_log, second_log, merged_log = [str(tmp_path / name) for name in ["1.json", "2.json", "merged.json"]]
+    write_log(first_log, [{"vmaf": 90.0}, {"vmaf": 80.0}])
+    write_log(second_log, [{"vmaf": 70.0}, {"vmaf": 60.0}, {"vmaf": 50.0}])
+
+    merge_frame_logs([first_log, second_log], [0, 2], merged_log)
+
+    frame_numbers, scores = read_frame_log(merged_log, ["vmaf"])
+    assert frame_numbers.tolist() == [0, 1, 2, 3, 4]
+    assert scores["vmaf"].tolist() == [90, 80, 70, 60, 50]
+
+    with open(merged_log) as f:
+        pooled_vmaf = json.load(f)["pooled_metrics"]["vmaf"]
+    assert pooled_vmaf["min"] == 50
+    assert pooled_vmaf["max"] == 90
+    assert pooled_vmaf["mean"] == 70
+    harmonic_mean = 5 / sum(1 / (score + 1) for score in [90, 80, 70, 60, 50]) - 1
+    assert np.isclose(pooled_vmaf["harmonic_mean"], harmonic_mean)
+
+
+def test_merge_frame_logs_with_offsets(tmp_path):
+    first_log, second_log, merged_log = [str(tmp_path / name) for name in ["1.json", "2.json", "merged.json"]]
+    write_log(first_log, [{"vmaf": 90.0}])
+    write_log(second_log, [{"vmaf": 70.0}])
+
+    merge_frame_logs([first_log, second_log], [0, 10], merged_log)
+
+    frame_numbers, scores = read_frame_log(merged_log, ["vmaf", "psnr_y"])
+    assert frame_numbers.tolist() == [0, 10]
+    assert list(scores) == ["vmaf"]
+
+
+def test_read_frame_log_across_chunks(tmp_path, monkeypatch):
+    # Frames are split across reads when the chunks are small.
+    monkeypatch.setattr(frame_log, "_CHUNK_SIZE", 7)
+    log_path = str(tmp_path / "log.json")
+    write_log(log_path, [{"vmaf": 90.5, "psnr_y": 40.0}, {"vmaf": 80.25}, {"vmaf": 70.0, "psnr_y": 42.0}])
+
+    frame_numbers, scores = read_frame_log(log_path, ["vmaf", "psnr_y", "float_ssim"])
+
+    assert frame_numbers.tolist() == [0, 1, 2]
+    assert scores["vmaf"].dtype == np.float32
+    assert scores["vmaf"].tolist() == [90.5, 80.25, 70.0]
+    # Frames without a metric get NaN, and metrics that are not in the log are left out.
+    assert np.isnan(scores["psnr_y"][1]) and scores["psnr_y"][2] == 42
+    assert "float_ssim" not in scores
+
+
+def test_read_frame_log_of_an_incomplete_log(tmp_path):
+    log_path = str(tmp_path / "log.json")
+    with open(log_path, "w") as f:
+        f.write('{"frames": [{"frameNum": 0, "metrics": {"vmaf": 90.0}}, {"frameNum": 1, "metr')
+
+    with pytest.raises(FrameLogError):
+        read_frame_log(log_path, ["vmaf"])
+
+
+def test_frame_columns_are_written_back_unchanged(tmp_path):
+    log_path, written_log = str(tmp_path / "log.json"), str(tmp_path / "written.json")
+    write_log(log_path, [{"vmaf": 95.123456}, {"vmaf": 94.654321, "psnr_y": 40.5}])
+
+    frame_numbers, columns = read_frame_columns(log_path)
+    assert np.isnan(columns["psnr_y"][0])
+    write_frame_log(written_log, frame_numbers, columns)
+
+    with open(log_path) as f, open(written_log) as g:
+        assert json.load(f)["frames"] == json.load(g)["frames"]
+
+
+def test_frame_store_is_not_used_after_the_log_is_replaced(tmp_path):
+    log_path = tmp_path / "vmaf.json"
+    write_log(log_path, [{"vmaf": 90.0}, {"vmaf": 91.0}])
+    _, scores = frame_log.read_frame_scores(str(log_path), ["vmaf"])
+    assert scores["vmaf"].tolist() == [90.0, 91.0]
+
+    # The new log keeps an older modification time than the store, like a log restored from the cache.
+    store_mtime = os.stat(frame_log.get_frame_store_path(str(log_path))).st_mtime_ns
+    write_log(log_path, [{"vmaf": 50.0}, {"vmaf": 51.0}, {"vmaf": 52.0}])
+    os.utime(log_path, ns=(store_mtime - 10**9, store_mtime - 10**9))
+
+    _, scores = frame_log.read_frame_scores(str(log_path), ["vmaf"])
+    assert scores["vmaf"].tolist() == [50.0, 51.0, 52.0]
@@ -0,0 +1,122 @@
+from multiprocessing import get_context
+import time
+
+import pytest
+
+from job_queue import JobFailedError, JobQueue
+
+
+def claim_until_empty(queue_path, worker_id):
+    # A minimal worker, which completes every job that it claims.
+    queue = JobQueue(queue_path)
+    claimed = []
+    while True:
+        job = queue.claim(worker_id)
+        if job is None:
+            return claimed
+        queue.complete(job.id, worker_id, {"worker": worker_id})
+        claimed.append(job.id)
+
+
+def test_each_job_is_claimed_by_one_worker(tmp_path):
+    queue_path = str(tmp_path / "queue.db")
+    queue = JobQueue(queue_path)
+    job_ids = [queue.add_job("encode", {"crf": crf}) for crf in range(40)]
+
+    with get_context("spawn").Pool(4) as pool:
+        claimed = pool.starmap(
+            claim_until_empty, [(queue_path, f"worker {number}") for number in range(4)]
+        )
+
+    claimed_ids = [job_id for worker_claims in claimed for job_id in worker_claims]
+    assert sorted(claimed_ids) == job_ids
+    assert not queue.has_unfinished_jobs()
+    for job_id in job_ids:
+        assert queue.wait_for_result(job_id)["worker"].startswith("worker ")
+
+
+def test_expired_lease_is_requeued(tmp_path):
+    queue_path = str(tmp_path / "queue.db")
+    first_worker = JobQueue(queue_path, lease_seconds=0.2)
+    second_worker = JobQueue(queue_path, lease_seconds=0.2)
+    job_id = first_worker.add_job("score", {})
+
+    job = first_worker.claim("first")
+    assert job.id == job_id and job.attempts == 1
+    # The job is leased, so no other worker can claim it.
+    assert second_worker.claim("second") is None
+
+    time.sleep(0.3)
+    job = second_worker.claim("second")
+    assert job.id == job_id and job.attempts == 2
+    # The first worker has lost the job.
+    assert not first_worker.renew_lease(job_id, "first")
+    assert second_worker.renew_lease(job_id, "second")
+
+
+def test_only_the_leaseholder_can_complete_a_job(tmp_path):
+    queue_path = str(tmp_path / "queue.db")
+    first_worker = JobQueue(queue_path, lease_seconds=0.2)
+    second_worker = JobQueue(queue_path, lease_seconds=60)
+    job_id = first_worker.add_job("encode", {})
+
+    first_worker.claim("first")
+    time.sleep(0.3)
+    second_worker.claim("second")
+
+    # The first worker finishes late, after the job has been requeued.
+    first_worker.complete(job_id, "first", {"worker": "first"})
+    first_worker.fail(job_id, "first", "Too late.")
+    assert second_worker.has_unfinished_jobs()
+
+    second_worker.complete(job_id, "second", {"worker": "second"})
+    assert second_worker.wait_for_result(job_id) == {"worker": "second"}
+
+
+def test_job_fails_after_max_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"), max_attempts=2)
+    job_id = queue.add_job("encode", {})
+
+    queue.fail(queue.claim("worker").id, "worker", "First error.")
+    job = queue.claim("worker")
+    assert job.id == job_id and job.attempts == 2
+    queue.fail(job.id, "worker", "Second error.")
+
+    assert queue.claim("worker") is None
+    with pytest.raises(JobFailedError, match="Second error."):
+        queue.wait_for_result(job_id, poll_interval=0)
+
+
+def test_expired_lease_fails_after_max_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"), lease_seconds=0.1, max_attempts=1)
+    job_id = queue.add_job("encode", {})
+
+    queue.claim("worker")
+    time.sleep(0.2)
+
+    assert queue.claim("other worker") is None
+    with pytest.raises(JobFailedError, match="expired"):
+        queue.wait_for_result(job_id, poll_interval=0)
+
+
+def test_job_waits_for_its_dependency(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"))
+    encode_job_id = queue.add_job("encode", {})
+    score_job_id = queue.add_job("score", {}, depends_on=encode_job_id)
+
+    assert queue.claim("first").id == encode_job_id
+    assert queue.claim("second") is None
+
+    queue.complete(encode_job_id, "first", {})
+    assert queue.claim("second").id == score_job_id
+
+
+def test_failed_dependency_fails_the_job(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"), max_attempts=1)
+    encode_job_id = queue.add_job("encode", {})
+    score_job_id = queue.add_job("score", {}, depends_on=encode_job_id)
+
+    queue.fail(queue.claim("worker").id, "worker", "Unable to encode.")
+
+    with pytest.raises(JobFailedError, match="Unable to encode."):
+        queue.wait_for_result(score_job_id, poll_interval=0)
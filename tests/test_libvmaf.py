@@ -0,0 +1,37 @@
+from libvmaf import get_chunk_order, get_segments
+
+
+def test_segments_cover_all_of_the_frames():
+    assert get_segments(100, 4, 1) == [(0, 25), (25, 25), (50, 25), (75, None)]
+    assert get_segments(10, 3, 1) == [(0, 4), (4, 4), (8, None)]
+
+
+def test_segment_length_is_a_multiple_of_n_subsample():
+    segments = get_segments(100, 3, 5)
+    assert segments == [(0, 35), (35, 35), (70, None)]
+    assert all(length % 5 == 0 for start_frame, length in segments[:-1])
+
+
+def test_fewer_segments_than_requested_when_there_are_few_frames():
+    assert get_segments(3, 8, 1) == [(0, 1), (1, 1), (2, None)]
+    assert get_segments(10, 4, 5) == [(0, 5), (5, None)]
+    assert get_segments(1, 4, 1) == [(0, None)]
+
+
+def test_chunk_order_is_bit_reversed():
+    assert get_chunk_order(1) == [0]
+    assert get_chunk_order(2) == [0, 1]
+    assert get_chunk_order(8) == [0, 4, 2, 6, 1, 5, 3, 7]
+
+
+def test_chunk_order_contains_every_chunk_once():
+    for chunk_count in range(1, 70):
+        assert sorted(get_chunk_order(chunk_count)) == list(range(chunk_count))
+
+
+def test_chunks_scored_first_are_spread_across_the_video():
+    order = get_chunk_order(100)
+    first_half = sorted(order[:50])
+    # Each quarter of the video gets some of the first half of the chunks.
+    for quarter in range(4):
+        assert any(quarter * 25 <= index < (quarter + 1) * 25 for index in first_half)
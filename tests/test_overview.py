@@ -0,0 +1,62 @@
+import subprocess
+
+import overview
+from overview import get_single_pass_arguments
+
+
+def test_single_pass_arguments_read_each_clip():
+    arguments = get_single_pass_arguments("film.mkv", [30, 60], "2", "overview.mkv", threads=4)
+
+    assert arguments[arguments.index("-filter_complex") + 1] == (
+        "[0:V:0][1:V:0]concat=n=2:v=1:a=0[overview]"
+    )
+    # Each clip is an input which seeks to the clip and only reads clip_length seconds of it.
+    first_input = arguments.index("-ss")
+    assert arguments[first_input:first_input + 12] == [
+        "-ss", "30", "-t", "2", "-i", "film.mkv", "-ss", "60", "-t", "2", "-i", "film.mkv"
+    ]
+    assert arguments.count("-i") == 2
+    assert arguments[arguments.index("-map") + 1] == "[overview]"
+    assert arguments[arguments.index("-threads") + 1] == "4"
+    assert arguments[-1] == "overview.mkv"
+
+
+def test_single_pass_arguments_without_threads():
+    assert "-threads" not in get_single_pass_arguments("film.mkv", [30], "2", "overview.mkv")
+
+
+def test_clips_are_split_between_processes(tmp_path, monkeypatch):
+    commands = []
+
+    def run_command(arguments, capture_output=True):
+        commands.append(arguments)
+        open(arguments[-1], "w").close()
+        return subprocess.CompletedProcess(arguments, 0)
+
+    monkeypatch.setattr(overview, "run_command", run_command)
+    output_path = str(tmp_path / "overview.mkv")
+    clip_offsets = list(range(10, 10 * (overview.max_clips_per_process * 2 + 2), 10))
+
+    assert overview.create_overview_single_pass("film.mkv", clip_offsets, "2", output_path) == output_path
+
+    *part_commands, concatenate_command = commands
+    assert len(part_commands) == 3
+    assert all(command.count("-i") <= overview.max_clips_per_process for command in part_commands)
+    assert sum(command.count("-i") for command in part_commands) == len(clip_offsets)
+    assert "concat" in concatenate_command and concatenate_command[-1] == output_path
+    # The parts are deleted once they have been concatenated.
+    assert not (tmp_path / "clips").exists()
+
+
+def test_few_clips_are_read_by_one_process(tmp_path, monkeypatch):
+    commands = []
+    monkeypatch.setattr(
+        overview,
+        "run_command",
+        lambda arguments, capture_output=True: commands.append(arguments)
+        or subprocess.CompletedProcess(arguments, 0),
+    )
+
+    overview.create_overview_single_pass("film.mkv", [10, 20, 30], "2", str(tmp_path / "overview.mkv"))
+
+    assert len(commands) == 1 and commands[0].count("-i") == 3
@@ -0,0 +1,88 @@
+import os
+import subprocess
+
+import pytest
+
+import comparison
+import utils
+from comparison import ComparisonRun, ConfigError, make_config, validate_config
+from run_manifest import RunManifest
+from utils import get_prefiltered_video_path, prefilter_video
+
+
+def test_get_prefiltered_video_path():
+    assert get_prefiltered_video_path("videos/film.mp4", "ffv1", "out") == os.path.join(
+        "out", "film [Filtered].mkv"
+    )
+    assert get_prefiltered_video_path("videos/film.mp4", "y4m", "out") == os.path.join(
+        "out", "film [Filtered].y4m"
+    )
+
+
+def test_prefilter_requires_video_filters(tmp_path):
+    video_path = tmp_path / "film.mkv"
+    video_path.write_bytes(b"film")
+
+    with pytest.raises(ConfigError) as error:
+        validate_config(make_config(str(video_path), prefilter="ffv1"))
+    assert error.value.errors == ["--prefilter can only be used in conjunction with -vf/--video-filters."]
+
+    validate_config(make_config(str(video_path), prefilter="ffv1", video_filters="scale=1280:-2"))
+
+
+def test_prefilter_video_arguments(tmp_path, monkeypatch):
+    commands = []
+
+    def run_command(arguments, capture_output=True):
+        commands.append(arguments)
+        # FFmpeg writes to the partial path.
+        with open(arguments[-1], "wb") as f:
+            f.write(b"filtered")
+        return subprocess.CompletedProcess(arguments, 0)
+
+    monkeypatch.setattr(utils, "run_command", run_command)
+    output_path = str(tmp_path / "film [Filtered].mkv")
+
+    for prefilter, codec_arguments in [
+        ("ffv1", ["-c:v", "ffv1", "-level", "3", "-g", "1"]),
+        ("y4m", ["-strict", "-1"]),
+    ]:
+        args = make_config("film.mp4", prefilter=prefilter, video_filters="scale=1280:-2")
+        prefilter_video("film.mp4", args, output_path)
+
+        arguments = commands[-1]
+        assert arguments[arguments.index("-vf") + 1] == "scale=1280:-2"
+        assert arguments[-len(codec_arguments) - 1 : -1] == codec_arguments
+        assert arguments[-1] != output_path
+        assert open(output_path, "rb").read() == b"filtered"
+        assert not os.path.exists(arguments[-1])
+
+
+def test_prefilter_original_video(tmp_path, monkeypatch):
+    filtered = []
+
+    def fake_prefilter_video(video_path, args, output_file_path):
+        filtered.append(video_path)
+        with open(output_file_path, "wb") as f:
+            f.write(b"filtered")
+
+    monkeypatch.setattr(comparison, "prefilter_video", fake_prefilter_video)
+    video_path = tmp_path / "film.mkv"
+    video_path.write_bytes(b"film")
+    output_folder = str(tmp_path / "CRF Comparison")
+    args = make_config(str(video_path), prefilter="ffv1", video_filters="scale=1280:-2", crf=[20, 24])
+
+    for resume in [False, True]:
+        run = ComparisonRun(args)
+        run.manifest = RunManifest()
+        run.manifest.open(str(tmp_path / "Run Manifest.json"), "run key", resume)
+        prefiltered_video_path = run.prefilter_original_video(output_folder)
+
+        assert prefiltered_video_path == os.path.join(output_folder, "film [Filtered].mkv")
+        # The encodes and libvmaf runs use the filtered video, so they must not apply the filters again.
+        assert run.job_args.video_filters is None
+        assert run.job_args.crf == [20, 24]
+        assert args.video_filters == "scale=1280:-2"
+
+    # The filters are not applied again when the run is resumed.
+    assert filtered == [str(video_path)]
@@ -0,0 +1,117 @@
+import subprocess
+import sys
+
+import progress
+from progress import ProgressReader, ProgressStream
+
+
+def feed_block(stream, **fields):
+    for key, value in fields.items():
+        stream.feed_stdout_line(f"{key}={value}\n")
+
+
+def test_progress_events():
+    stream = ProgressStream()
+    events = []
+    stream.subscribe(events.append)
+
+    feed_block(
+        stream,
+        frame="120",
+        fps="59.94",
+        bitrate="N/A",
+        total_size="N/A",
+        out_time_us="N/A",
+        speed="N/A",
+        progress="continue",
+    )
+    feed_block(
+        stream,
+        frame="240",
+        fps="60.0",
+        bitrate="1234.5kbits/s",
+        total_size="617250",
+        out_time_us="4000000",
+        out_time_ms="4000000",
+        dup_frames="1",
+        drop_frames="0",
+        speed="2.5x",
+        progress="end",
+    )
+
+    assert len(events) == 2
+    first, last = events
+    assert first.frame == 120
+    assert first.fps == 59.94
+    assert first.bitrate is None and first.total_size is None and first.out_time is None and first.speed is None
+    assert not first.is_end
+
+    assert last.frame == 240
+    assert last.bitrate == 1234.5
+    assert last.total_size == 617250
+    assert last.out_time == 4.0
+    assert (last.dup_frames, last.drop_frames) == (1, 0)
+    assert last.speed == 2.5
+    assert last.is_end
+    assert stream.last_event is last
+    # The fields of the first block are not carried over to the next one.
+    assert "progress" in last.fields and last.fields["frame"] == "240"
+
+
+def test_out_time_ms_is_in_microseconds():
+    stream = ProgressStream()
+    feed_block(stream, out_time_ms="1500000", progress="continue")
+
+    assert stream.last_event.out_time == 1.5
+
+
+def test_lines_without_a_value_are_ignored():
+    stream = ProgressStream()
+    stream.feed_stdout_line("\n")
+    stream.feed_stdout_line("not a key value pair\n")
+    feed_block(stream, frame="1", progress="continue")
+
+    assert stream.last_event.fields == {"frame": "1", "progress": "continue"}
+
+
+def test_stderr_lines(monkeypatch):
+    monkeypatch.setattr(progress, "stderr_lines_kept", 3)
+    stream = ProgressStream()
+    lines = []
+    stream.subscribe_stderr(lines.append)
+
+    for number in range(5):
+        stream.feed_stderr_line(f"line {number}\n")
+    stream.feed_stderr_line("\n")
+
+    assert lines == [f"line {number}" for number in range(5)]
+    assert list(stream.stderr_lines) == ["line 2", "line 3", "line 4"]
+
+
+def test_progress_reader():
+    script = (
+        "import sys\n"
+        "for frame in range(3):\n"
+        "    print(f'frame={frame}'); print('progress=continue')\n"
+        "print('frame=3'); print('progress=end', end='')\n"
+        "sys.stderr.write('error\\n' * 1000)\n"
+    )
+    reader = ProgressReader()
+    streams = []
+    for _ in range(2):
+        process = subprocess.Popen(
+            [sys.executable, "-c", script], stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        stream = ProgressStream()
+        frames = []
+        stream.subscribe(lambda event, frames=frames: frames.append(event.frame))
+        reader.watch(process, stream)
+        streams.append((process, stream, frames))
+
+    for process, stream, frames in streams:
+        stream.wait()
+        process.wait()
+        # The last line has no newline, but is still parsed at the end of the output.
+        assert frames == [0, 1, 2, 3]
+        assert stream.last_event.is_end
+        assert list(stream.stderr_lines) == ["error"] * progress.stderr_lines_kept
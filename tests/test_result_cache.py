@@ -0,0 +1,111 @@
+import json
+import os
+
+from result_cache import ResultCache
+
+
+def write_log(path, metrics_of_each_frame):
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "frames": [
+                    {"frameNum": frame_number, "metrics": metrics}
+                    for frame_number, metrics in enumerate(metrics_of_each_frame)
+                ]
+            },
+            f,
+        )
+
+
+def read_frames(path):
+    with open(path) as f:
+        return json.load(f)["frames"]
+
+
+def test_disabled_cache(tmp_path):
+    cache = ResultCache()
+    assert not cache.enabled
+    assert cache.make_key("encode", "x264") is None
+    assert cache.restore_file(None, str(tmp_path / "video.mkv")) is None
+    assert cache.restore_metrics(None, ["VMAF"], str(tmp_path / "log.json")) == ["VMAF"]
+
+
+def test_file_hit_and_miss(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    transcode_path = tmp_path / "transcode.mkv"
+    transcode_path.write_bytes(b"transcode")
+    key = cache.make_key("encode", "crf 20")
+
+    assert cache.restore_file(key, str(tmp_path / "restored.mkv")) is None
+
+    cache.store_file(key, str(transcode_path), {"time_taken": 1.5})
+    assert cache.restore_file(key, str(tmp_path / "restored.mkv")) == {"time_taken": 1.5}
+    assert (tmp_path / "restored.mkv").read_bytes() == b"transcode"
+    assert cache.restore_file(cache.make_key("encode", "crf 24"), str(tmp_path / "other.mkv")) is None
+
+
+def test_file_key_depends_on_the_content(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    video_path = tmp_path / "video.mkv"
+    video_path.write_bytes(b"first version")
+    first_key = cache.make_file_key("cut", str(video_path), 10)
+
+    # A copy of the file has the same key.
+    (tmp_path / "copy.mkv").write_bytes(b"first version")
+    assert cache.make_file_key("cut", str(tmp_path / "copy.mkv"), 10) == first_key
+
+    video_path.write_bytes(b"second version")
+    assert cache.make_file_key("cut", str(video_path), 10) != first_key
+
+
+def test_discarded_output_does_not_overwrite_the_cached_file(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    transcode_path = tmp_path / "transcode.mkv"
+    transcode_path.write_bytes(b"transcode")
+    key = cache.make_key("encode", "crf 20")
+    cache.store_file(key, str(transcode_path))
+
+    cache.discard_output(str(transcode_path))
+    assert not transcode_path.exists()
+    transcode_path.write_bytes(b"another transcode")
+    assert cache.restore_file(key, str(tmp_path / "restored.mkv")) is not None
+    assert (tmp_path / "restored.mkv").read_bytes() == b"transcode"
+
+
+def test_metrics_hit_and_miss(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    log_path, restored_path = str(tmp_path / "log.json"), str(tmp_path / "restored.json")
+    key = cache.make_key("metrics", "crf 20")
+
+    assert cache.restore_metrics(key, ["VMAF", "PSNR"], restored_path) == ["VMAF", "PSNR"]
+    assert not os.path.exists(restored_path)
+
+    write_log(log_path, [{"vmaf": 95.123456}, {"vmaf": 94.654321}])
+    cache.store_metrics(key, ["VMAF"], log_path)
+
+    # Only the missing features have to be calculated, and nothing is written until all are cached.
+    assert cache.restore_metrics(key, ["VMAF", "PSNR"], restored_path) == ["PSNR"]
+    assert not os.path.exists(restored_path)
+    assert cache.restore_metrics(key, ["VMAF"], restored_path) == []
+    assert read_frames(restored_path) == read_frames(log_path)
+
+
+def test_metrics_are_merged(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    key = cache.make_key("metrics", "crf 20")
+    vmaf_log, psnr_log = str(tmp_path / "vmaf.json"), str(tmp_path / "psnr.json")
+    write_log(vmaf_log, [{"vmaf": 95.0}, {"vmaf": 94.0}])
+    cache.store_metrics(key, ["VMAF"], vmaf_log)
+
+    # libvmaf always calculates the VMAF, so the second log contains it as well.
+    write_log(psnr_log, [{"vmaf": 95.0, "psnr_y": 40.5}, {"vmaf": 94.0, "psnr_y": 39.5}])
+    cache.store_metrics(key, ["PSNR"], psnr_log)
+
+    restored_path = str(tmp_path / "restored.json")
+    assert cache.restore_metrics(key, ["VMAF", "PSNR"], restored_path) == []
+    assert read_frames(restored_path) == [
+        {"frameNum": 0, "metrics": {"vmaf": 95.0, "psnr_y": 40.5}},
+        {"frameNum": 1, "metrics": {"vmaf": 94.0, "psnr_y": 39.5}},
+    ]
+    with open(str(tmp_path / "cache" / "metrics" / f"{key}.json")) as f:
+        assert json.load(f)["features"] == ["PSNR", "VMAF"]
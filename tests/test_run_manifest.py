@@ -0,0 +1,86 @@
+import os
+
+from comparison import make_config
+from run_manifest import get_run_key, RunManifest
+
+
+def test_run_key_ignores_arguments_that_only_affect_the_speed(tmp_path):
+    video_path = tmp_path / "film.mkv"
+    video_path.write_bytes(b"film")
+    run_key = get_run_key(make_config(str(video_path), crf=[20, 24]))
+
+    assert get_run_key(make_config(str(video_path), crf=[20, 24, 28])) == run_key
+    assert get_run_key(make_config(str(video_path), crf=[20, 24], parallel_jobs=4)) == run_key
+    assert get_run_key(make_config(str(video_path), crf=[20, 24], max_processes=2)) == run_key
+
+
+def test_run_key_depends_on_the_outputs_and_the_original_video(tmp_path):
+    video_path = tmp_path / "film.mkv"
+    video_path.write_bytes(b"film")
+    run_key = get_run_key(make_config(str(video_path), crf=[20, 24]))
+
+    assert get_run_key(make_config(str(video_path), crf=[20, 24], calculate_psnr=True)) != run_key
+    # A chunked encode creates a different transcode.
+    assert get_run_key(make_config(str(video_path), crf=[20, 24], encode_chunks=4)) != run_key
+    # With --stream-to-vmaf, the time column also includes the scoring.
+    assert get_run_key(make_config(str(video_path), crf=[20, 24], stream_to_vmaf=True)) != run_key
+
+    video_path.write_bytes(b"another film")
+    assert get_run_key(make_config(str(video_path), crf=[20, 24])) != run_key
+
+
+def test_completed_stage_is_resumed(tmp_path):
+    manifest_path = str(tmp_path / "Run Manifest.json")
+    transcode_path = tmp_path / "crf20.mkv"
+    transcode_path.write_bytes(b"transcode")
+
+    manifest = RunManifest()
+    manifest.open(manifest_path, "run key", resume=False)
+    assert manifest.get_completed("encode", "CRF 20", [20, "slow"]) is None
+    manifest.complete("encode", "CRF 20", [20, "slow"], [str(transcode_path)], {"time_taken": 1.5})
+
+    resumed = RunManifest()
+    resumed.open(manifest_path, "run key", resume=True)
+    assert resumed.get_completed("encode", "CRF 20", [20, "slow"]) == {"time_taken": 1.5}
+    # The key of the stage must match as well.
+    assert resumed.get_completed("encode", "CRF 20", [20, "medium"]) is None
+
+
+def test_stage_is_run_again_if_its_output_changed(tmp_path):
+    manifest_path = str(tmp_path / "Run Manifest.json")
+    transcode_path = tmp_path / "crf20.mkv"
+    transcode_path.write_bytes(b"transcode")
+
+    manifest = RunManifest()
+    manifest.open(manifest_path, "run key", resume=False)
+    manifest.complete("encode", "CRF 20", [20, "slow"], [str(transcode_path)])
+
+    transcode_path.write_bytes(b"truncated")
+    resumed = RunManifest()
+    resumed.open(manifest_path, "run key", resume=True)
+    assert resumed.get_completed("encode", "CRF 20", [20, "slow"]) is None
+
+    os.remove(transcode_path)
+    assert resumed.get_completed("encode", "CRF 20", [20, "slow"]) is None
+
+
+def test_nothing_is_resumed_with_a_different_run_key_or_without_resume(tmp_path):
+    manifest_path = str(tmp_path / "Run Manifest.json")
+    transcode_path = tmp_path / "crf20.mkv"
+    transcode_path.write_bytes(b"transcode")
+
+    manifest = RunManifest()
+    manifest.open(manifest_path, "run key", resume=False)
+    manifest.complete("encode", "CRF 20", [20, "slow"], [str(transcode_path)])
+
+    for run_key, resume in [("other run key", True), ("run key", False)]:
+        resumed = RunManifest()
+        resumed.open(manifest_path, run_key, resume)
+        assert resumed.get_completed("encode", "CRF 20", [20, "slow"]) is None
+
+
+def test_disabled_manifest_records_nothing(tmp_path):
+    manifest = RunManifest()
+    assert not manifest.enabled
+    manifest.complete("encode", "CRF 20", [20, "slow"], [])
+    assert manifest.get_completed("encode", "CRF 20", [20, "slow"]) is None
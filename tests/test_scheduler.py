@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import JobScheduler
+
+
+def test_threads_per_job():
+    assert JobScheduler(8, 1).threads_per_job is None
+    assert JobScheduler(8, 3).threads_per_job == 2
+    # There are never more jobs than threads.
+    assert JobScheduler(2, 8).parallel_jobs == 2
+    assert JobScheduler(0, 1).parallel_jobs == 1
+
+
+def test_map_ordered_keeps_the_order_of_the_items():
+    def job(delay):
+        time.sleep(delay)
+        return delay
+
+    delays = [0.2, 0.0, 0.1, 0.05]
+    assert list(JobScheduler(4, 4).map_ordered(job, delays)) == delays
+
+
+def test_map_ordered_runs_jobs_at_the_same_time():
+    running = []
+    most_running = []
+    lock = threading.Lock()
+
+    def job(item):
+        with lock:
+            running.append(item)
+            most_running.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(item)
+
+    list(JobScheduler(4, 2).map_ordered(job, range(6)))
+    assert max(most_running) == 2
+
+
+def test_serial_jobs_run_in_the_calling_thread():
+    threads = list(JobScheduler(8, 1).map_ordered(lambda item: threading.current_thread(), range(3)))
+    assert threads == [threading.current_thread()] * 3
+    threads = JobScheduler(8, 1).run_all(lambda item: threading.current_thread(), range(3))
+    assert threads == [threading.current_thread()] * 3
+
+
+def test_serial_jobs_stop_at_the_first_failure():
+    started = []
+
+    def job(item):
+        started.append(item)
+        if item == 1:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        list(JobScheduler(8, 1).map_ordered(job, range(4)))
+    assert started == [0, 1]
+
+
+def test_map_ordered_does_not_start_waiting_jobs_after_a_failure():
+    started = []
+
+    def job(item):
+        started.append(item)
+        time.sleep(0.05)
+        if item == 0:
+            raise ValueError("Unable to encode.")
+
+    with pytest.raises(ValueError, match="Unable to encode."):
+        list(JobScheduler(2, 2).map_ordered(job, range(10)))
+    assert len(started) < 10
+
+
+def test_run_all_raises_the_first_error_and_cancels_the_rest():
+    started = []
+
+    def job(item):
+        started.append(item)
+        if item == 1:
+            raise ValueError("Unable to create the clip.")
+        time.sleep(0.05)
+        return item
+
+    with pytest.raises(ValueError, match="Unable to create the clip."):
+        JobScheduler(2, 2).run_all(job, range(10))
+    assert len(started) < 10
+    assert JobScheduler(2, 2).run_all(lambda item: item * 2, range(5)) == [0, 2, 4, 6, 8]
+
+
+def test_run_pipelined_keeps_the_order_and_overlaps_the_stages():
+    events = []
+
+    def encode(item):
+        events.append(("encode", item))
+        time.sleep(0.02)
+        return item * 10
+
+    def score(item, encode_result):
+        events.append(("score", item))
+        time.sleep(0.02)
+        return item, encode_result
+
+    results = list(JobScheduler(4, 2).run_pipelined(encode, score, range(4)))
+
+    assert results == [(0, 0), (1, 10), (2, 20), (3, 30)]
+    # The next item is encoded before the previous one has finished being scored.
+    assert events.index(("encode", 1)) < events.index(("score", 1))
+
+
+def test_run_pipelined_stops_after_a_failure():
+    encoded = []
+
+    def encode(item):
+        encoded.append(item)
+        return item
+
+    def score(item, encode_result):
+        if item == 1:
+            raise ValueError("Unable to score.")
+        return item
+
+    results = JobScheduler(4, 2).run_pipelined(encode, score, range(20), queue_size=1)
+    assert next(results) == 0
+    with pytest.raises(ValueError, match="Unable to score."):
+        next(results)
+    assert len(encoded) < 20
@@ -0,0 +1,103 @@
+import signal
+import sys
+from threading import Thread
+import time
+
+import pytest
+
+import supervisor
+from progress import ProgressStream
+from supervisor import ProcessSupervisor, run_command
+
+
+@pytest.fixture
+def process_supervisor(monkeypatch):
+    # start() replaces the SIGINT handler (and must be called from the main thread, which runs the tests).
+    sigint_handler = signal.getsignal(signal.SIGINT)
+    instance = ProcessSupervisor()
+    monkeypatch.setattr(supervisor, "process_supervisor", instance)
+    yield instance
+    signal.signal(signal.SIGINT, sigint_handler)
+    if instance.enabled:
+        instance._loop.call_soon_threadsafe(instance._loop.stop)
+
+
+def python(code):
+    return [sys.executable, "-c", code]
+
+
+def test_run_command_without_the_supervisor(process_supervisor):
+    result = run_command(python("print('out')"))
+
+    assert not process_supervisor.enabled
+    assert result.returncode == 0
+    assert result.stdout.strip() == b"out"
+
+
+def test_run_command(process_supervisor):
+    process_supervisor.start(2)
+    result = run_command(python("import sys; print('out'); sys.stderr.write('err'); sys.exit(3)"))
+
+    assert result.returncode == 3
+    assert result.stdout.strip() == b"out"
+    assert result.stderr == b"err"
+
+
+def test_run_with_a_stream(process_supervisor):
+    process_supervisor.start(2)
+    stream = ProgressStream()
+    frames = []
+    stream.subscribe(lambda event: frames.append(event.frame))
+
+    returncode, stdout, stderr = process_supervisor.run(
+        python("print('frame=1'); print('progress=continue'); print('frame=2'); print('progress=end')"), stream
+    )
+
+    assert (returncode, stdout, stderr) == (0, None, None)
+    assert frames == [1, 2]
+
+
+def test_max_processes(process_supervisor, tmp_path):
+    process_supervisor.start(2)
+    log_path = tmp_path / "times.txt"
+    code = (
+        "import sys, time\n"
+        "start = time.monotonic(); time.sleep(0.3)\n"
+        f"open({str(log_path)!r}, 'a').write(f'{{start}} {{time.monotonic()}}\\n')\n"
+    )
+    threads = [Thread(target=process_supervisor.run, args=(python(code),)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    intervals = [tuple(map(float, line.split())) for line in log_path.read_text().splitlines()]
+    assert len(intervals) == 4
+    for start, _ in intervals:
+        running = sum(1 for other_start, other_end in intervals if other_start <= start < other_end)
+        assert running <= 2
+
+
+def test_cancel_all(process_supervisor):
+    process_supervisor.start(1)
+    errors = []
+
+    def run():
+        try:
+            process_supervisor.run(python("import time; time.sleep(30)"))
+        except KeyboardInterrupt as error:
+            errors.append(error)
+
+    # The second process waits for its turn, and is cancelled as well.
+    threads = [Thread(target=run) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+
+    start = time.monotonic()
+    process_supervisor.cancel_all()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert time.monotonic() - start < 5
+    assert len(errors) == 2
@@ -0,0 +1,37 @@
+import numpy as np
+
+from utils import decimate_min_max
+
+
+def test_short_series_is_not_decimated():
+    x_values, y_values = decimate_min_max(range(10), range(10), 100)
+    assert x_values.tolist() == list(range(10))
+    assert y_values.tolist() == list(range(10))
+
+
+def test_decimated_series_keeps_dips_and_peaks():
+    y_values = np.full(10_000, 90.0)
+    y_values[1234] = 20.0
+    y_values[8765] = 100.0
+
+    x_values, decimated = decimate_min_max(np.arange(10_000), y_values, 100)
+
+    assert len(decimated) <= 100
+    assert 1234 in x_values.tolist() and 8765 in x_values.tolist()
+    assert decimated.min() == 20 and decimated.max() == 100
+    # The points stay in their original order.
+    assert np.all(np.diff(x_values) > 0)
+
+
+def test_nan_values_are_only_kept_for_buckets_without_scores():
+    y_values = np.arange(1000, dtype=np.float64)
+    y_values[::2] = np.nan
+    y_values[500:600] = np.nan
+
+    x_values, decimated = decimate_min_max(np.arange(1000), y_values, 100)
+
+    # The buckets are 20 frames long, so frames 500 to 599 are 5 buckets without a score,
+    # each of which keeps a single point.
+    kept_nan_frames = x_values[np.isnan(decimated)]
+    assert len(kept_nan_frames) == 5
+    assert np.all((kept_nan_frames >= 500) & (kept_nan_frames < 600))
@@ -1,14 +1,30 @@
+from hashlib import sha1
+import json
 import logging
 import math
-import numpy as np
 import os
 from pathlib import Path
+import shutil
+from stat import S_ISREG
 import sys
+from threading import get_ident, Lock
 from time import time
 
-from ffmpeg import probe
-import matplotlib.pyplot as plt
-from tqdm import tqdm
+from supervisor import process_supervisor, run_command
+
+# The width of the lines printed by line() in headless mode, or if the width of the terminal is unknown.
+default_line_width = 80
+# In headless mode (--no-graphs), no graphs or progress bars are created and the terminal is not queried.
+_headless = False
+
+
+def set_headless(headless):
+    global _headless
+    _headless = headless
+
+
+def is_headless():
+    return _headless
 
 
 class Logger:
@@ -51,21 +67,120 @@ class Timer:
         return time_rounded
 
 
+def run_ffprobe(video_path):
+    # ffmpeg-python is only imported when a video is probed.
+    from ffmpeg import Error, probe
+
+    if not process_supervisor.enabled:
+        return probe(video_path)
+
+    # The same command as ffmpeg-python's probe(), run by the supervisor.
+    result = run_command(["ffprobe", "-show_format", "-show_streams", "-of", "json", video_path])
+    if result.returncode != 0:
+        raise Error("ffprobe", result.stdout, result.stderr)
+
+    return json.loads(result.stdout.decode("utf-8"))
+
+
+class ProbeCache:
+    """
+    Stores the output of ffprobe so that each file is only probed once. The results are kept in memory
+    and in a directory on the disk, keyed by the path, size and modification time of the file,
+    so later runs do not need to probe a file that has not changed.
+    """
+
+    def __init__(self, cache_dir=None):
+        self._cache_dir = cache_dir
+        self._results = {}
+        self._lock = Lock()
+
+    def set_cache_dir(self, cache_dir):
+        self._cache_dir = cache_dir
+
+    def probe(self, video_path):
+        key = self._get_key(video_path)
+        # Files that cannot be stat'ed (or are not regular files, e.g. pipes) are not cached.
+        if key is None:
+            return run_ffprobe(video_path)
+
+        with self._lock:
+            if key in self._results:
+                return self._results[key]
+
+        result = self._load(key)
+        if result is None:
+            result = run_ffprobe(video_path)
+            self._save(key, result)
+
+        with self._lock:
+            self._results[key] = result
+
+        return result
+
+    def _get_key(self, video_path):
+        try:
+            stat = os.stat(video_path)
+        except OSError:
+            return None
+
+        if not S_ISREG(stat.st_mode):
+            return None
+
+        return f"{os.path.abspath(video_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    def _get_cache_file_path(self, key):
+        return os.path.join(self._cache_dir, f"{sha1(key.encode('utf-8')).hexdigest()}.json")
+
+    def _load(self, key):
+        if not self._cache_dir:
+            return None
+
+        try:
+            with open(self._get_cache_file_path(key), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, key, result):
+        if not self._cache_dir:
+            return
+
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            cache_file_path = self._get_cache_file_path(key)
+            # Write to a temporary file first so that other processes never read a partial file.
+            temporary_file_path = f"{cache_file_path}.{os.getpid()}.{get_ident()}.tmp"
+            with open(temporary_file_path, "w") as f:
+                json.dump(result, f)
+            os.replace(temporary_file_path, cache_file_path)
+        except OSError as error:
+            log.warning(f"Unable to save the ffprobe output to the cache: {error}")
+
+
+default_probe_cache_dir = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(Path.home(), ".cache")),
+    "video-quality-metrics",
+    "probe",
+)
+
+probe_cache = ProbeCache(default_probe_cache_dir)
+
+
 class VideoInfoProvider:
     def __init__(self, video_path):
         self._video_path = video_path
 
     def get_bitrate(self, decimal_places, video_path=None):
         if video_path:
-            bitrate = probe(video_path)["format"]["bit_rate"]
+            bitrate = probe_cache.probe(video_path)["format"]["bit_rate"]
         else:
-            bitrate = probe(self._video_path)["format"]["bit_rate"]
+            bitrate = probe_cache.probe(self._video_path)["format"]["bit_rate"]
         return f"{force_decimal_places((int(bitrate) / 1_000_000), decimal_places)} Mbps"
 
     def get_framerate_fraction(self):
         r_frame_rate = [
             stream
-            for stream in probe(self._video_path)["streams"]
+            for stream in probe_cache.probe(self._video_path)["streams"]
             if stream["codec_type"] == "video"
         ][0]["r_frame_rate"]
         return r_frame_rate
@@ -75,25 +190,19 @@ class VideoInfoProvider:
         return int(numerator) / int(denominator)
 
     def get_duration(self):
-        return float(probe(self._video_path)["format"]["duration"])
+        return float(probe_cache.probe(self._video_path)["format"]["duration"])
 
 
 log = Logger("utils")
 
 
-def cut_video(filename, args, output_ext, output_folder, comparison_table):
+def get_cut_video_path(filename, args, output_ext, output_folder):
     cut_version_filename = f"{Path(filename).stem} [{args.encode_length}s]{output_ext}"
     # Output path for the cut video.
-    output_file_path = os.path.join(output_folder, cut_version_filename)
-    # The reference file will be the cut version of the video.
-    # Create the cut version.
-    log.info(f"Cutting the video to a length of {args.encode_length} seconds...")
-    os.system(
-        f"ffmpeg -loglevel warning -y -i {args.original_video_path} -t {args.encode_length} "
-        f'-map 0 -c copy "{output_file_path}"'
-    )
-    log.info("Done!")
+    return os.path.join(output_folder, cut_version_filename)
 
+
+def write_cut_video_info(filename, args, comparison_table):
     time_message = (
         f" for {args.encode_length} seconds" if int(args.encode_length) > 1 else "for 1 second"
     )
@@ -101,9 +210,97 @@ def cut_video(filename, args, output_ext, output_folder, comparison_table):
     with open(comparison_table, "w") as f:
         f.write(f"You chose to encode {filename}{time_message} using {args.video_encoder}.")
 
+
+def is_streaming_supported():
+    # Named pipes are created with os.mkfifo, which is not available on Windows.
+    return hasattr(os, "mkfifo")
+
+
+def get_partial_path(output_path):
+    # FFmpeg writes to this path first, and the file is renamed once it is complete, so an interrupted
+    # run never leaves an incomplete file at output_path. The extension is kept for FFmpeg.
+    root, extension = os.path.splitext(output_path)
+    return f"{root}.partial{extension}"
+
+
+def cut_video(filename, args, output_ext, output_folder, comparison_table):
+    output_file_path = get_cut_video_path(filename, args, output_ext, output_folder)
+    partial_file_path = get_partial_path(output_file_path)
+    # The reference file will be the cut version of the video.
+    # Create the cut version.
+    log.info(f"Cutting the video to a length of {args.encode_length} seconds...")
+    result = run_command(
+        [
+            "ffmpeg",
+            "-loglevel",
+            "warning",
+            "-y",
+            "-i",
+            args.original_video_path,
+            "-t",
+            str(args.encode_length),
+            "-map",
+            "0",
+            "-c",
+            "copy",
+            partial_file_path,
+        ],
+        capture_output=False,
+    )
+    if result.returncode != 0:
+        exit_program("Unable to cut the video.")
+
+    os.replace(partial_file_path, output_file_path)
+    log.info("Done!")
+
+    write_cut_video_info(filename, args, comparison_table)
+
     return output_file_path
 
 
+def get_prefiltered_video_path(video_path, prefilter_format, output_folder):
+    extension = ".y4m" if prefilter_format == "y4m" else ".mkv"
+    return os.path.join(output_folder, f"{Path(video_path).stem} [Filtered]{extension}")
+
+
+def prefilter_video(video_path, args, output_file_path):
+    """
+    Applies the -vf filters to the video and saves the frames losslessly, so that the filters do not have to be
+    applied again by each encode and each libvmaf run.
+    """
+    partial_file_path = get_partial_path(output_file_path)
+    if args.prefilter == "y4m":
+        # Allows the pixel formats that are not part of the Y4M specification, e.g. 4:2:0 10-bit.
+        codec_arguments = ["-strict", "-1"]
+    else:
+        # Every frame is a keyframe, so that libvmaf can seek to any frame (--vmaf-segments, --adaptive-sampling).
+        codec_arguments = ["-c:v", "ffv1", "-level", "3", "-g", "1"]
+
+    log.info("Applying the video filters to the original video...")
+    result = run_command(
+        [
+            "ffmpeg",
+            "-loglevel",
+            "warning",
+            "-y",
+            "-i",
+            video_path,
+            "-map",
+            "0:V",
+            "-vf",
+            args.video_filters,
+            *codec_arguments,
+            partial_file_path,
+        ],
+        capture_output=False,
+    )
+    if result.returncode != 0:
+        exit_program("Unable to apply the video filters to the original video.")
+
+    os.replace(partial_file_path, output_file_path)
+    log.info("Done!")
+
+
 def exit_program(message):
     line()
     log.info(f"{message}\nThis program will now exit.")
@@ -120,72 +317,106 @@ def is_list(argument_object):
 
 
 def line():
-    width, height = os.get_terminal_size()
+    if _headless:
+        width = default_line_width
+    else:
+        # Falls back to the default width if there is no terminal, e.g. under cron.
+        width = shutil.get_terminal_size((default_line_width, 24)).columns
     log.info("-" * width)
 
 
+# Line graphs with more points than this are decimated before they are plotted. A graph is 640 pixels wide,
+# so the extra points would not be visible, but they make long videos slow to plot.
+max_plotted_points = 4000
+_plot_lock = Lock()
+
+
+def decimate_min_max(x_values, y_values, max_points):
+    """
+    Returns at most max_points of the points, keeping the lowest and the highest point of each of
+    max_points / 2 equally sized buckets (in their original order), so that dips and peaks are still
+    visible however long the video is. NaN values (frames without a score) are only kept if all of
+    the values in a bucket are NaN.
+    """
+    import numpy as np
+
+    x_values = np.asarray(x_values)
+    y_values = np.asarray(y_values, dtype=np.float64)
+    if len(y_values) <= max_points:
+        return x_values, y_values
+
+    bucket_size = math.ceil(len(y_values) / (max_points // 2))
+    bucket_count = math.ceil(len(y_values) / bucket_size)
+    padding = bucket_count * bucket_size - len(y_values)
+
+    # Padding and NaN values are never the lowest or the highest value of a bucket.
+    is_nan = np.isnan(y_values)
+    for_min = np.append(np.where(is_nan, np.inf, y_values), np.full(padding, np.inf))
+    for_max = np.append(np.where(is_nan, -np.inf, y_values), np.full(padding, -np.inf))
+
+    bucket_starts = np.arange(bucket_count) * bucket_size
+    min_indices = bucket_starts + for_min.reshape(bucket_count, bucket_size).argmin(axis=1)
+    max_indices = bucket_starts + for_max.reshape(bucket_count, bucket_size).argmax(axis=1)
+    # The last bucket may be shorter than the others.
+    indices = np.unique(
+        np.minimum(np.concatenate([min_indices, max_indices]), len(y_values) - 1)
+    )
+
+    return x_values[indices], y_values[indices]
+
+
 def plot_graph(
     title, x_label, y_label, x_values, y_values, mean_y_value, save_path, bar_graph=False
 ):
-    plt.suptitle(title)
-    plt.xlabel(x_label)
-    plt.ylabel(y_label)
-    if bar_graph:
-        xlocs = x_values
-        rotation = 0
-        # If the X values are strings, presets comparison mode was used. Otherwise, CRF comparison mode was used.
-        # xlocs is a list which defines the locations of the xticks.
-        if isinstance(x_values[0], str):
-            xlocs = np.arange(len(x_values))
-            xticks_labels_rotation = 45
-        else:
+    if _headless:
+        return
+
+    # Matplotlib takes a long time to import, so it is only imported when the first graph is created.
+    # The graphs are only saved, so the Agg backend is used, which does not need a display.
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    # pyplot keeps the current figure in global state, so graphs are created one at a time,
+    # e.g. when several titles are run at the same time by batch.py.
+    with _plot_lock:
+        plt.suptitle(title)
+        plt.xlabel(x_label)
+        plt.ylabel(y_label)
+        if bar_graph:
             xlocs = x_values
-            xticks_labels_rotation = 0
-
-        plt.xticks(xlocs, x_values, rotation=xticks_labels_rotation)
-        # Set the range of the y-axis values.
-        plt.ylim(min(y_values) - 1, math.ceil(max(y_values)))
-
-        i = 0
-        for value in x_values:
-            plt.bar(value, y_values[i], label=y_values[i])
-            i += 1
-
-        plt.legend(loc="center left", bbox_to_anchor=(1, 0.5))
-        plt.tight_layout()
-
-    # Plot a line graph.
-    else:
-        plt.plot(x_values, y_values, label=f"{y_label} ({mean_y_value})")
-        plt.legend(loc="lower right")
-
-    plt.savefig(save_path)
-    plt.clf()
-
-
-def show_progress_bar(ffmpeg_process, total_frames):
-    progress_bar = tqdm(
-            total=total_frames,
-            unit=" frames",
-            dynamic_ncols=True,
-    )
+            rotation = 0
+            # If the X values are strings, presets comparison mode was used. Otherwise, CRF comparison mode was used.
+            # xlocs is a list which defines the locations of the xticks.
+            if isinstance(x_values[0], str):
+                xlocs = np.arange(len(x_values))
+                xticks_labels_rotation = 45
+            else:
+                xlocs = x_values
+                xticks_labels_rotation = 0
+
+            plt.xticks(xlocs, x_values, rotation=xticks_labels_rotation)
+            # Set the range of the y-axis values.
+            plt.ylim(min(y_values) - 1, math.ceil(max(y_values)))
+
+            i = 0
+            for value in x_values:
+                plt.bar(value, y_values[i], label=y_values[i])
+                i += 1
+
+            plt.legend(loc="center left", bbox_to_anchor=(1, 0.5))
+            plt.tight_layout()
+
+        # Plot a line graph.
+        else:
+            x_values, y_values = decimate_min_max(x_values, y_values, max_plotted_points)
+            plt.plot(x_values, y_values, label=f"{y_label} ({mean_y_value})")
+            plt.legend(loc="lower right")
 
-    progress_bar.clear()
-    previous_frame_number = 0
-
-    try:
-        while ffmpeg_process.poll() is None:
-            line = ffmpeg_process.stdout.readline().decode("utf-8")
-            if "frame=" in line:
-                frame_number = int(line[6:])
-                frame_number_increase = frame_number - previous_frame_number
-                progress_bar.update(frame_number_increase)
-                previous_frame_number = frame_number
-    except KeyboardInterrupt:
-        progress_bar.close()
-        ffmpeg_process.kill()
-        log.info("[KeyboardInterrupt] FFmpeg process killed. Exiting Video Quality Metrics.")
-        sys.exit(0)
+        plt.savefig(save_path)
+        plt.clf()
 
 
 def write_table_info(table_path, video_filename, original_bitrate, args, crf_or_preset):
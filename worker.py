@@ -0,0 +1,145 @@
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter, Namespace
+import os
+import socket
+import sys
+from threading import Event, Thread
+import time
+import traceback
+
+from encode_video import encode_video
+from ffmpeg_process_factory import FfmpegProcessFactory
+from job_queue import JobQueue
+from libvmaf import run_libvmaf
+from result_cache import result_cache
+from utils import line, Logger, set_headless
+
+log = Logger("worker")
+
+
+def execute_job(job, cpu_budget):
+    """Runs an "encode" or "score" job created by main.py and returns its result."""
+    payload = job.payload
+    args = Namespace(**payload["args"])
+    # The number of threads that libvmaf may use depends on the machine that the worker is running on.
+    args.n_threads = str(cpu_budget)
+    set_headless(args.no_graphs)
+    result_cache.set_cache_dir(args.cache_dir)
+
+    if job.kind == "encode":
+        os.makedirs(os.path.dirname(payload["output_path"]), exist_ok=True)
+        factory, time_taken = encode_video(
+            payload["video_path"],
+            args,
+            payload["crf"],
+            payload["preset"],
+            payload["output_path"],
+            payload["message"],
+            payload["duration"],
+        )
+        if not os.path.exists(payload["output_path"]):
+            raise RuntimeError(f"{payload['output_path']} was not created.")
+        return {"time_taken": time_taken}
+
+    elif job.kind == "score":
+        run_libvmaf(
+            payload["transcode_output_path"],
+            args,
+            payload["json_file_path"],
+            payload["fps"],
+            payload["original_video_path"],
+            FfmpegProcessFactory(),
+            payload["duration"],
+            payload["crf_or_preset"],
+        )
+        if not os.path.exists(payload["json_file_path"]):
+            raise RuntimeError(f"{payload['json_file_path']} was not created.")
+        return {}
+
+    raise ValueError(f"Unknown job type: {job.kind}")
+
+
+def run_worker(queue, worker_id, cpu_budget, poll_interval, exit_when_idle):
+    log.info(f"Worker {worker_id} is waiting for jobs...")
+
+    while True:
+        job = queue.claim(worker_id)
+        if job is None:
+            if exit_when_idle and not queue.has_unfinished_jobs():
+                log.info("There are no more jobs in the queue.")
+                return
+            time.sleep(poll_interval)
+            continue
+
+        line()
+        log.info(f"Running {job.kind} job {job.id} (attempt {job.attempts})...")
+
+        # Keep renewing the lease while the job is running, so that no other worker claims it.
+        job_finished = Event()
+
+        def renew_lease():
+            while not job_finished.wait(queue.lease_seconds / 3):
+                queue.renew_lease(job.id, worker_id)
+
+        renew_thread = Thread(target=renew_lease, daemon=True)
+        renew_thread.start()
+
+        try:
+            result = execute_job(job, cpu_budget)
+        except (Exception, SystemExit):
+            log.info(f"Job {job.id} failed.")
+            queue.fail(job.id, worker_id, traceback.format_exc())
+        else:
+            log.info(f"Job {job.id} is done.")
+            queue.complete(job.id, worker_id, result)
+        finally:
+            job_finished.set()
+            renew_thread.join()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "-q",
+        "--queue",
+        type=str,
+        required=True,
+        help="The path of the job queue file that was specified with the --queue argument of main.py",
+    )
+    parser.add_argument(
+        "--worker-id",
+        type=str,
+        default=f"{socket.gethostname()}:{os.getpid()}",
+        help="The name of this worker, which is shown in the job queue",
+    )
+    parser.add_argument(
+        "--cpu-budget",
+        type=int,
+        default=os.cpu_count(),
+        metavar="THREADS",
+        help="The number of threads that libvmaf may use on this machine",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=2,
+        metavar="SECONDS",
+        help="How often to check for new jobs when the queue is empty",
+    )
+    parser.add_argument(
+        "--exit-when-idle",
+        action="store_true",
+        help="Exit when there are no pending or running jobs left in the queue",
+    )
+    worker_args = parser.parse_args()
+
+    if not os.path.exists(worker_args.queue):
+        log.info(f"Unable to find {worker_args.queue}")
+        sys.exit(1)
+
+    run_worker(
+        JobQueue(worker_args.queue),
+        worker_args.worker_id,
+        worker_args.cpu_budget,
+        worker_args.poll_interval,
+        worker_args.exit_when_idle,
+    )